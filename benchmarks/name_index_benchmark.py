@@ -0,0 +1,44 @@
+"""
+Compares name searches scanning every patient, as retrieve_patients did,
+with searches through the NameIndex.
+
+Run from the repository root:
+
+    python -m benchmarks.name_index_benchmark [number_of_patients]
+"""
+import random
+import sys
+import timeit
+from clinic.dao.name_index import NameIndex
+
+FIRST_NAMES = ["John", "Mary", "Joe", "Ana", "Wei", "Priya", "Liam", "Olivia", "Noah", "Emma", "Amir", "Sofia"]
+LAST_NAMES = ["Doe", "Hancock", "Smith", "Nguyen", "Patel", "Garcia", "Kowalski", "Okafor", "Tremblay", "Yamamoto"]
+
+
+def names(number_of_patients):
+    generator = random.Random(0)
+    return {9790000000 + i: "%s %s%d" % (generator.choice(FIRST_NAMES), generator.choice(LAST_NAMES), i)
+            for i in range(number_of_patients)}
+
+
+def main():
+    number_of_patients = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    patients = names(number_of_patients)
+    index = NameIndex()
+    for phn, name in patients.items():
+        index.add(phn, name)
+
+    def scan(search_string):
+        return [phn for phn, name in patients.items() if search_string.lower() in name.lower()]
+
+    print("Searching the names of %d patients" % number_of_patients)
+    for search_string in ("kowalski12345", "tremblay9", "mary doe", "jo"):
+        assert index.search(search_string) == scan(search_string)
+        scanned = min(timeit.repeat(lambda: scan(search_string), number=1, repeat=3))
+        indexed = min(timeit.repeat(lambda: index.search(search_string), number=1, repeat=3))
+        print("%-16r %6d matches  scan %8.2f ms  index %8.3f ms" % (
+            search_string, len(index.search(search_string)), scanned * 1000, indexed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares the time to decode a patients file with the previous object_hook
+based decoder, the current PatientDecoder and the PatientStreamDecoder.
+
+Run from the repository root:
+
+    python -m benchmarks.patient_decoder_benchmark [number_of_patients]
+"""
+import io
+import json
+import sys
+import timeit
+from clinic.dao.patient_decoder import PatientDecoder
+from clinic.dao.patient_stream_decoder import PatientStreamDecoder
+
+
+class ObjectHookPatientDecoder(json.JSONDecoder):
+    """The PatientDecoder as it was before the fast path, kept as the baseline."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(object_hook=self.object_hook, *args, **kwargs)
+
+    def object_hook(self, dct):
+        int_keyed_dict = {}
+        for key, value in dct.items():
+            try:
+                int_key = int(key)
+            except (ValueError, TypeError):
+                int_key = key
+            int_keyed_dict[int_key] = value
+
+        from clinic.patient import Patient
+        from clinic.patient_record import PatientRecord
+        from clinic.note import Note
+
+        if "phn" in int_keyed_dict and "name" in int_keyed_dict:
+            return Patient(
+                phn=int_keyed_dict["phn"],
+                name=int_keyed_dict["name"],
+                birth_date=int_keyed_dict.get("birth_date"),
+                phone=int_keyed_dict.get("phone_number"),
+                email=int_keyed_dict.get("email"),
+                address=int_keyed_dict.get("address"),
+                autosave=True
+            )
+        return int_keyed_dict
+
+
+def patients_file(number_of_patients):
+    """Builds the text of a patients file, each patient with a few embedded notes."""
+    patients = {}
+    for i in range(number_of_patients):
+        phn = 9790000000 + i
+        patients[str(phn)] = {
+            "phn": phn,
+            "name": "Patient %d" % i,
+            "birth_date": "19%02d-%02d-%02d" % (i % 100, i % 12 + 1, i % 28 + 1),
+            "phone_number": "250 555 %04d" % (i % 10000),
+            "email": "patient%d@example.com" % i,
+            "address": "%d Moss St, Victoria" % i,
+            "record": {"notes": [{"code": code, "text": "Note %d" % code, "timestamp": None} for code in range(1, 4)]},
+        }
+    return json.dumps(patients)
+
+
+def main():
+    number_of_patients = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    text = patients_file(number_of_patients)
+    data = text.encode("utf-8")
+
+    expected = json.loads(text, cls=ObjectHookPatientDecoder)
+    assert json.loads(text, cls=PatientDecoder) == expected
+    assert PatientStreamDecoder().decode(io.BytesIO(data)) == expected
+
+    candidates = [
+        ("object_hook decoder (previous)", lambda: json.loads(text, cls=ObjectHookPatientDecoder)),
+        ("PatientDecoder", lambda: json.loads(text, cls=PatientDecoder)),
+        ("PatientStreamDecoder", lambda: PatientStreamDecoder().decode(io.BytesIO(data))),
+    ]
+
+    print("Decoding %d patients (%.1f MB)" % (number_of_patients, len(data) / 1e6))
+    baseline = None
+    for name, decode in candidates:
+        seconds = min(timeit.repeat(decode, number=1, repeat=5))
+        baseline = baseline or seconds
+        print("%-32s %8.1f ms  %5.2fx" % (name, seconds * 1000, baseline / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,44 @@
-import os
+import argparse
+import asyncio
 import sys
 from clinic.cli.clinic_cli import ClinicCLI
-import clinic.gui.clinic_gui
 
 def main():
 	# You can run either a command-line interface (CLI) 
-	# or a graphical user interface (GUI) to your clinic.
-	if len(sys.argv) != 2:
-		print('ERROR: wrong number of arguments')
-		print('\nCorrect Command usage:')
-		print('python -m clinic option')
-		print('where option is either cli or gui')
-		sys.exit()
+	# or a graphical user interface (GUI) to your clinic,
+	# in-process or as a client of a clinic server.
+	parser = argparse.ArgumentParser(prog='python -m clinic', description='Medical clinic system.')
+	parser.add_argument('option', choices=('cli', 'gui', 'serve'),
+						help='the interactive CLI, the Qt GUI, or a server sharing the patients with many clients')
+	parser.add_argument('--connect', metavar='ADDRESS',
+						help='cli and gui: use the clinic server at HOST:PORT, or at the path of its Unix socket')
+	parser.add_argument('--host', default='127.0.0.1', help='serve: the address to listen on (default: 127.0.0.1)')
+	parser.add_argument('--port', type=int, default=8765, help='serve: the TCP port to listen on (default: 8765)')
+	parser.add_argument('--socket', metavar='PATH', help='serve: listen on a Unix socket instead of TCP')
+	parser.add_argument('--storage', choices=('json', 'sqlite'), default='json', help='serve: the persistence backend')
+	parser.add_argument('--journal', action='store_true', help='serve: append patient changes to a journal')
+	args = parser.parse_args()
 
-	if sys.argv[1] == 'cli':
-		ClinicCLI()
-	elif sys.argv[1] == 'gui':
-		clinic.gui.clinic_gui.main()
+	controller = None
+	if args.connect:
+		from clinic.client import ClinicClient, parse_address
+		controller = ClinicClient(parse_address(args.connect))
+
+	if args.option == 'cli':
+		ClinicCLI(controller)
+	elif args.option == 'gui':
+		# the GUI needs PyQt, which the CLI and the server do not
+		import clinic.gui.clinic_gui
+		clinic.gui.clinic_gui.main(controller)
 	else:
-		print('ERROR: Wrong argument')
-		print('\nCorrect Command usage:')
-		print('python -m clinic option')
-		print('where option is either cli or gui')
+		from clinic.async_controller import AsyncController
+		from clinic.server import serve
+		server_controller = AsyncController(autosave=True, storage=args.storage, journal=args.journal)
+		print('Serving the clinic on %s' % (args.socket or '%s:%d' % (args.host, args.port)))
+		try:
+			asyncio.run(serve(server_controller, args.host, args.port, args.socket))
+		except KeyboardInterrupt:
+			sys.exit()
 
 
 if __name__ == '__main__':
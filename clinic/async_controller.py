@@ -0,0 +1,185 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from .controller import Controller
+
+
+class AsyncController:
+    """
+    asyncio facade over a thread-safe Controller: every operation is a
+    coroutine running the controller call in an executor, so the event loop
+    never blocks on file I/O.
+
+    Reads run on a pool of reader threads, in parallel under the controller's
+    read lock. Changes run one at a time on a single writer thread, so a
+    burst of changes waits in its own queue instead of occupying the readers.
+    The controller it creates saves with a write-behind flusher, so the write
+    lock is only held while memory changes and reads do not wait for the
+    disk.
+
+    Like a Controller, it is one session: await each call before making the
+    next one that depends on it, e.g. set_current_patient before create_note.
+    """
+
+    def __init__(self, controller:Controller = None, max_readers:int = 4, **options):
+        """
+        Args:
+            controller (Controller, optional): A controller created with thread_safe=True.
+                                               By default one is created with the options.
+            max_readers (int, optional): The number of reader threads.
+            options: Controller arguments; write_behind defaults to True.
+        """
+        if controller is None:
+            options.setdefault("write_behind", True)
+            controller = Controller(thread_safe = True, **options)
+        elif controller.lock is None:
+            raise ValueError("the controller must be created with thread_safe=True")
+        self.controller = controller
+        self.readers = ThreadPoolExecutor(max_readers, thread_name_prefix="clinic-reader")
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix="clinic-writer")
+
+    def new_session(self) -> "AsyncController":
+        """Another session on the same controller data and executors, see Controller.new_session."""
+        session = object.__new__(AsyncController)
+        session.controller = self.controller.new_session()
+        session.readers = self.readers
+        session.writer = self.writer
+        return session
+
+    async def open_session(self) -> "AsyncController":
+        """new_session run on the writer thread: it takes the write lock, which must not block the event loop."""
+        return await self._write(self.new_session)
+
+    async def _run(self, executor, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(method, *args, **kwargs))
+
+    def _read(self, method, *args, **kwargs):
+        return self._run(self.readers, method, *args, **kwargs)
+
+    def _write(self, method, *args, **kwargs):
+        return self._run(self.writer, method, *args, **kwargs)
+
+    async def close(self):
+        """Writes the pending changes and stops the executor threads."""
+        await self._write(self.controller.flush)
+        self.readers.shutdown()
+        self.writer.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # session
+
+    async def login(self, username:str, password:str) -> bool:
+        return await self._read(self.controller.login, username, password)
+
+    async def logout(self) -> bool:
+        return await self._write(self.controller.logout)
+
+    async def set_current_patient(self, phn) -> None:
+        return await self._read(self.controller.set_current_patient, phn)
+
+    async def get_current_patient(self):
+        return await self._read(self.controller.get_current_patient)
+
+    async def unset_current_patient(self) -> bool:
+        return await self._read(self.controller.unset_current_patient)
+
+    async def get_session_changes(self) -> list[str]:
+        return await self._read(self.controller.get_session_changes)
+
+    # patients
+
+    async def search_patient(self, phn):
+        return await self._read(self.controller.search_patient, phn)
+
+    async def list_patients(self) -> list:
+        return await self._read(self.controller.list_patients)
+
+    async def retrieve_patients(self, name:str) -> list:
+        return await self._read(self.controller.retrieve_patients, name)
+
+    async def fuzzy_retrieve_patients(self, name:str, limit:int = 10) -> list:
+        return await self._read(self.controller.fuzzy_retrieve_patients, name, limit)
+
+    async def retrieve_patients_by_phone(self, phone:str) -> list:
+        return await self._read(self.controller.retrieve_patients_by_phone, phone)
+
+    async def retrieve_patients_by_email(self, email:str) -> list:
+        return await self._read(self.controller.retrieve_patients_by_email, email)
+
+    async def retrieve_patients_by_birth_date(self, birth_date:str) -> list:
+        return await self._read(self.controller.retrieve_patients_by_birth_date, birth_date)
+
+    async def retrieve_patients_by_birth_date_range(self, start, end) -> list:
+        return await self._read(self.controller.retrieve_patients_by_birth_date_range, start, end)
+
+    async def retrieve_patients_by_age(self, min_age:int, max_age:int = None, on = None) -> list:
+        return await self._read(self.controller.retrieve_patients_by_age, min_age, max_age, on)
+
+    async def query_patients(self, **query) -> list:
+        """See Controller.query_patients; the query is given by keyword."""
+        return await self._read(self.controller.query_patients, **query)
+
+    async def create_patient(self, phn, name, birth_date, phone, email, address):
+        return await self._write(self.controller.create_patient, phn, name, birth_date, phone, email, address)
+
+    async def update_patient(self, phn, new_phn=None, name=None, birth_date=None, phone=None, email=None, address=None) -> bool:
+        return await self._write(self.controller.update_patient, phn, new_phn, name, birth_date, phone, email, address)
+
+    async def delete_patient(self, phn) -> bool:
+        return await self._write(self.controller.delete_patient, phn)
+
+    async def create_patients(self, patients:list[dict]) -> list[tuple[int, str]]:
+        return await self._write(self.controller.create_patients, patients)
+
+    async def update_patients(self, updates:list[dict]) -> list[tuple[int, str]]:
+        return await self._write(self.controller.update_patients, updates)
+
+    async def delete_patients(self, phns:list) -> list[tuple[int, str]]:
+        return await self._write(self.controller.delete_patients, phns)
+
+    # notes of the current patient
+
+    async def search_note(self, note_code):
+        return await self._read(self.controller.search_note, note_code)
+
+    async def retrieve_notes(self, search_text) -> list:
+        return await self._read(self.controller.retrieve_notes, search_text)
+
+    async def list_notes(self) -> list:
+        return await self._read(self.controller.list_notes)
+
+    async def search_notes(self, search_text, page:int = 0, page_size:int = 20) -> list[tuple[int, int]]:
+        return await self._read(self.controller.search_notes, search_text, page, page_size)
+
+    async def create_note(self, text):
+        return await self._write(self.controller.create_note, text)
+
+    async def update_note(self, note_code, new_text) -> bool:
+        return await self._write(self.controller.update_note, note_code, new_text)
+
+    async def delete_note(self, note_code) -> bool:
+        return await self._write(self.controller.delete_note, note_code)
+
+    # changes
+
+    async def transaction(self, function, *args):
+        """Runs function(controller, *args) on the writer thread inside one Controller.transaction."""
+        def run():
+            with self.controller.transaction():
+                return function(self.controller, *args)
+        return await self._write(run)
+
+    async def undo(self) -> bool:
+        return await self._write(self.controller.undo)
+
+    async def redo(self) -> bool:
+        return await self._write(self.controller.redo)
+
+    async def flush(self):
+        return await self._write(self.controller.flush)
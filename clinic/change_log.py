@@ -0,0 +1,83 @@
+from collections import deque, namedtuple
+
+
+class Change(namedtuple("Change", "kind key before after")):
+    """
+    One patient or note mutation, small enough to keep many of them.
+
+    kind is "patient" or "note". For a patient, before and after are the
+    (phn, name, birth_date, phone, email, address) fields, and key the PHN it
+    had before. For a note, key is (phn, code) and before and after are
+    (text, timestamp). before is None for a creation, after for a deletion.
+    """
+
+    __slots__ = ()
+
+    def inverse(self):
+        """The change undoing this one."""
+        key = self.key
+        if self.kind == "patient" and self.after is not None:
+            key = self.after[0]
+        return Change(self.kind, key, self.after, self.before)
+
+    def describe(self):
+        if self.kind == "patient":
+            if self.before is None:
+                return "Created patient %s" % self.key
+            if self.after is None:
+                return "Deleted patient %s" % self.key
+            if self.after[0] != self.before[0]:
+                return "Updated patient %s, new PHN %s" % (self.key, self.after[0])
+            return "Updated patient %s" % self.key
+        phn, code = self.key
+        if self.before is None:
+            return "Created note %s of patient %s" % (code, phn)
+        if self.after is None:
+            return "Deleted note %s of patient %s" % (code, phn)
+        return "Updated note %s of patient %s" % (code, phn)
+
+
+class ChangeLog:
+    """
+    The changes of a session, for undo and redo. Each step is the tuple of
+    changes of one controller operation, e.g. all the patients of a bulk
+    update.
+
+    Both stacks are ring buffers of at most capacity steps: once full,
+    recording a step forgets the oldest one, so an all-day session keeps a
+    bounded amount of history.
+    """
+
+    def __init__(self, capacity=1000):
+        self.done = deque(maxlen=capacity)
+        self.undone = deque(maxlen=capacity)
+
+    def record(self, changes):
+        """Records a new step, which cannot be followed by a redo of earlier undone steps."""
+        if changes:
+            self.done.append(tuple(changes))
+            self.undone.clear()
+
+    def to_undo(self):
+        """The step undo would revert, or None."""
+        return self.done[-1] if self.done else None
+
+    def to_redo(self):
+        """The step redo would apply again, or None."""
+        return self.undone[-1] if self.undone else None
+
+    def undo(self):
+        """Moves the last step to the undone steps, once it was reverted."""
+        self.undone.append(self.done.pop())
+
+    def redo(self):
+        """Moves the last undone step back, once it was applied again."""
+        self.done.append(self.undone.pop())
+
+    def descriptions(self):
+        """A description of every change still recorded as done, oldest first."""
+        return [change.describe() for step in self.done for change in step]
+
+    def clear(self):
+        self.done.clear()
+        self.undone.clear()
@@ -6,8 +6,9 @@ from getpass import getpass
 
 class ClinicCLI():
 
-	def __init__(self):
-		self.controller = Controller(autosave=True)
+	def __init__(self, controller = None):
+		''' runs the CLI on a Controller, or on a ClinicClient of a clinic server '''
+		self.controller = controller or Controller(autosave=True)
 		self.main_menu_cli = MainMenuCLI(self.controller)
 		self.login_menu()
 
@@ -24,6 +25,7 @@ class ClinicCLI():
 				if self.login():
 					self.main_menu_cli.main_menu()
 			elif response == 2:
+				self.controller.flush()
 				print('\nSESSION FINISHED.')
 				break
 			else:
@@ -0,0 +1,102 @@
+import functools
+import itertools
+import json
+import socket
+from .rpc import METHODS, decode, to_exception
+
+
+def parse_address(address):
+    """A "host:port" address as (host, port); anything else is the path of a Unix socket."""
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+class ClinicClient:
+    """
+    Thin client of a ClinicServer, used in place of a Controller: it has the
+    same operations (see clinic.rpc.METHODS), which raise the same clinic
+    exceptions and return Patient and Note objects. The patients are copies:
+    their notes are managed through the client, e.g. with create_note.
+
+    call_many sends several requests at once and then reads the responses,
+    instead of waiting for each of them in turn.
+    """
+
+    def __init__(self, address, timeout:float = None):
+        """
+        Args:
+            address (tuple or str): (host, port) of a TCP server, or the path of a Unix socket.
+            timeout (float, optional): Seconds to wait for the server before raising socket.timeout.
+        """
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
+            self.socket.connect(address)
+        else:
+            self.socket = socket.create_connection(address, timeout)
+        self.file = self.socket.makefile("rwb")
+        self.ids = itertools.count(1)
+        self.logged_in = False
+
+    def __getattr__(self, name):
+        if name in METHODS:
+            return functools.partial(self.call, name)
+        raise AttributeError(name)
+
+    @property
+    def current_patient(self):
+        return self.call("get_current_patient") if self.logged_in else None
+
+    def login(self, username:str, password:str) -> bool:
+        result = self.call("login", username, password)
+        self.logged_in = True
+        return result
+
+    def logout(self) -> bool:
+        result = self.call("logout")
+        self.logged_in = False
+        return result
+
+    def flush(self):
+        """Nothing to write here: the server writes the pending changes on logout and when it stops."""
+
+    def call(self, method, *args, **kwargs):
+        """Runs one operation on the server and returns its result."""
+        return self.call_many([(method, args, kwargs)])[0]
+
+    def call_many(self, calls):
+        """
+        Runs (method, args, kwargs) operations in order, sending them in one
+        write. Returns their results, or raises the error of the first one
+        that failed once all responses were read.
+        """
+        requests = []
+        for method, args, kwargs in calls:
+            if args and kwargs:
+                raise TypeError("JSON-RPC params are either positional or named")
+            requests.append({"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": kwargs or list(args)})
+        self.file.write(b"".join(json.dumps(request).encode() + b"\n" for request in requests))
+        self.file.flush()
+
+        responses = []
+        for _ in requests:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("the clinic server closed the connection")
+            responses.append(json.loads(line))
+        for response in responses:
+            if "error" in response:
+                raise to_exception(response["error"])
+        return [decode(response["result"]) for response in responses]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -2,31 +2,162 @@
 from .patient import Patient
 from .patient_record import PatientRecord
 from .note import Note
-from datetime import datetime
+from .change_log import Change
+from .session import Session
+from .rwlock import RWLock
+from datetime import date, datetime, timedelta
+import contextlib
+import copy
+import functools
 import hashlib
+import weakref
 from clinic.exception import DuplicateLoginException, IllegalAccessException, IllegalOperationException, InvalidLoginException, InvalidLogoutException,NoCurrentPatientException
 from clinic.dao import PatientDAOJSON
+from clinic.dao import PatientDAOSQLite
 from clinic.dao import NoteDAOPickle
+from clinic.dao import NoteDAOCache
+from clinic.dao import NoteStore
+from clinic.dao import GlobalNoteIndex
+from clinic.dao import WriteBehindFlusher
+from clinic.dao import FileSync
+from clinic.dao import PatientQuery
+
+def reads(method):
+    """Runs a controller method holding the read lock of a thread-safe controller."""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        if self.lock is None:
+            return method(self, *args, **kwargs)
+        with self.lock.read():
+            return method(self, *args, **kwargs)
+    return locked
+
+def writes(method):
+    """Runs a controller method holding the write lock of a thread-safe controller."""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        if self.lock is None:
+            return method(self, *args, **kwargs)
+        with self.lock.write():
+            return method(self, *args, **kwargs)
+    return locked
+
+
 class Controller:
     """
     Controller class to manage patient records, login, and note management for a clinic system.
     """
-    def __init__(self,autosave:bool):
+    def __init__(self,autosave:bool, journal:bool = False, storage:str = "json", max_open_records:int = None, progress = None,
+                 write_behind:bool = False, flush_interval_ms:int = 500, flush_max_ops:int = 50,
+                 fsync_policy:str = FileSync.NEVER, consolidated_notes:bool = False, change_log_size:int = 1000,
+                 thread_safe:bool = False, note_search_index:bool = False, patient_dao = None):
         """
         Initializes the Controller with an empty patient dictionary, 
         login status, and current patient information.
+
+        Args:
+            autosave (bool): Whether changes are persisted to disk.
+            journal (bool, optional): Persist patient changes by appending to a journal
+                                      instead of rewriting the whole patients file.
+            storage (str, optional): Persistence backend, either "json" (patients.json and
+                                     one pickle file per record) or "sqlite" (clinic.db).
+            max_open_records (int, optional): Keep the notes of at most this many patient
+                                              records in memory, least recently used first out.
+            progress (callable, optional): Called as progress(bytes_read, total_bytes) while
+                                           the patients file is loaded.
+            write_behind (bool, optional): Defer autosave writes to a background flusher that
+                                           writes at most once every flush_interval_ms
+                                           milliseconds, or once flush_max_ops changes wait.
+            fsync_policy (str, optional): When saved files are forced to disk: "always",
+                                          "logout" or "never" (see FileSync).
+            consolidated_notes (bool, optional): Keep the notes of every patient in one
+                                                 append-only store (clinic/records/notes.store)
+                                                 instead of one pickle file per record.
+            change_log_size (int, optional): Keep at most this many operations of the
+                                             session for get_session_changes and undo.
+            thread_safe (bool, optional): Allow the controller and its sessions to be used from
+                                          several threads: reads run in parallel under a shared
+                                          lock, changes one at a time under an exclusive one.
+            note_search_index (bool, optional): Keep a clinic-wide index of the words of every note
+                                                (clinic/records/notes.index) so search_notes does not
+                                                load every record, at the cost of loading the index
+                                                at startup.
+            patient_dao (PatientDAO, optional): Persist the patients with this DAO, e.g. one keeping its
+                                                files elsewhere, instead of the one storage and the
+                                                options above would create. Its autosave should match.
         """
         #self.patients = {}  # Dictionary to store patients by PHN
-        self.logged_in = False
-        self.username = None
-        self.current_patient = None
+        # the login, current patient and changes of the user; see new_session
+        self.change_log_size = change_log_size
+        self.session = Session(change_log_size)
+        self.sessions = weakref.WeakSet([self.session])  # every session sharing the DAOs
         self.users = {}
         self.users_read = False
         self.autosave = autosave
-
-        self.patient_dao = PatientDAOJSON(autosave = autosave)  # Patient DAO for patient data management
+        # shared by the sessions; None when the controller is only used from one thread
+        self.lock = RWLock() if thread_safe else None
+
+        if patient_dao is not None:
+            self.patient_dao = patient_dao
+        elif storage == "json":
+            note_cache = NoteDAOCache(max_open_records) if max_open_records else None
+            flusher = WriteBehindFlusher(flush_interval_ms, flush_max_ops) if write_behind and autosave else None
+            file_sync = FileSync(fsync_policy)
+            note_store = NoteStore("clinic/records/notes.store", file_sync) if consolidated_notes and autosave else None
+            global_note_index = GlobalNoteIndex("clinic/records/notes.index" if autosave else None, file_sync) if note_search_index else None
+            self.patient_dao = PatientDAOJSON(autosave = autosave, journal = journal, note_cache = note_cache, progress = progress,
+                                              flusher = flusher, file_sync = file_sync, note_store = note_store,
+                                              global_note_index = global_note_index)  # Patient DAO for patient data management
+        elif storage == "sqlite":
+            self.patient_dao = PatientDAOSQLite(autosave = autosave, fsync_policy = fsync_policy, check_same_thread = not thread_safe)
+        else:
+            raise ValueError("unknown storage: %r" % storage)
         self.load_users()
         
+    @property
+    def logged_in(self):
+        return self.session.logged_in
+
+    @logged_in.setter
+    def logged_in(self, logged_in):
+        self.session.logged_in = logged_in
+
+    @property
+    def username(self):
+        return self.session.username
+
+    @username.setter
+    def username(self, username):
+        self.session.username = username
+
+    @property
+    def current_patient(self):
+        return self.session.current_patient
+
+    @current_patient.setter
+    def current_patient(self, patient):
+        self.session.current_patient = patient
+
+    @writes
+    def new_session(self) -> "Controller":
+        """
+        Opens another session on the data this controller loaded, e.g. for
+        another clinician: a controller sharing its DAOs and users, with its
+        own login, current patient and change log.
+
+        Returns:
+            Controller: The controller of the new session, not logged in.
+        """
+        controller = copy.copy(self)
+        controller.session = Session(self.change_log_size)
+        self.sessions.add(controller.session)
+        return controller
+
+    def _in_use(self, phn):
+        """Whether a patient is the current patient of any logged in session."""
+        return any(session.logged_in and session.current_patient is not None and session.current_patient.phn == phn
+                   for session in list(self.sessions))
+
     # User story 1
     def login(self, username: str, password: str) -> bool:
         """
@@ -60,6 +191,8 @@ class Controller:
             raise InvalidLoginException
 
     # User story 2
+    # syncing checkpoints SQLite, which cannot run along reads of the shared connection
+    @writes
     def logout(self):
         """
         Logs out the current user.
@@ -69,12 +202,17 @@ class Controller:
         """
         if not self.logged_in:
             raise InvalidLogoutException
-            
+
+        self.flush()
+        self.patient_dao.sync()
+        self.session.change_log.clear()
         self.logged_in = False
         self.username = None
+        self.current_patient = None
         return True
 
     # User story 3
+    @reads
     def search_patient(self, phn) -> Patient:
         """
         Searches for a patient by personal health number (PHN).
@@ -95,6 +233,7 @@ class Controller:
 
 
     # User story 4
+    @writes
     def create_patient(self, phn, name, birth_date, phone, email, address):
         """
         Creates a new patient record.
@@ -113,16 +252,17 @@ class Controller:
         if not self.logged_in:
             #print("Please log in first")
             raise IllegalAccessException
-        if self.patient_dao.patients and phn in self.patient_dao.patients:
+        if self.patient_dao.search_patient(phn) is not None:
             #print("Patient already exists")
             raise IllegalOperationException
         
         patient = Patient(phn,name,birth_date,phone,email,address,autosave = self.autosave)
-        self.patient_dao.create_patient(patient)
+        self._create(patient)
         
         return patient
 
     # User story 8
+    @reads
     def list_patients(self) -> list[Patient]:
         """
         Lists all patients in the system.
@@ -134,13 +274,10 @@ class Controller:
             #print("Please log in first.")
             raise IllegalAccessException
 
-        if not self.patient_dao.patients:
-            #print("No patients found")
-            return []
-
         return self.patient_dao.list_patients()
 
     # User story 5
+    @reads
     def retrieve_patients(self, name:str) -> list[Patient]:
         """
         Retrieves patients by their name.
@@ -159,6 +296,304 @@ class Controller:
         return self.patient_dao.retrieve_patients(name)
 
         
+    @writes
+    def create_patients(self, patients:list[dict]) -> list[tuple[int, str]]:
+        """
+        Creates many patients at once, persisting them in one write.
+
+        Every entry is validated before any patient is created; the valid ones
+        are created even if others are rejected.
+
+        Args:
+            patients (list): One dictionary per patient, with the arguments of
+                             create_patient (phn, name, birth_date, phone, email, address).
+
+        Returns:
+            list: (position, reason) for every rejected entry, empty if all were created.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        fields = ("phn", "name", "birth_date", "phone", "email", "address")
+        rejected, accepted, phns = [], [], set()
+        for position, entry in enumerate(patients):
+            missing = [field for field in fields if field not in entry]
+            if missing:
+                rejected.append((position, "missing " + ", ".join(missing)))
+            elif set(entry) - set(fields):
+                rejected.append((position, "unknown " + ", ".join(sorted(set(entry) - set(fields)))))
+            elif entry["phn"] in phns:
+                rejected.append((position, "duplicate PHN in the batch"))
+            elif self.patient_dao.search_patient(entry["phn"]) is not None:
+                rejected.append((position, "patient already exists"))
+            else:
+                phns.add(entry["phn"])
+                accepted.append(entry)
+
+        with self.transaction():
+            for entry in accepted:
+                self._create(Patient(autosave = self.autosave, **entry))
+        return rejected
+
+    @writes
+    def update_patients(self, updates:list[dict]) -> list[tuple[int, str]]:
+        """
+        Updates many patients at once, persisting the changes in one write.
+
+        Every entry is validated before any patient is changed; the valid ones
+        are applied even if others are rejected.
+
+        Args:
+            updates (list): One dictionary per patient, with the arguments of
+                            update_patient (phn and any of new_phn, name, birth_date,
+                            phone, email, address).
+
+        Returns:
+            list: (position, reason) for every rejected entry, empty if all were applied.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        fields = ("phn", "new_phn", "name", "birth_date", "phone", "email", "address")
+        rejected, accepted, updated = [], {}, set()
+        for position, entry in enumerate(updates):
+            phn = entry.get("phn")
+            patient = self.patient_dao.search_patient(phn) if "phn" in entry else None
+            if set(entry) - set(fields):
+                rejected.append((position, "unknown " + ", ".join(sorted(set(entry) - set(fields)))))
+            elif patient is None:
+                rejected.append((position, "patient not found"))
+            elif phn in updated:
+                rejected.append((position, "patient updated twice in the batch"))
+            elif self._in_use(phn):
+                rejected.append((position, "patient is the current patient"))
+            else:
+                updated.add(phn)
+                accepted[position] = (patient, entry)
+
+        # A new PHN may be one another entry of the batch frees, so patients can
+        # swap PHNs. Rejecting an entry keeps its PHN taken, so check again until
+        # no more entries are rejected.
+        renamed = True
+        while renamed:
+            renamed = False
+            freed = {entry["phn"] for patient, entry in accepted.values() if entry.get("new_phn") and entry["new_phn"] != entry["phn"]}
+            taken = set()
+            for position, (patient, entry) in list(accepted.items()):
+                new_phn = entry.get("new_phn")
+                if not new_phn or new_phn == entry["phn"]:
+                    continue
+                if new_phn in taken or (self.patient_dao.search_patient(new_phn) is not None and new_phn not in freed):
+                    rejected.append((position, "new PHN already exists"))
+                    del accepted[position]
+                    renamed = True
+                    break
+                taken.add(new_phn)
+        rejected.sort()
+        accepted = list(accepted.values())
+
+        with self.transaction():
+            self._rekey_all({entry["phn"]: (patient, entry["new_phn"]) for patient, entry in accepted
+                             if entry.get("new_phn") and entry["new_phn"] != entry["phn"]})
+            for patient, entry in accepted:
+                changes = {field: value for field, value in entry.items() if field not in ("phn", "new_phn")}
+                self._apply_update(patient, patient.phn, **changes)
+        return rejected
+
+    @writes
+    def delete_patients(self, phns:list) -> list[tuple[int, str]]:
+        """
+        Deletes many patients at once, persisting the changes in one write.
+
+        Args:
+            phns (list): The personal health numbers of the patients to delete.
+
+        Returns:
+            list: (position, reason) for every rejected PHN, empty if all were deleted.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        rejected, accepted = [], {}
+        for position, phn in enumerate(phns):
+            if phn in accepted:
+                rejected.append((position, "duplicate PHN in the batch"))
+            elif self._in_use(phn):
+                rejected.append((position, "patient is the current patient"))
+            elif self.patient_dao.search_patient(phn) is None:
+                rejected.append((position, "patient not found"))
+            else:
+                accepted[phn] = None
+
+        with self.transaction():
+            for phn in accepted:
+                self._delete(phn)
+        return rejected
+
+    @reads
+    def retrieve_patients_by_phone(self, phone:str) -> list[Patient]:
+        """
+        Retrieves patients by their phone number.
+
+        Args:
+            phone (str): The phone number, with or without spaces, dashes or parentheses.
+
+        Returns:
+            list: A list of matching patients, or an empty list if none found.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        return self.patient_dao.retrieve_patients_by_phone(phone)
+
+    @reads
+    def retrieve_patients_by_email(self, email:str) -> list[Patient]:
+        """
+        Retrieves patients by their email address.
+
+        Args:
+            email (str): The email address, in any case.
+
+        Returns:
+            list: A list of matching patients, or an empty list if none found.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        return self.patient_dao.retrieve_patients_by_email(email)
+
+    @reads
+    def retrieve_patients_by_birth_date(self, birth_date:str) -> list[Patient]:
+        """
+        Retrieves patients born on a date.
+
+        Args:
+            birth_date (str): The birth date, e.g. "2000-10-10".
+
+        Returns:
+            list: A list of matching patients, or an empty list if none found.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        return self.patient_dao.retrieve_patients_by_birth_date(birth_date)
+
+    @reads
+    def retrieve_patients_by_birth_date_range(self, start, end) -> list[Patient]:
+        """
+        Retrieves patients born in a range of dates.
+
+        Args:
+            start (str or date): The first birth date of the range, e.g. "1950-01-01".
+            end (str or date): The last birth date of the range, included.
+
+        Returns:
+            list: The matching patients, the oldest first, or an empty list if none found.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        return self.patient_dao.retrieve_patients_by_birth_date_range(start, end)
+
+    @staticmethod
+    def _years_before(day, years):
+        """The same day a number of years earlier; February 29 becomes February 28."""
+        try:
+            return day.replace(year=day.year - years)
+        except ValueError:
+            return day.replace(year=day.year - years, day=28)
+
+    @reads
+    def retrieve_patients_by_age(self, min_age:int, max_age:int = None, on:date = None) -> list[Patient]:
+        """
+        Retrieves patients in an age bracket.
+
+        Args:
+            min_age (int): The minimum age, in years.
+            max_age (int, optional): The maximum age, included. Defaults to min_age.
+            on (date, optional): The day the ages are computed on. Defaults to today.
+
+        Returns:
+            list: The matching patients, the oldest first, or an empty list if none found.
+        """
+        on = on or date.today()
+        max_age = min_age if max_age is None else max_age
+        # born after the day max_age + 1 years before and at the latest min_age years before
+        start = self._years_before(on, max_age + 1) + timedelta(days=1)
+        end = self._years_before(on, min_age)
+        return self.retrieve_patients_by_birth_date_range(start, end)
+
+    @reads
+    def retrieve_patients_turning(self, age:int, year:int = None, month:int = None) -> list[Patient]:
+        """
+        Retrieves patients turning an age in a month, e.g. patients turning 65 this month.
+
+        Args:
+            age (int): The age the patients turn.
+            year (int, optional): The year of the month. Defaults to the current year.
+            month (int, optional): The month. Defaults to the current month.
+
+        Returns:
+            list: The matching patients, the oldest first, or an empty list if none found.
+        """
+        today = date.today()
+        year = year or today.year
+        month = month or today.month
+        start = date(year - age, month, 1)
+        end = date(year - age + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return self.retrieve_patients_by_birth_date_range(start, end)
+
+    @reads
+    def query_patients(self, name:str = None, birth_date_from = None, birth_date_to = None, email_domain:str = None,
+                       notes:str = None, sort_by:str = None, descending:bool = False, page:int = 0,
+                       page_size:int = None) -> list[Patient]:
+        """
+        Retrieves the patients matching every given criterion, sorted and paged.
+        The search starts from the most selective index and only scans all
+        patients when no index applies.
+
+        Args:
+            name (str, optional): The name contains this text, ignoring case.
+            birth_date_from (str or date, optional): Born on this date or later.
+            birth_date_to (str or date, optional): Born on this date or earlier.
+            email_domain (str, optional): The email address is at this domain, e.g. "gmail.com".
+            notes (str, optional): A note of the patient contains all the words of this text.
+            sort_by (str, optional): "phn", "name" or "birth_date"; creation order by default.
+            descending (bool, optional): Sort from the highest value down.
+            page (int, optional): The page of results to return, starting at 0.
+            page_size (int, optional): The number of patients per page; all of them by default.
+
+        Returns:
+            list: The matching patients on that page, or an empty list if none found.
+
+        Raises:
+            ValueError: If sort_by or a birth date is invalid.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        query = PatientQuery(name, birth_date_from, birth_date_to, email_domain, notes, sort_by, descending,
+                             page * page_size if page_size else 0, page_size)
+        return self.patient_dao.query_patients(query)
+
+    @reads
+    def fuzzy_retrieve_patients(self, name:str, limit:int = 10) -> list[Patient]:
+        """
+        Retrieves patients whose name sounds like the given name, tolerating misspellings.
+
+        Args:
+            name (str): The name to search for, possibly misspelled.
+            limit (int, optional): The maximum number of patients to return.
+
+        Returns:
+            list: The matching patients, the closest spelling first, or an empty list if none found.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        return self.patient_dao.fuzzy_search_patients(name, limit)
+
+    @writes
     def update_patient(self, phn, new_phn=None, name=None, birth_date=None, phone=None, email=None, address=None) -> bool:
         """
         Updates the details of an existing patient.
@@ -183,7 +618,7 @@ class Controller:
         if patient is None:
             raise IllegalOperationException
 
-        if self.current_patient is not None and phn == self.current_patient.phn:
+        if self._in_use(phn):
             raise IllegalOperationException
 
         # If new_phn is provided and differs from the current phn, handle the PHN change
@@ -191,11 +626,21 @@ class Controller:
             # Check if new_phn already exists to prevent duplicate PHNs
             if self.patient_dao.search_patient(new_phn) is not None:
                 raise IllegalOperationException  # new_phn already exists
-            
-            # Delete the old PHN entry and create a new entry with updated PHN
-            self.patient_dao.delete_patient(phn)
-            patient.phn = new_phn  # Update the patient's PHN attribute
-            self.patient_dao.create_patient(patient)
+
+        # a PHN change is a rekey and an update: save them once
+        with self.transaction():
+            self._apply_update(patient, phn, new_phn, name, birth_date, phone, email, address)
+
+        return True
+
+    def _apply_update(self, patient, phn, new_phn=None, name=None, birth_date=None, phone=None, email=None, address=None):
+        """Changes and saves an existing patient once the update was validated."""
+        if new_phn and new_phn != phn:
+            # Move the patient, its notes and its index entries to the new PHN
+            self._rekey(patient, new_phn)
+
+        before = self._fields(patient)
+        self._log_undo(lambda: self._undo_update(patient, before))
 
         # Update other patient details if provided
         if name is not None:
@@ -211,12 +656,14 @@ class Controller:
 
         # Save the updated patient information
         self.patient_dao.update_patient(patient.phn, patient)
-
-        return True
+        after = self._fields(patient)
+        if after != before:
+            self.log_change(Change("patient", patient.phn, before, after))
 
 
 
     # User story 7
+    @writes
     def delete_patient(self,phn) -> bool:
         """
         Deletes a patient by their personal health number.
@@ -234,12 +681,12 @@ class Controller:
             #print("You must be logged in to delete patients.")
             raise IllegalAccessException
         
-        if self.current_patient and phn == self.current_patient.phn:
+        if self._in_use(phn):
             #print("Cannot delete the currently selected patient. Please deselect first")
             raise IllegalOperationException
         
-        if phn in self.patient_dao.patients:
-            self.patient_dao.delete_patient(phn)
+        if self.patient_dao.search_patient(phn) is not None:
+            self._delete(phn)
             #print(f"Patient with PHN {phn} deleted successfully")
             return True
         else:
@@ -247,6 +694,7 @@ class Controller:
             raise IllegalOperationException
 
     # User Story 9
+    @reads
     def set_current_patient(self,phn) -> None:
         """
         Sets the currently selected patient.
@@ -323,6 +771,7 @@ class Controller:
             return patient_record.add_note(details)
         return None
 
+    @writes
     def create_note(self, text) -> Note:
         """
         Creates a new note for the currently selected patient.
@@ -342,10 +791,13 @@ class Controller:
         
         phn = self.current_patient.phn
 
-        return self.current_patient.create_note(text)
+        note = self.current_patient.create_note(text)
+        self._log_note(self.current_patient, Change("note", (phn, note.code), None, (note.text, note.timestamp)))
+        return note
     
     # controller.py (within the Controller class)
 
+    @reads
     def search_note(self, note_code) -> Note or None: # type: ignore
         """
         Search for a note by its code in the current patient's record.
@@ -367,6 +819,7 @@ class Controller:
 
     # controller.py (within the Controller class)
 
+    @reads
     def retrieve_notes(self, search_text) -> list[Note]:
         """
         Retrieve notes for the current patient that contain specific text, ordered by newest first.
@@ -389,6 +842,28 @@ class Controller:
 
         return self.current_patient.retrieve_notes(search_text)
 
+    @reads
+    def search_notes(self, search_text, page:int = 0, page_size:int = 20) -> list[tuple[int, int]]:
+        """
+        Searches the notes of every patient, not just the current one, for all the words of a text.
+
+        Args:
+            search_text (str): The words to search for, ignoring case.
+            page (int, optional): The page of results to return, starting at 0.
+            page_size (int, optional): The number of results per page.
+
+        Returns:
+            list: The (PHN, note code) pairs of the matching notes on that page, sorted by PHN
+                  then code, or None if no search text is provided.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+        if not search_text:
+            return None
+
+        return self.patient_dao.search_notes(search_text, page * page_size, page_size)
+
+    @writes
     def update_note(self, note_code, new_text) -> Note or None: # type: ignore
         """
         Updates the text of a note identified by its code.
@@ -407,8 +882,15 @@ class Controller:
         if not self.current_patient:
             raise NoCurrentPatientException
 
-        return self.current_patient.update_note(note_code,new_text)
+        note = self.current_patient.search_note(note_code)
+        before = (note.text, note.timestamp) if note else None
+        if not self.current_patient.update_note(note_code,new_text):
+            return False
+        note = self.current_patient.search_note(note_code)
+        self._log_note(self.current_patient, Change("note", (self.current_patient.phn, note_code), before, (note.text, note.timestamp)))
+        return True
 
+    @writes
     def delete_note(self,note_code) -> bool:
         """
         Deletes a note identified by its code from the current patient's record.
@@ -426,8 +908,13 @@ class Controller:
         if not self.current_patient:
             raise NoCurrentPatientException
 
-        return self.current_patient.delete_note(note_code)
+        note = self.current_patient.search_note(note_code)
+        if not self.current_patient.delete_note(note_code):
+            return False
+        self._log_note(self.current_patient, Change("note", (self.current_patient.phn, note_code), (note.text, note.timestamp), None))
+        return True
             
+    @reads
     def list_notes(self) -> list[Note]:
         """
         Lists all notes for the currently selected patient.
@@ -444,6 +931,142 @@ class Controller:
 
         return self.current_patient.list_notes()
     
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Runs several patient changes as one: the DAO persists them once, when
+        the outermost transaction ends, and if the block raises every patient
+        created, updated or deleted in it is changed back in memory before the
+        exception propagates, so nothing of it is saved.
+
+        Transactions nest; only the outermost one commits or rolls back. Notes
+        created, updated or deleted in the block are saved as usual, and
+        changed back too if it raises. A thread-safe controller holds its
+        write lock for the whole block.
+
+        Example:
+            with controller.transaction():
+                controller.create_patient(...)
+                controller.update_patient(...)
+        """
+        lock = self.lock.write() if self.lock is not None else contextlib.nullcontext()
+        with lock:
+            self.session.transaction_depth += 1
+            start = len(self.session.undo_log)
+            committed = False
+            try:
+                with self.patient_dao.batch():
+                    try:
+                        yield self
+                    except BaseException:
+                        if self.session.transaction_depth == 1:
+                            self._rollback(start)
+                        raise
+                committed = True
+            finally:
+                self.session.transaction_depth -= 1
+                if not self.session.transaction_depth:
+                    self.session.undo_log = []
+                    # the changes of the transaction are undone in one step
+                    changes, self.session.pending_changes = self.session.pending_changes, []
+                    if committed:
+                        self.session.change_log.record(changes)
+
+    def _rollback(self, start):
+        """Undoes the changes logged since start, the last one first."""
+        while len(self.session.undo_log) > start:
+            self.session.undo_log.pop()()
+
+    def _log_undo(self, undo):
+        if self.session.transaction_depth:
+            self.session.undo_log.append(undo)
+
+    def _log_note(self, patient, change):
+        """Logs a change to a note of the patient, which a rolled back transaction reverts."""
+        self.log_change(change)
+        self._log_undo(lambda: self._revert_note(patient.record, change))
+
+    @staticmethod
+    def _revert_note(record, change):
+        code = change.key[1]
+        if change.before is None:
+            record.delete_note(code)
+        else:
+            record.restore_note(Note(code, *change.before))
+
+    @staticmethod
+    def _fields(patient):
+        return (patient.phn, patient.name, patient.birth_date, patient.phone, patient.email, patient.address)
+
+    @staticmethod
+    def _restore(patient, fields):
+        patient.phn, patient.name, patient.birth_date, patient.phone, patient.email, patient.address = fields
+
+    def _create(self, patient):
+        created = self._fields(patient)
+        self.patient_dao.create_patient(patient)
+        self._log_undo(lambda: self._undo_create(patient, created))
+        self.log_change(Change("patient", patient.phn, None, created))
+
+    def _delete(self, phn):
+        patient = self.patient_dao.search_patient(phn)
+        deleted = self._fields(patient)
+        self.patient_dao.delete_patient(phn)
+        self._log_undo(lambda: self._undo_delete(patient, deleted))
+        self.log_change(Change("patient", phn, deleted, None))
+
+    def _rekey(self, patient, new_phn):
+        phn = patient.phn
+        before = self._fields(patient)
+        patient.phn = new_phn
+        self.patient_dao.rekey_patient(phn, patient)
+        self._log_undo(lambda: self._undo_rekey(patient, phn))
+        self.log_change(Change("patient", phn, before, self._fields(patient)))
+
+    def _rekey_all(self, renames):
+        """
+        Rekeys the patients of {phn: (patient, new_phn)}, each once its new
+        PHN is free. Patients swapping PHNs in a cycle go through a temporary
+        PHN first.
+        """
+        while renames:
+            free = [phn for phn, (patient, new_phn) in renames.items() if new_phn not in renames]
+            if not free:
+                phn = next(iter(renames))
+                patient, new_phn = renames.pop(phn)
+                temporary = "%s.rekey" % phn
+                self._rekey(patient, temporary)
+                renames[temporary] = (patient, new_phn)
+                continue
+            for phn in free:
+                patient, new_phn = renames.pop(phn)
+                self._rekey(patient, new_phn)
+
+    def _undo_rekey(self, patient, phn):
+        new_phn = patient.phn
+        patient.phn = phn
+        self.patient_dao.rekey_patient(new_phn, patient)
+
+    def _undo_create(self, patient, created):
+        self._restore(patient, created)
+        self.patient_dao.delete_patient(created[0])
+
+    def _undo_delete(self, patient, deleted):
+        self._restore(patient, deleted)
+        self.patient_dao.create_patient(patient)
+
+    def _undo_update(self, patient, before):
+        self._restore(patient, before)
+        self.patient_dao.update_patient(patient.phn, patient)
+
+    @reads
+    def flush(self):
+        """
+        Writes every change still pending in a write-behind autosave.
+        Called on logout; the GUI and CLI also call it when the application quits.
+        """
+        self.patient_dao.flush()
+
     def load_users(self):
         with open("clinic/users.txt", "r") as file:
             for line in file:
@@ -452,11 +1075,97 @@ class Controller:
                 hashed_password = data[1]
                 self.users[username] = hashed_password
 
-    def log_change(self, change_description):
-        """Add a change to the session log."""
-        self.session_changes.append(change_description)
+    def log_change(self, change):
+        """Add a change to the session log, as part of the current transaction if any."""
+        if self.session.replaying:
+            return
+        if self.session.transaction_depth:
+            self.session.pending_changes.append(change)
+        else:
+            self.session.change_log.record((change,))
 
     def get_session_changes(self):
-        """Retrieve the list of changes."""
-        return self.session_changes
+        """Retrieve the descriptions of the changes made during the session, oldest first."""
+        return self.session.change_log.descriptions()
+
+    @writes
+    def undo(self) -> bool:
+        """
+        Reverts the last operation of the session on a patient or a note, by
+        applying its inverse changes, without reloading anything from disk.
+
+        Returns:
+            bool: True if an operation was undone, False if there is none left to undo.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        step = self.session.change_log.to_undo()
+        if step is None:
+            return False
+        self._replay([change.inverse() for change in reversed(step)])
+        self.session.change_log.undo()
+        return True
+
+    @writes
+    def redo(self) -> bool:
+        """
+        Applies again the last operation reverted by undo.
+
+        Returns:
+            bool: True if an operation was redone, False if there is none to redo.
+        """
+        if not self.logged_in:
+            raise IllegalAccessException
+
+        step = self.session.change_log.to_redo()
+        if step is None:
+            return False
+        self._replay(step)
+        self.session.change_log.redo()
+        return True
+
+    def _replay(self, changes):
+        """Applies changes in one transaction, without logging them as new changes."""
+        for change in changes:
+            # like a deletion or PHN change, an undo cannot move the current patient
+            if change.kind == "patient" and self._in_use(change.key) and (change.after is None or change.after[0] != change.key):
+                raise IllegalOperationException
+
+        self.session.replaying = True
+        try:
+            with self.transaction():
+                for change in changes:
+                    self._apply_change(change)
+        finally:
+            self.session.replaying = False
+
+    def _apply_change(self, change):
+        if change.kind == "note":
+            phn, code = change.key
+            patient = self.patient_dao.search_patient(phn)
+            if patient is None:
+                raise IllegalOperationException
+            if change.after is None:
+                patient.record.delete_note(code)
+            else:
+                patient.record.restore_note(Note(code, *change.after))
+            self._log_note(patient, change)
+            return
+
+        if change.before is None:
+            if self.patient_dao.search_patient(change.after[0]) is not None:
+                raise IllegalOperationException
+            self._create(Patient(*change.after, autosave = self.autosave))
+            return
+
+        patient = self.patient_dao.search_patient(change.key)
+        if patient is None:
+            raise IllegalOperationException
+        if change.after is None:
+            self._delete(change.key)
+        else:
+            if change.after[0] != change.key and self.patient_dao.search_patient(change.after[0]) is not None:
+                raise IllegalOperationException
+            self._apply_update(patient, change.key, *change.after)
     
@@ -1,4 +1,14 @@
 from .patient_dao_json import PatientDAOJSON
+from .patient_dao_sqlite import PatientDAOSQLite
 from .note_dao_pickle import NoteDAOPickle 
+from .note_dao_sqlite import NoteDAOSQLite
+from .note_store import NoteStore
+from .note_dao_store import NoteDAOStore
+from .note_dao_cache import NoteDAOCache
+from .global_note_index import GlobalNoteIndex
+from .write_behind_flusher import WriteBehindFlusher
+from .file_sync import FileSync
+from .patient_query import PatientQuery
 from .patient_encoder import PatientEncoder  
-from .patient_decoder import PatientDecoder  
+from .patient_decoder import PatientDecoder
+from .patient_stream_decoder import PatientStreamDecoder  
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import threading
+
+class FileSync:
+    """
+    Crash-safe file writes with a configurable fsync policy.
+
+    Whole-file saves go to a temporary file in the target's directory that
+    then replaces the target with os.replace, so a crash leaves either the
+    old or the new file, never a truncated one. The policy decides when the
+    data is forced to disk:
+
+        ALWAYS     fsync every write before it replaces the target
+        ON_LOGOUT  fsync the files written since the last sync() (at logout)
+        NEVER      leave it to the operating system
+    """
+
+    ALWAYS = "always"
+    ON_LOGOUT = "logout"
+    NEVER = "never"
+    POLICIES = (ALWAYS, ON_LOGOUT, NEVER)
+
+    def __init__(self, policy=NEVER):
+        if policy not in self.POLICIES:
+            raise ValueError("unknown fsync policy: %r" % policy)
+        self.policy = policy
+        self.unsynced = set()
+        self.lock = threading.Lock()
+
+    def write(self, filepath, dump, binary=False):
+        """Atomically replaces filepath with what dump(file) writes to the open file."""
+        directory = os.path.dirname(filepath) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temporary_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filepath) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb" if binary else "w") as file:
+                dump(file)
+                if self.policy == self.ALWAYS:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(temporary_path, filepath)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        self._written(filepath, directory)
+
+    def append(self, filepath, data):
+        """
+        Appends text or bytes to filepath, e.g. a journal record.
+        Returns the offset the data was written at.
+        """
+        directory = os.path.dirname(filepath) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(filepath, "ab" if isinstance(data, bytes) else "a") as file:
+            offset = file.seek(0, os.SEEK_END)
+            file.write(data)
+            if self.policy == self.ALWAYS:
+                file.flush()
+                os.fsync(file.fileno())
+
+        self._written(filepath, directory)
+        return offset
+
+    def truncate(self, filepath, length):
+        """Cuts filepath back to its first length bytes, e.g. a journal's torn last record."""
+        with open(filepath, "r+b") as file:
+            file.truncate(length)
+            if self.policy == self.ALWAYS:
+                file.flush()
+                os.fsync(file.fileno())
+
+        self._written(filepath, os.path.dirname(filepath) or ".")
+
+    def rename(self, source, target):
+        """Atomically moves source to target, replacing target if it exists."""
+        os.replace(source, target)
+        self._written(target, os.path.dirname(target) or ".")
+
+    def sync(self):
+        """Forces the files written since the last sync to disk (the ON_LOGOUT policy)."""
+        with self.lock:
+            filepaths, self.unsynced = self.unsynced, set()
+        directories = set()
+        for filepath in filepaths:
+            try:
+                with open(filepath, "rb") as file:
+                    os.fsync(file.fileno())
+            except FileNotFoundError:
+                continue
+            directories.add(os.path.dirname(filepath) or ".")
+        for directory in directories:
+            self._fsync_directory(directory)
+
+    def _written(self, filepath, directory):
+        if self.policy == self.ALWAYS:
+            self._fsync_directory(directory)
+        elif self.policy == self.ON_LOGOUT:
+            with self.lock:
+                self.unsynced.add(filepath)
+
+    @staticmethod
+    def _fsync_directory(directory):
+        """Makes a rename durable; directories cannot be opened on every platform."""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
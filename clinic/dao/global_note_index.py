@@ -0,0 +1,191 @@
+import json
+import os
+import pickle
+import re
+import threading
+from .file_sync import FileSync
+
+class GlobalNoteIndex:
+    """
+    Clinic-wide inverted index of the notes of every patient: each word of a
+    note (case-folded) maps to the (PHN, note code) pairs of the notes using it,
+    so a search does not have to load the patients' note DAOs.
+
+    The note DAOs keep it up to date as notes change. Every save of a
+    patient's notes first appends the words of that patient's notes, with the
+    save counter (revision) of the notes, to a journal next to the index, so
+    the index survives a crash with every saved note. The journal is folded
+    into a snapshot of the index on save, and every snapshot_interval records.
+    A note DAO whose saved notes have another revision, e.g. notes written
+    without the index, reindexes its patient when it is loaded.
+    """
+
+    WORD = re.compile(r"\w+")
+
+    def __init__(self, filepath=None, file_sync=None, snapshot_interval=1000):
+        self.filepath = filepath  # None keeps the index in memory only
+        self.journal_filepath = os.path.splitext(filepath)[0] + ".journal" if filepath is not None else None
+        self.file_sync = file_sync or FileSync()
+        self.snapshot_interval = snapshot_interval
+        self.lock = threading.RLock()
+
+        self.postings = {}  # word -> set of (phn, code)
+        self.notes = {}  # phn -> {code: words of the note}, to remove them again
+        self.revisions = {}  # phn -> revision of the saved notes the index reflects
+        self.journal_length = 0
+        self.dirty = False
+        self.loaded = self._load()
+
+    @classmethod
+    def tokenize(cls, text):
+        return set(cls.WORD.findall(text.casefold()))
+
+    def _load(self):
+        if self.filepath is None:
+            return False
+        try:
+            with open(self.filepath, "rb") as file:
+                data = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return False
+        self.revisions = data["revisions"]
+        for phn, notes in data["notes"].items():
+            self._put(phn, notes)
+        self._replay_journal()
+        return True
+
+    def _replay_journal(self):
+        """Applies the journal, cutting off a torn last record so the next append starts on a fresh line."""
+        complete = 0  # bytes of the journal holding complete records
+        try:
+            with open(self.journal_filepath, "rb") as file:
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    complete += len(line)
+                    if "rekey" in entry:
+                        self._rekey(*entry["rekey"])
+                    else:
+                        self._put(entry["phn"], {code: set(words) for code, words in entry["notes"]})
+                        self.revisions[entry["phn"]] = entry["revision"]
+                    self.journal_length += 1
+            if os.path.getsize(self.journal_filepath) > complete:
+                self.file_sync.truncate(self.journal_filepath, complete)
+        except FileNotFoundError:
+            pass
+        self.dirty = self.journal_length > 0
+
+    def _put(self, phn, notes):
+        """Replaces the notes indexed for a patient with {code: words}."""
+        self._clear(phn)
+        if notes:
+            self.notes[phn] = notes
+        for code, words in notes.items():
+            for word in words:
+                self.postings.setdefault(word, set()).add((phn, code))
+
+    def _clear(self, phn):
+        for code in list(self.notes.get(phn, ())):
+            self._remove(phn, code)
+
+    def add(self, phn, note):
+        with self.lock:
+            self._remove(phn, note.code)
+            words = self.tokenize(note.text)
+            self.notes.setdefault(phn, {})[note.code] = words
+            for word in words:
+                self.postings.setdefault(word, set()).add((phn, note.code))
+            self.dirty = True
+
+    def remove(self, phn, code):
+        with self.lock:
+            self._remove(phn, code)
+            self.dirty = True
+
+    def _remove(self, phn, code):
+        notes = self.notes.get(phn)
+        if notes is None or code not in notes:
+            return
+        for word in notes.pop(code):
+            keys = self.postings[word]
+            keys.discard((phn, code))
+            if not keys:
+                del self.postings[word]
+        if not notes:
+            del self.notes[phn]
+
+    def reindex(self, phn, notes, revision):
+        """Replaces everything indexed for a patient with the given notes."""
+        with self.lock:
+            self._put(phn, {note.code: self.tokenize(note.text) for note in notes})
+            self.saved(phn, revision)
+
+    def rekey(self, phn, new_phn):
+        """Moves the notes of a patient to a new PHN, replacing what was indexed for it."""
+        with self.lock:
+            self._rekey(phn, new_phn)
+            self._append({"rekey": [phn, new_phn]})
+
+    def _rekey(self, phn, new_phn):
+        notes = dict(self.notes.get(phn, {}))
+        self._clear(phn)
+        self._put(new_phn, notes)
+        self.revisions.pop(new_phn, None)
+        if phn in self.revisions:
+            self.revisions[new_phn] = self.revisions.pop(phn)
+
+    def saved(self, phn, revision):
+        """
+        Records that the notes of a patient are saved with this revision,
+        journaling their words. Called before the notes are written, so a
+        crash in between leaves the index ahead of the notes, to be healed
+        when they are loaded, rather than missing notes.
+        """
+        with self.lock:
+            self.revisions[phn] = revision
+            notes = self.notes.get(phn, {})
+            self._append({"phn": phn, "revision": revision, "notes": [[code, sorted(words)] for code, words in notes.items()]})
+
+    def _append(self, entry):
+        self.dirty = True
+        if self.filepath is None:
+            return
+        self.file_sync.append(self.journal_filepath, json.dumps(entry) + "\n")
+        self.journal_length += 1
+        if self.journal_length >= self.snapshot_interval:
+            self.save()
+
+    def is_current(self, phn, revision):
+        return self.revisions.get(phn) == revision
+
+    def search(self, search_string):
+        """Returns the (phn, code) of the notes containing every word of search_string, sorted."""
+        words = self.tokenize(search_string)
+        if not words:
+            return []
+        with self.lock:
+            postings = [self.postings.get(word, set()) for word in words]
+            postings.sort(key=len)
+            keys = postings[0].intersection(*postings[1:])
+        return sorted(keys)
+
+    def estimate(self, search_string):
+        """An upper bound of the number of notes search would return."""
+        words = self.tokenize(search_string)
+        with self.lock:
+            return min((len(self.postings.get(word, ())) for word in words), default=0)
+
+    def save(self):
+        """Saves a snapshot of the index if it changed since it was last saved, and truncates the journal."""
+        with self.lock:
+            if not self.dirty or self.filepath is None:
+                return
+            data = {"notes": self.notes, "revisions": self.revisions}
+            self.file_sync.write(self.filepath, lambda file: pickle.dump(data, file), binary=True)
+            self.file_sync.write(self.journal_filepath, lambda file: None)
+            self.journal_length = 0
+            self.dirty = False
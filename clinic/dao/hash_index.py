@@ -0,0 +1,51 @@
+PHONE_SEPARATORS = " -().+"
+
+
+def normalize_phone(phone):
+    """A phone number without separators, so "250 203-1010" and "(250) 2031010" match."""
+    return (phone or "").translate(str.maketrans("", "", PHONE_SEPARATORS))
+
+
+def normalize_email(email):
+    """Email addresses match ignoring surrounding spaces and case."""
+    return (email or "").strip().lower()
+
+
+def normalize_email_domain(email):
+    """The domain of an email address, or a domain itself, ignoring case: "jd@UVic.ca" -> "uvic.ca"."""
+    return normalize_email(email).rpartition("@")[2]
+
+
+class HashIndex:
+    """
+    Exact-match index from a normalized patient field, such as the phone
+    number or the email address, to the keys of the patients having it.
+    """
+
+    def __init__(self, normalize):
+        self.normalize = normalize
+        self.values = {}  # key -> normalized value
+        self.postings = {}  # normalized value -> {key: None}, in insertion order
+
+    def add(self, key, value):
+        """Indexes a new key, or the new value of a key."""
+        value = self.normalize(value)
+        if key in self.values:
+            if self.values[key] == value:
+                return
+            self.remove(key)
+        self.values[key] = value
+        if value:
+            self.postings.setdefault(value, {})[key] = None
+
+    def remove(self, key):
+        value = self.values.pop(key, None)
+        keys = self.postings.get(value)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self.postings[value]
+
+    def lookup(self, value):
+        """Returns the keys with this value once normalized."""
+        return list(self.postings.get(self.normalize(value), ()))
@@ -0,0 +1,126 @@
+import itertools
+
+class NameIndex:
+    """
+    Trigram index over case-folded patient names, answering the case-insensitive
+    substring search of retrieve_patients without scanning every patient.
+
+    A name can only contain the search text if it contains every trigram of
+    it, so a search walks the smallest posting list and tests its keys against
+    the others and the name. Two-character searches, the first keystrokes of
+    a search as you type, are answered by bigram postings, three-character
+    ones by their trigram's postings alone. A single character matches a
+    large share of the names, which are scanned.
+
+    Postings keep their keys in insertion order, so results come in the order
+    in which patients were added, like the patients dictionary, without being
+    sorted, and a search with a limit stops once it has found enough.
+    """
+
+    GRAM = 3
+
+    def __init__(self):
+        self.names = {}  # key -> (sequence number, case-folded name), in insertion order
+        self.postings = {}  # trigram -> keys in insertion order, as dict keys
+        self.bigram_postings = {}  # bigram -> keys in insertion order, as dict keys
+        self.unsorted = set()  # grams whose keys are out of insertion order
+        self.sequence = 0
+
+    @classmethod
+    def grams(cls, folded):
+        return {folded[i:i + cls.GRAM] for i in range(len(folded) - cls.GRAM + 1)}
+
+    @staticmethod
+    def bigrams(folded):
+        return {folded[i:i + 2] for i in range(len(folded) - 1)}
+
+    def add(self, key, name):
+        """Indexes a new key, or the new name of a key, which keeps its position."""
+        previous = self.names.get(key)
+        if previous is not None:
+            if previous[1] == name.casefold():
+                return
+            self._unpost(key, previous[1])
+            sequence = previous[0]
+        else:
+            self.sequence += 1
+            sequence = self.sequence
+
+        folded = name.casefold()
+        self.names[key] = (sequence, folded)
+        for postings, grams in ((self.postings, self.grams(folded)), (self.bigram_postings, self.bigrams(folded))):
+            for gram in grams:
+                keys = postings.get(gram)
+                if keys is None:
+                    keys = postings[gram] = {}
+                elif previous is not None and self.names[next(reversed(keys))][0] > sequence:
+                    # a renamed key is out of order, the posting is sorted again when searched
+                    self.unsorted.add(gram)
+                keys[key] = None
+
+    def remove(self, key):
+        previous = self.names.pop(key, None)
+        if previous is not None:
+            self._unpost(key, previous[1])
+
+    def _unpost(self, key, folded):
+        for postings, grams in ((self.postings, self.grams(folded)), (self.bigram_postings, self.bigrams(folded))):
+            for gram in grams:
+                keys = postings.get(gram)
+                if keys is not None:
+                    keys.pop(key, None)
+                    if not keys:
+                        del postings[gram]
+                        self.unsorted.discard(gram)
+
+    def _ordered(self, postings, gram):
+        """The keys of a posting in insertion order."""
+        keys = postings[gram]
+        if gram in self.unsorted:
+            keys = postings[gram] = dict.fromkeys(sorted(keys, key=lambda key: self.names[key][0]))
+            self.unsorted.discard(gram)
+        return keys
+
+    def estimate(self, search_string):
+        """An upper bound of the number of keys search would return, or None if it has to scan."""
+        folded = search_string.casefold()
+        if len(folded) < 2:
+            return None
+        if len(folded) == 2:
+            return len(self.bigram_postings.get(folded, ()))
+        return min(len(self.postings.get(gram, ())) for gram in self.grams(folded))
+
+    def search(self, search_string, limit=None):
+        """
+        Returns the keys whose name contains search_string, ignoring case, in
+        insertion order; only the first limit of them if limit is not None.
+        """
+        folded = search_string.casefold()
+        if len(folded) < 2:
+            # most names contain a single character, every name is a candidate
+            matches = (key for key, (sequence, name) in self.names.items() if folded in name)
+        elif len(folded) == 2:
+            # the postings of a bigram are exactly the names containing it
+            if folded not in self.bigram_postings:
+                return []
+            matches = self._ordered(self.bigram_postings, folded)
+        elif len(folded) == self.GRAM:
+            # as are the postings of a trigram
+            if folded not in self.postings:
+                return []
+            matches = self._ordered(self.postings, folded)
+        else:
+            grams = sorted(self.grams(folded), key=lambda gram: len(self.postings.get(gram, ())))
+            if grams[0] not in self.postings:
+                return []
+            keys = self._ordered(self.postings, grams[0])
+            others = [self.postings[gram] for gram in grams[1:]]
+            if limit is None:
+                # every candidate is needed: the postings are intersected as sets first
+                candidates = keys.keys()
+                for other in others:
+                    candidates &= other.keys()
+                matches = (key for key in keys if key in candidates and folded in self.names[key][1])
+            else:
+                matches = (key for key in keys if all(key in other for other in others) and folded in self.names[key][1])
+        return list(itertools.islice(matches, limit))
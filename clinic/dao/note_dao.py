@@ -18,3 +18,12 @@ class NoteDAO(ABC):
     @abstractmethod
     def list_notes(self):
         pass
+    @abstractmethod
+    def restore_note(self, note):
+        pass
+    def rekey(self, phn):
+        """Moves the notes to another PHN. DAOs that do not store notes by PHN only remember it."""
+        self.phn = phn
+    def flush(self):
+        """Writes changes still pending in memory. Synchronous DAOs have nothing to do."""
+        pass
@@ -0,0 +1,33 @@
+import threading
+from collections import OrderedDict
+
+class NoteDAOCache:
+    """
+    Least-recently-used eviction policy for the note DAOs of patient records.
+    At most max_open records keep their notes in memory; using the notes of
+    another record releases the note DAO that was used the longest time ago.
+    """
+
+    def __init__(self, max_open):
+        self.max_open = max_open
+        self.records = OrderedDict()
+        self.lock = threading.Lock()  # records are touched by concurrent readers
+
+    def touch(self, record):
+        """Marks a record's note DAO as used, evicting the least recently used ones."""
+        evicted = []
+        with self.lock:
+            if record in self.records:
+                self.records.move_to_end(record)
+                return
+
+            self.records[record] = None
+            while len(self.records) > self.max_open:
+                evicted.append(self.records.popitem(last=False)[0])
+        for record in evicted:
+            record.release_note_dao()
+
+    def discard(self, record):
+        """Stops tracking a record, e.g. when its patient is deleted."""
+        with self.lock:
+            self.records.pop(record, None)
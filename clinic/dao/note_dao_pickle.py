@@ -3,39 +3,82 @@ import datetime
 import pickle
 import os
 from .note_dao import NoteDAO
+from .file_sync import FileSync
+from .note_index import NoteIndex
 from clinic.note import Note
 
 class NoteDAOPickle(NoteDAO):
-    def __init__(self,phn,autosave:bool):
-        self.notes = []  # Array to store notes 
+    def __init__(self,phn,autosave:bool,flusher = None,file_sync = None,global_index = None,records_dir = "clinic/records"):
+        self.notes_by_code = {}  # notes keyed by code, in creation order
+        self.index = NoteIndex()  # trigram index for retrieve_notes
+        self.revision = 0  # save counter telling whether a saved index matches the saved notes
         
         if not autosave:
             self.autocounter = 1  # autocounter to assign unique IDs to notes
         
         self.autosave = autosave
         self.phn = phn
+        self.flusher = flusher  # optional WriteBehindFlusher deferring the saves
+        self.file_sync = file_sync or FileSync()  # atomic writes and fsync policy
+        self.global_index = global_index  # optional clinic-wide GlobalNoteIndex
+        self.records_dir = records_dir  # directory of the patients' notes files
 
-        self.filepath = f'clinic/records/{self.phn}.dat'
+        self.filepath = self._record_path()
         if self.autosave:
             #print("load notes called")
             self._load_notes()
 
+    @property
+    def notes(self):
+        """The notes in creation order."""
+        return list(self.notes_by_code.values())
+
+    @notes.setter
+    def notes(self, notes):
+        self.notes_by_code = {note.code: note for note in notes}
+        self.index = NoteIndex(self.notes_by_code.values())
+
+    def _record_path(self):
+        """Where the notes are stored; also identifies them for the write-behind flusher."""
+        return f'{self.records_dir}/{self.phn}.dat'
+
     def _load_notes(self):
         """Loads notes from a file for a specific patient (phn)."""
         #print("loading notes for ",self.phn)
         
+        data = self._read_notes() or {}
+        self.notes_by_code = {note.code: note for note in data.get('notes',[])}
+        self.revision = data.get('revision', 0)
+
+        # the saved index is only used if it was saved along with these notes
+        index = self._read_index(data)
+        if index and index.get('revision') == self.revision:
+            self.index = NoteIndex(postings=index['postings'])
+        else:
+            self.index = NoteIndex(self.notes_by_code.values())
+        # Update autocounter based on the latest note
+        self.autocounter = max(self.notes_by_code)+1 if self.notes_by_code else 1
+
+        if self.global_index is not None and not self.global_index.is_current(self.phn, self.revision):
+            self.global_index.reindex(self.phn, self.notes_by_code.values(), self.revision)
+
+        #print(f"Loaded {len(self.notes)} notes. Autocounter set to {self.autocounter}")
+
+    def _read_notes(self):
+        """Reads the pickled notes data, or None if there is no notes file yet."""
         try:
             with open(self.filepath, 'rb') as file:
-                data = pickle.load(file)
-                self.notes = data.get('notes',[])
-                # Update autocounter based on the latest note
-                if self.notes:
-                    self.autocounter = max(note.code for note in self.notes)+1 if self.notes else 1
+                return pickle.load(file)
         except FileNotFoundError:
-            self.notes = []
-            self.autocounter = 1
+            return None
 
-        #print(f"Loaded {len(self.notes)} notes. Autocounter set to {self.autocounter}")
+    def _read_index(self, data):
+        """The note index saved in the same file as the notes, or None if there is none."""
+        return data.get('index')
+
+    def exists(self):
+        """Whether notes were ever saved for this patient."""
+        return os.path.exists(self.filepath)
 
 
     def _save_notes(self):
@@ -44,18 +87,80 @@ class NoteDAOPickle(NoteDAO):
         if not self.autosave:
             return
 
+        if self.flusher is not None:
+            self.flusher.mark_dirty(self.filepath, self._write_notes)
+        else:
+            self._write_notes()
+
+    def _write_notes(self):
+        """Writes the notes file."""
+
         #print("saving notes in ",self.phn)
         #print("notes are: ")
         #for note in self.notes:
             #print(note)
 
-        if not os.path.exists("clinic/records"):
-    # Create the directory
-            os.makedirs("clinic/records")
+        # the records directory is created by the atomic write if needed
+        data = self._notes_data()
+        self.file_sync.write(self.filepath, lambda file: pickle.dump(data, file), binary=True)
+
+    def _notes_data(self):
+        """The next revision of the notes to save, with the note index saved along with them."""
+        self.revision += 1
+        self._saving()
+        index = {'revision': self.revision, 'postings': self.index.snapshot()}
+        return {'notes': self.notes, 'revision': self.revision, 'index': index}
 
-        with open(self.filepath, 'wb') as file:
-            data = {'notes': self.notes}
-            pickle.dump(data, file)
+    def _saving(self):
+        # the global index journals the notes before they are written
+        if self.global_index is not None:
+            self.global_index.saved(self.phn, self.revision)
+
+    def _index_globally(self, note):
+        if self.global_index is not None:
+            self.global_index.add(self.phn, note)
+
+    def flush(self):
+        """Writes a pending write-behind save of the notes now."""
+        if self.flusher is not None:
+            self.flusher.flush(self.filepath)
+
+    def rekey(self, phn):
+        """
+        Moves the notes to another PHN, replacing any notes left there by a
+        deleted patient. The saved notes are moved, not rewritten.
+        """
+        # a pending write-behind save still goes to the old files
+        self.flush()
+        old_phn, old_filepath = self.phn, self.filepath
+        self.phn = phn
+        self.filepath = self._record_path()
+        if self.autosave:
+            self._move_notes(old_phn, old_filepath)
+        if self.global_index is not None:
+            self.global_index.rekey(old_phn, phn)
+
+    def _move_notes(self, old_phn, old_filepath):
+        """Renames the notes file."""
+        if os.path.exists(old_filepath):
+            self.file_sync.rename(old_filepath, self.filepath)
+        elif os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def import_notes(self, notes):
+        """Replaces the notes with decoded note dictionaries (code, text, timestamp) and saves them."""
+        self.notes_by_code = {}
+        self.index = NoteIndex()
+        for note in notes:
+            timestamp = note.get("timestamp")
+            if isinstance(timestamp, str):
+                timestamp = datetime.datetime.fromisoformat(timestamp)
+            self.notes_by_code[note["code"]] = Note(note["code"], note["text"], timestamp)
+            self.index.add(self.notes_by_code[note["code"]])
+        self.autocounter = max(self.notes_by_code, default=0) + 1
+        if self.global_index is not None:
+            self.global_index.reindex(self.phn, self.notes_by_code.values(), self.revision)
+        self._save_notes()
 
     def create_note(self, text):
         """Creates a new note, assigns it a unique ID, and stores it in the collection."""
@@ -64,7 +169,9 @@ class NoteDAOPickle(NoteDAO):
         
         current_time = datetime.datetime.now()
         new_note = Note(self.autocounter,text,current_time)
-        self.notes.append(new_note)
+        self.notes_by_code[new_note.code] = new_note
+        self.index.add(new_note)
+        self._index_globally(new_note)
         self.autocounter += 1
         #print("autocounter value is: ",self.autocounter)
 
@@ -78,32 +185,26 @@ class NoteDAOPickle(NoteDAO):
 		
     def search_note(self, code):
         """Finds a note by its ID (key) if it exists."""
-        note = next((note for note in self.notes if note.code == code), None)
-        return note
+        return self.notes_by_code.get(code)
 
     def retrieve_notes(self, search_string):
         """Retrieves notes that contain the search string in their text."""
-        retrieved_notes = []
-
-        for note in self.notes:
-            if search_string in note.text:
-                retrieved_notes.append(note)
+        retrieved_notes = self.index.search(search_string, self.notes_by_code)
         
         return retrieved_notes
     
     
     def update_note(self, key, text):
         """Updates the text of an existing note by its ID."""
-        updated_note = None
-        for note in self.notes:
-            if note.code == key:
-                updated_note = note
-                break
+        updated_note = self.notes_by_code.get(key)
 
         if not updated_note:
             return False
 
+        self.index.remove(updated_note)
         updated_note.text = text
+        self.index.add(updated_note)
+        self._index_globally(updated_note)
         updated_note.timestamp = datetime.datetime.now()
 
         if self.autosave:
@@ -113,13 +214,16 @@ class NoteDAOPickle(NoteDAO):
 
     def delete_note(self,note_code):
 
-        original_count = len(self.notes)
-        self.notes = [note for note in self.notes if note.code != note_code]
+        deleted_note = self.notes_by_code.pop(note_code, None)
+        if deleted_note is not None:
+            self.index.remove(deleted_note)
+            if self.global_index is not None:
+                self.global_index.remove(self.phn, note_code)
 
         if self.autosave:
             self._save_notes()
         
-        if len(self.notes) < original_count:
+        if deleted_note is not None:
             #print(f"Note {note_code} deleted successfully")
             return True
         
@@ -129,12 +233,26 @@ class NoteDAOPickle(NoteDAO):
         
         
         
+    def restore_note(self, note):
+        """Puts a note back with its code and timestamp, e.g. to undo its update or deletion."""
+        previous = self.notes_by_code.get(note.code)
+        if previous is not None:
+            self.index.remove(previous)
+            self.notes_by_code[note.code] = note
+        else:
+            self.notes_by_code[note.code] = note
+            # keep the notes in creation order
+            self.notes_by_code = dict(sorted(self.notes_by_code.items()))
+        self.index.add(note)
+        self._index_globally(note)
+        self.autocounter = max(self.autocounter, note.code + 1)
+
+        if self.autosave:
+            self._save_notes()
+
     def list_notes(self):
         """Returns a list of all notes."""
         
-        notes_list = []
-
-        for i in range(-1,-len(self.notes)-1,-1):
-            notes_list.append(self.notes[i])
+        notes_list = list(reversed(self.notes_by_code.values()))
 
         return notes_list
\ No newline at end of file
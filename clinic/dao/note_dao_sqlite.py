@@ -0,0 +1,81 @@
+# clinic/dao/note_dao_sqlite.py
+import datetime
+from .note_dao import NoteDAO
+from clinic.note import Note
+
+class NoteDAOSQLite(NoteDAO):
+    """Note DAO for one patient, backed by the notes table of a shared SQLite connection."""
+
+    def __init__(self, phn, connection, batch=None):
+        self.phn = phn
+        self.connection = connection
+        # the patient DAO's batch, so changes made inside one are committed or rolled back with it
+        self.batch = batch or (lambda: connection)
+
+    @staticmethod
+    def _to_note(row):
+        code, text, timestamp = row
+        return Note(code, text, datetime.datetime.fromisoformat(timestamp))
+
+    @property
+    def notes(self):
+        """All notes of the patient, from the oldest to the newest."""
+        rows = self.connection.execute(
+            "SELECT code, text, timestamp FROM notes WHERE phn = ? ORDER BY code", (self.phn,))
+        return [self._to_note(row) for row in rows]
+
+    def create_note(self, text):
+        """Creates a new note, assigns it a unique ID, and stores it in the database."""
+        # the code is assigned by the insert itself, so note DAOs of the same patient,
+        # e.g. of two sessions, never hand out the same code
+        timestamp = datetime.datetime.now()
+        with self.batch():
+            self.connection.execute(
+                "INSERT INTO notes (phn, code, text, timestamp) "
+                "SELECT ?, COALESCE(MAX(code), 0) + 1, ?, ? FROM notes WHERE phn = ?",
+                (self.phn, text, timestamp.isoformat(), self.phn))
+            (code,) = self.connection.execute(
+                "SELECT MAX(code) FROM notes WHERE phn = ?", (self.phn,)).fetchone()
+
+        return Note(code, text, timestamp)
+
+    def search_note(self, code):
+        """Finds a note by its ID (key) if it exists."""
+        row = self.connection.execute(
+            "SELECT code, text, timestamp FROM notes WHERE phn = ? AND code = ?", (self.phn, code)).fetchone()
+        return self._to_note(row) if row else None
+
+    def retrieve_notes(self, search_string):
+        """Retrieves notes that contain the search string in their text."""
+        rows = self.connection.execute(
+            "SELECT code, text, timestamp FROM notes WHERE phn = ? AND instr(text, ?) > 0 ORDER BY code",
+            (self.phn, search_string))
+        return [self._to_note(row) for row in rows]
+
+    def update_note(self, key, text):
+        """Updates the text of an existing note by its ID."""
+        with self.batch():
+            cursor = self.connection.execute(
+                "UPDATE notes SET text = ?, timestamp = ? WHERE phn = ? AND code = ?",
+                (text, datetime.datetime.now().isoformat(), self.phn, key))
+        return cursor.rowcount > 0
+
+    def delete_note(self, note_code):
+        """Deletes a note by its ID."""
+        with self.batch():
+            cursor = self.connection.execute(
+                "DELETE FROM notes WHERE phn = ? AND code = ?", (self.phn, note_code))
+        return cursor.rowcount > 0
+
+    def restore_note(self, note):
+        """Puts a note back with its code and timestamp, e.g. to undo its update or deletion."""
+        with self.batch():
+            self.connection.execute(
+                "INSERT OR REPLACE INTO notes (phn, code, text, timestamp) VALUES (?, ?, ?, ?)",
+                (self.phn, note.code, note.text, note.timestamp.isoformat()))
+
+    def list_notes(self):
+        """Returns a list of all notes, from the newest to the oldest."""
+        rows = self.connection.execute(
+            "SELECT code, text, timestamp FROM notes WHERE phn = ? ORDER BY code DESC", (self.phn,))
+        return [self._to_note(row) for row in rows]
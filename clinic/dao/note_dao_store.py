@@ -0,0 +1,58 @@
+import os
+import pickle
+from .note_dao_pickle import NoteDAOPickle
+
+class NoteDAOStore(NoteDAOPickle):
+    """
+    Note DAO keeping a patient's notes in a shared NoteStore instead of a
+    records file of their own. Reads go through the store's offset index and
+    every save appends to the store.
+
+    Notes saved in a records file of the patient in records_dir, before the
+    clinic used the store, are moved into the store when they are first read.
+    """
+
+    def __init__(self, phn, autosave: bool, store, flusher=None, file_sync=None, global_index=None, records_dir="clinic/records"):
+        self.store = store
+        super().__init__(phn, autosave, flusher=flusher, file_sync=file_sync, global_index=global_index, records_dir=records_dir)
+
+    def _record_path(self):
+        """Identifies the patient's notes in the store, e.g. for the write-behind flusher."""
+        return f'{self.store.filepath}#{self.phn}'
+
+    def _legacy_path(self):
+        return f'{self.records_dir}/{self.phn}.dat'
+
+    def _read_notes(self):
+        data = self.store.read(self.phn)
+        if data is None and self.autosave:
+            with self.store.lock:
+                # checked again, another reader may have moved the notes meanwhile
+                data = self.store.read(self.phn)
+                if data is None:
+                    data = self._import_legacy_notes()
+        return data
+
+    def _import_legacy_notes(self):
+        """Moves the records file of the patient into the store, or returns None if there is none."""
+        legacy_path = self._legacy_path()
+        try:
+            with open(legacy_path, 'rb') as file:
+                data = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        self.store.write(self.phn, data)
+        # removed once in the store, so notes deleted later do not come back
+        for path in (legacy_path, os.path.splitext(legacy_path)[0] + '.idx'):
+            if os.path.exists(path):
+                os.remove(path)
+        return data
+
+    def exists(self):
+        return self.phn in self.store or os.path.exists(self._legacy_path())
+
+    def _move_notes(self, old_phn, old_filepath):
+        self.store.rename(old_phn, self.phn)
+
+    def _write_notes(self):
+        self.store.write(self.phn, self._notes_data())
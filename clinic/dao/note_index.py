@@ -0,0 +1,64 @@
+import threading
+
+class NoteIndex:
+    """
+    Inverted index of a patient's notes: every trigram (three consecutive
+    characters) of a note's text maps to the codes of the notes containing it.
+
+    Note search is a case-sensitive substring test, so indexing trigrams
+    rather than words keeps its semantics: a note can only contain the search
+    text if it contains every trigram of it. Searching intersects those
+    posting lists, smallest first, and only tests the remaining candidates.
+    """
+
+    GRAM = 3
+
+    def __init__(self, notes=(), postings=None):
+        self.lock = threading.Lock()
+        if postings is not None:
+            self.postings = postings
+        else:
+            self.postings = {}  # trigram -> set of note codes
+            for note in notes:
+                self.add(note)
+
+    @classmethod
+    def grams(cls, text):
+        return {text[i:i + cls.GRAM] for i in range(len(text) - cls.GRAM + 1)}
+
+    def add(self, note):
+        with self.lock:
+            for gram in self.grams(note.text):
+                self.postings.setdefault(gram, set()).add(note.code)
+
+    def remove(self, note):
+        with self.lock:
+            for gram in self.grams(note.text):
+                codes = self.postings.get(gram)
+                if codes is not None:
+                    codes.discard(note.code)
+                    if not codes:
+                        del self.postings[gram]
+
+    def search(self, search_string, notes_by_code):
+        """Returns the notes containing search_string, in creation (code) order."""
+        if len(search_string) < self.GRAM:
+            # too short to have a trigram, every note is a candidate
+            return [note for note in notes_by_code.values() if search_string in note.text]
+
+        postings = []
+        for gram in self.grams(search_string):
+            codes = self.postings.get(gram)
+            if not codes:
+                return []
+            postings.append(codes)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+
+        notes = (notes_by_code[code] for code in sorted(candidates) if code in notes_by_code)
+        return [note for note in notes if search_string in note.text]
+
+    def snapshot(self):
+        """A copy of the posting lists that can be saved while notes keep changing."""
+        with self.lock:
+            return {gram: set(codes) for gram, codes in self.postings.items()}
@@ -0,0 +1,201 @@
+import os
+import pickle
+import struct
+import threading
+import uuid
+from .file_sync import FileSync
+
+class NoteStore:
+    """
+    Consolidated storage for the notes of every patient: one append-only file
+    instead of one records file per patient.
+
+    The file starts with a header holding a generation id, followed by records
+    of (PHN, pickled notes). Saving a patient's notes appends a new record; an
+    offset index keyed by PHN points to the latest one. Records with empty data
+    are tombstones for removed notes. Once superseded records take more room
+    than live ones the file is compacted into a new generation.
+
+    The index is kept in a side file, saved every index_interval appends and
+    on save_index(); records appended after it was saved are scanned on open.
+    """
+
+    MAGIC = b"CLINICNOTES1"
+    HEADER = struct.Struct(">12s16s")
+    RECORD = struct.Struct(">4sII")  # record magic, PHN length, data length
+    RECORD_MAGIC = b"NOTE"
+
+    def __init__(self, filepath="clinic/records/notes.store", file_sync=None, index_interval=1000, min_compaction_bytes=1 << 20):
+        self.filepath = filepath
+        self.index_filepath = filepath + ".idx"
+        self.file_sync = file_sync or FileSync()
+        self.index_interval = index_interval
+        self.min_compaction_bytes = min_compaction_bytes
+        self.lock = threading.RLock()
+
+        self.index = {}  # str(phn) -> (data offset, data length)
+        self.live_bytes = 0
+        self.size = 0
+        self.unindexed = 0
+        self.generation = None
+        self._open()
+
+    def __contains__(self, phn):
+        return str(phn) in self.index
+
+    def read(self, phn):
+        """Returns the unpickled notes data saved for a PHN, or None."""
+        with self.lock:
+            location = self.index.get(str(phn))
+            if location is None:
+                return None
+            offset, length = location
+            with open(self.filepath, "rb") as file:
+                file.seek(offset)
+                return pickle.loads(file.read(length))
+
+    def write(self, phn, data):
+        """Appends the notes data of a PHN, which supersedes its previous record."""
+        self._append((str(phn), pickle.dumps(data)))
+
+    def delete(self, phn):
+        """Appends a tombstone removing the notes of a PHN."""
+        if phn in self:
+            self._append((str(phn), b""))
+
+    def rename(self, phn, new_phn):
+        """
+        Moves the notes of a PHN to another one, replacing the notes saved for
+        it, with one append: a copy of the record under the new PHN and a
+        tombstone for the old one.
+        """
+        with self.lock:
+            location = self.index.get(str(phn))
+            if location is None:
+                self.delete(new_phn)
+                return
+            offset, length = location
+            with open(self.filepath, "rb") as file:
+                file.seek(offset)
+                data = file.read(length)
+            self._append((str(new_phn), data), (str(phn), b""))
+
+    def save_index(self):
+        """Saves the offset index so opening the store does not rescan the file."""
+        with self.lock:
+            if not self.unindexed:
+                return
+            state = {"generation": self.generation, "size": self.size, "index": self.index}
+            self.file_sync.write(self.index_filepath, lambda file: pickle.dump(state, file), binary=True)
+            self.unindexed = 0
+
+    def compact(self):
+        """Rewrites the store with only the latest record of each PHN."""
+        with self.lock:
+            generation = uuid.uuid4().bytes
+            index = {}
+
+            def dump(file):
+                position = file.write(self.HEADER.pack(self.MAGIC, generation))
+                with open(self.filepath, "rb") as source:
+                    for key, (offset, length) in self.index.items():
+                        source.seek(offset)
+                        position += self._write_record(file, key, source.read(length))
+                        index[key] = (position - length, length)
+
+            self.file_sync.write(self.filepath, dump, binary=True)
+            self.generation = generation
+            self.index = index
+            self.size = os.path.getsize(self.filepath)
+            self.live_bytes = self.size - self.HEADER.size
+            self.unindexed = 1
+            self.save_index()
+
+    def _open(self):
+        try:
+            with open(self.filepath, "rb") as file:
+                magic, generation = self.HEADER.unpack(file.read(self.HEADER.size))
+        except FileNotFoundError:
+            return self._create()
+        except struct.error:
+            magic = generation = None
+        if magic != self.MAGIC:
+            raise ValueError("%s is not a note store" % self.filepath)
+        self.generation = generation
+
+        # start from the saved index when it belongs to this generation of the file
+        start = self.HEADER.size
+        try:
+            with open(self.index_filepath, "rb") as file:
+                state = pickle.load(file)
+            if state["generation"] == generation and state["size"] <= os.path.getsize(self.filepath):
+                self.index = state["index"]
+                start = state["size"]
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, KeyError):
+            pass
+        self.live_bytes = sum(self.RECORD.size + len(key.encode()) + length for key, (offset, length) in self.index.items())
+        self._scan(start)
+
+    def _create(self):
+        self.generation = uuid.uuid4().bytes
+        header = self.HEADER.pack(self.MAGIC, self.generation)
+        self.file_sync.write(self.filepath, lambda file: file.write(header), binary=True)
+        self.size = self.HEADER.size
+
+    def _scan(self, offset):
+        """Indexes the records from offset to the end, cutting off a torn last record."""
+        size = os.path.getsize(self.filepath)
+        with open(self.filepath, "rb") as file:
+            file.seek(offset)
+            while offset < size:
+                header = file.read(self.RECORD.size)
+                if len(header) < self.RECORD.size:
+                    break
+                magic, key_length, length = self.RECORD.unpack(header)
+                end = offset + self.RECORD.size + key_length + length
+                if magic != self.RECORD_MAGIC or end > size:
+                    break
+                key = file.read(key_length).decode()
+                file.seek(length, os.SEEK_CUR)
+                self._index(key, end - length, length)
+                self.unindexed += 1
+                offset = end
+
+        if offset < size:
+            os.truncate(self.filepath, offset)
+        self.size = offset
+
+    def _index(self, key, offset, length):
+        previous = self.index.pop(key, None)
+        if previous is not None:
+            self.live_bytes -= self.RECORD.size + len(key.encode()) + previous[1]
+        if length:
+            self.index[key] = (offset, length)
+            self.live_bytes += self.RECORD.size + len(key.encode()) + length
+
+    def _write_record(self, file, key, data):
+        encoded_key = key.encode()
+        file.write(self.RECORD.pack(self.RECORD_MAGIC, len(encoded_key), len(data)))
+        file.write(encoded_key)
+        file.write(data)
+        return self.RECORD.size + len(encoded_key) + len(data)
+
+    def _append(self, *records):
+        """Appends (key, data) records in one write."""
+        with self.lock:
+            chunks = []
+            for key, data in records:
+                encoded_key = key.encode()
+                chunks += [self.RECORD.pack(self.RECORD_MAGIC, len(encoded_key), len(data)), encoded_key, data]
+            offset = self.file_sync.append(self.filepath, b"".join(chunks))
+            for key, data in records:
+                offset += self.RECORD.size + len(key.encode()) + len(data)
+                self._index(key, offset - len(data), len(data))
+                self.unindexed += 1
+            self.size = offset
+
+            garbage = self.size - self.HEADER.size - self.live_bytes
+            if garbage > max(self.live_bytes, self.min_compaction_bytes):
+                self.compact()
+            elif self.unindexed >= self.index_interval:
+                self.save_index()
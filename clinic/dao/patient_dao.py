@@ -1,3 +1,4 @@
+import contextlib
 from abc import ABC, abstractmethod
 class PatientDAO(ABC):
     @abstractmethod
@@ -18,3 +19,37 @@ class PatientDAO(ABC):
     @abstractmethod
     def list_patients(self):
         pass
+    @abstractmethod
+    def retrieve_patients_by_phone(self, phone):
+        pass
+    @abstractmethod
+    def retrieve_patients_by_email(self, email):
+        pass
+    @abstractmethod
+    def retrieve_patients_by_birth_date(self, birth_date):
+        pass
+    @abstractmethod
+    def retrieve_patients_by_birth_date_range(self, start, end):
+        pass
+    @abstractmethod
+    def query_patients(self, query):
+        pass
+    @abstractmethod
+    def fuzzy_search_patients(self, search_string, limit=None):
+        pass
+    @abstractmethod
+    def search_notes(self, search_string, offset=0, limit=None):
+        pass
+    @abstractmethod
+    def rekey_patient(self, key, patient):
+        pass
+    @contextlib.contextmanager
+    def batch(self):
+        """Groups changes so they are persisted once, when the outermost batch ends."""
+        yield self
+    def flush(self):
+        """Writes changes still pending in memory. Synchronous DAOs have nothing to do."""
+        pass
+    def sync(self):
+        """Forces the changes written so far to disk, according to the DAO's fsync policy."""
+        pass
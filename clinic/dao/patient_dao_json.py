@@ -1,43 +1,399 @@
+import contextlib
+import datetime
+import functools
 import json
+import threading
 from .patient_dao import PatientDAO  # Importing the abstract base class
 from .patient_encoder import PatientEncoder
 from .patient_decoder import PatientDecoder
+from .patient_stream_decoder import PatientStreamDecoder
+from .note_dao_pickle import NoteDAOPickle
+from .note_dao_store import NoteDAOStore
+from .file_sync import FileSync
+from .global_note_index import GlobalNoteIndex
+from .name_index import NameIndex
+from .phonetic_index import PhoneticIndex
+from .hash_index import HashIndex, normalize_phone, normalize_email, normalize_email_domain
+from .sorted_index import SortedIndex, parse_birth_date
 import os
 class PatientDAOJSON(PatientDAO):
-    def __init__(self, autosave):
+    # Format 1 copied every patient's notes inside patients.json; format 2
+    # only stores the demographic fields and a {"version": 2} entry.
+    FORMAT_VERSION = 2
+
+    def __init__(self, autosave, journal=False, snapshot_interval=1000, filepath="clinic/patients.json", note_cache=None, progress=None, flusher=None, file_sync=None, note_store=None, global_note_index=None, records_dir="clinic/records"):
         # Initialize an empty dictionary to store patients, keyed by their unique identifier (e.g., phn)
         self.patients = {}
         self.autosave = autosave
-        self.filepath = "clinic/patients.json"
+        self.filepath = filepath
+
+        # In journal mode every mutation appends one record to the journal file
+        # instead of rewriting the whole snapshot; the snapshot is only rewritten
+        # (and the journal truncated) every snapshot_interval records.
+        self.journal = journal
+        self.journal_filepath = os.path.splitext(self.filepath)[0] + ".journal"
+        self.snapshot_interval = snapshot_interval
+        self.journal_length = 0
+        self.pending_journal = []
+        self.journal_lock = threading.Lock()
+
+        # inside batch() changes are only persisted once, when the outermost batch ends;
+        # its journal records wait in batch_journal so a background flush cannot write part of it
+        self.batch_depth = 0
+        self.batch_changed = False
+        self.batch_journal = []
+
+        # optional WriteBehindFlusher deferring the saves of the patients and their notes
+        self.flusher = flusher
+
+        # atomic saves, forced to disk according to the FileSync's fsync policy
+        self.file_sync = file_sync or FileSync()
+
+        # note DAOs of the patients' records share the write-behind and fsync policies,
+        # and keep the notes in the optional consolidated NoteStore instead of one file each in records_dir
+        self.note_store = note_store
+        # optional GlobalNoteIndex the note DAOs keep up to date for search_notes
+        self.global_note_index = global_note_index
+        if note_store is not None:
+            self.note_dao_factory = functools.partial(NoteDAOStore, store=note_store, flusher=self.flusher, file_sync=self.file_sync,
+                                                      global_index=global_note_index, records_dir=records_dir)
+        else:
+            self.note_dao_factory = functools.partial(NoteDAOPickle, flusher=self.flusher, file_sync=self.file_sync,
+                                                      global_index=global_note_index, records_dir=records_dir)
+
+        # optional NoteDAOCache bounding how many records keep their notes in memory
+        self.note_cache = note_cache
+
+        # optional progress(bytes_read, total_bytes) callback while the patients file is loaded
+        self.progress = progress
+
+        # The notes files of a patient are moved to a new PHN right away, while the
+        # patient's change may wait for a write-behind flush or the end of a batch.
+        # Every move is journaled first with an id, and the patients writes record
+        # the last move they include, so a move whose patient change never reached
+        # the disk is undone on load (see recover_rekeys).
+        self.rekeys_filepath = os.path.splitext(self.filepath)[0] + ".rekeys"
+        self.rekey_id = 0  # id of the last journaled move
+        self.applied_rekey_id = 0  # id of the last move whose patient change is in self.patients
+        self.settled_rekey_id = 0  # id of the last move whose patient change is saved
 
         loaded_patients = self.load_patients()
         if autosave and loaded_patients is not None:
             #print("load patients called")
             self.patients = loaded_patients
 
+        # trigram index over the names for retrieve_patients, phonetic keys for fuzzy_search_patients
+        self.name_index = NameIndex()
+        self.phonetic_index = PhoneticIndex()
+        # secondary indexes on the phone number, email address and birth date,
+        # the birth dates parsed once into day ordinals
+        self.phone_index = HashIndex(normalize_phone)
+        self.email_index = HashIndex(normalize_email)
+        self.email_domain_index = HashIndex(normalize_email_domain)
+        self.birth_date_index = SortedIndex()
+        for patient in self.patients.values():
+            self.attach_record(patient)
+            self.index_patient(patient.phn, patient, birth_date=False)
+        # the birth dates are sorted once instead of inserted one at a time
+        self.birth_date_index.add_many((phn, self.birth_day(patient)) for phn, patient in self.patients.items())
+
+        if autosave and global_note_index is not None and not global_note_index.loaded:
+            self.build_global_note_index()
+
+    def attach_record(self, patient):
+        """Puts the patient's record under the DAO's note eviction and write-behind policies."""
+        if self.note_cache is not None:
+            patient.record.note_cache = self.note_cache
+        if patient.record.note_dao_factory is NoteDAOPickle:
+            patient.record.note_dao_factory = self.note_dao_factory
+
+    def index_patient(self, phn, patient, birth_date=True):
+        """Adds a patient to the search indexes, or updates them after the patient changed."""
+        self.name_index.add(phn, patient.name)
+        self.phonetic_index.add(phn, patient.name)
+        self.phone_index.add(phn, patient.phone)
+        self.email_index.add(phn, patient.email)
+        self.email_domain_index.add(phn, patient.email)
+        if birth_date:
+            self.birth_date_index.add(phn, self.birth_day(patient))
+
+    @staticmethod
+    def birth_day(patient):
+        """The birth date of a patient as a day ordinal, or None if it is not a valid date."""
+        birth_date = parse_birth_date(patient.birth_date)
+        return birth_date.toordinal() if birth_date else None
+
+    def unindex_patient(self, phn):
+        self.name_index.remove(phn)
+        self.phonetic_index.remove(phn)
+        self.phone_index.remove(phn)
+        self.email_index.remove(phn)
+        self.email_domain_index.remove(phn)
+        self.birth_date_index.remove(phn)
+
+    def build_global_note_index(self):
+        """Indexes the notes of every patient, loading their records one at a time."""
+        for phn in self.patients:
+            # loading a record reindexes its notes; the note DAO is not kept
+            self.note_dao_factory(phn, True)
+        self.global_note_index.save()
+
     def load_patients(self):
         #print("entered loading patients")
 
+        decoder = PatientStreamDecoder(progress=self.progress)
         try:
-            with open("clinic/patients.json", "r") as file:
-                self.patients = json.load(file, cls=PatientDecoder)
+            with open(self.filepath, "rb") as file:
+                self.patients = decoder.decode(file)
                 #print("patients loaded")
                 #print(self.patients)
                 #print(type(self.patients))
         except FileNotFoundError:
-            return {}
+            pass
+
+        # a journal left by journal mode is applied even when this DAO does not
+        # journal: its changes are not in the snapshot yet
+        self.replay_journal()
+        if self.autosave:
+            self.recover_rekeys()
+
+        if decoder.version is not None and decoder.version < self.FORMAT_VERSION and self.autosave:
+            self.migrate_patients(decoder.embedded_notes)
+
+    def migrate_patients(self, embedded_notes):
+        """
+        One-time migration of a format 1 patients file: notes that only exist
+        as a copy inside patients.json are moved to the patient's records file,
+        then the file is rewritten in the current format.
+        """
+        for phn, notes in embedded_notes.items():
+            note_dao = self.note_dao_factory(phn, True)
+            if not note_dao.exists():
+                note_dao.import_notes(notes)
+        self.save_patients()
+
+    def replay_journal(self):
+        """
+        Applies the journal tail on top of the loaded snapshot. A record is
+        complete once its newline is written: a torn last record from a crash
+        mid-append is ignored, and cut off so the next append starts on a
+        fresh line instead of being glued onto it.
+        """
+        self.journal_length = 0
+        decoder = PatientDecoder()
+        complete = 0  # bytes of the journal holding complete records
+        try:
+            with open(self.journal_filepath, "rb") as file:
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        break
+                    if not line.strip():
+                        complete += len(line)
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    complete += len(line)
+                    if entry["op"] == "put":
+                        patient = decoder.to_patient(entry["patient"])
+                        self.patients[patient.phn] = patient
+                    elif entry["op"] == "delete":
+                        self.patients.pop(entry["phn"], None)
+                    elif entry["op"] == "rekey":
+                        self.patients.pop(entry["phn"], None)
+                        patient = decoder.to_patient(entry["patient"])
+                        self.patients[patient.phn] = patient
+                        self.settled_rekey_id = max(self.settled_rekey_id, entry.get("rekey_id") or 0)
+                    self.journal_length += 1
+        except FileNotFoundError:
+            return
+
+        if self.autosave and os.path.getsize(self.journal_filepath) > complete:
+            self.file_sync.truncate(self.journal_filepath, complete)
+
+    def recover_rekeys(self):
+        """
+        Moves the notes back to the old PHN for the journaled moves whose
+        patient change was not saved, the latest first, and clears the moves.
+        """
+        moves = []
+        try:
+            with open(self.rekeys_filepath, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a torn last line is a move that was not made yet
+                        break
+                    if "settled" in entry:
+                        self.settled_rekey_id = max(self.settled_rekey_id, entry["settled"])
+                    else:
+                        moves.append(entry)
+        except FileNotFoundError:
+            pass
+
+        for move in reversed(moves):
+            if move["id"] <= self.settled_rekey_id:
+                continue
+            # the notes are only moved back if the move was made, not over notes of the old PHN
+            note_dao = self.note_dao_factory(move["new_phn"], True)
+            if note_dao.exists() and not self.note_dao_factory(move["phn"], True).exists():
+                note_dao.rekey(move["phn"])
+
+        self.rekey_id = max([self.settled_rekey_id] + [move["id"] for move in moves])
+        self.applied_rekey_id = self.settled_rekey_id = self.rekey_id
+        self.clear_rekeys()
+
+    def clear_rekeys(self):
+        if os.path.exists(self.rekeys_filepath):
+            os.remove(self.rekeys_filepath)
+
+    def journal_rekey(self, key, new_key):
+        """Journals the move of the notes of a patient to a new PHN before it is made; returns its id."""
+        with self.journal_lock:
+            self.rekey_id += 1
+            self.file_sync.append(self.rekeys_filepath, json.dumps({"id": self.rekey_id, "phn": key, "new_phn": new_key}) + "\n")
+            return self.rekey_id
+
+    def settle_rekeys(self, rekey_id):
+        """Records that the patient changes of the moves up to rekey_id are saved."""
+        with self.journal_lock:
+            if rekey_id <= self.settled_rekey_id:
+                return
+            self.settled_rekey_id = rekey_id
+            if rekey_id == self.rekey_id:
+                # no move is waiting for its patient change
+                self.clear_rekeys()
+            else:
+                self.file_sync.append(self.rekeys_filepath, json.dumps({"settled": rekey_id}) + "\n")
 
     def save_patients(self):
         if self.autosave:
-            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
             #print(f"Saving {len(self.patients)} patients to {self.filepath}")
             #print("Saving to:", os.path.abspath(self.filepath))
 
-            with open(self.filepath, "w") as file:
-                json.dump(self.patients, file, cls=PatientEncoder)
-                #print("file saved successfully")
-                
-    #done 
+            # the moves of notes up to here have their patient change in the saved patients
+            applied_rekey_id = self.applied_rekey_id
+            data = {"version": self.FORMAT_VERSION}
+            data.update(self.patients)
+            self.file_sync.write(self.filepath, lambda file: json.dump(data, file, cls=PatientEncoder))
+            #print("file saved successfully")
+
+            if self.journal or os.path.exists(self.journal_filepath):
+                # the snapshot now holds every journaled change
+                self.file_sync.write(self.journal_filepath, lambda file: None)
+                self.journal_length = 0
+            self.settle_rekeys(applied_rekey_id)
+
+    def append_journal(self, entry):
+        """Appends one mutation record to the journal, compacting it when it gets too long."""
+        if not self.autosave:
+            return
+
+        line = json.dumps(entry, cls=PatientEncoder) + "\n"
+        if self.batch_depth:
+            self.batch_journal.append(line)
+            self.batch_changed = True
+            return
+
+        with self.journal_lock:
+            self.pending_journal.append(line)
+        if self.flusher is not None:
+            self.flusher.mark_dirty(self.journal_filepath, self.write_journal)
+        else:
+            self.write_journal()
+
+    def write_journal(self):
+        """Writes the pending journal records in one append (group commit)."""
+        with self.journal_lock:
+            lines, self.pending_journal = self.pending_journal, []
+        if not lines:
+            return
+
+        self.file_sync.append(self.journal_filepath, "".join(lines))
+        self.journal_length += len(lines)
+
+        if self.journal_length >= self.snapshot_interval:
+            self.save_patients()
+
+    def persist_put(self, patient):
+        """Persists a created or updated patient."""
+        if self.journal:
+            self.append_journal({"op": "put", "patient": patient})
+        else:
+            self.schedule_save()
+
+    def persist_rekey(self, key, patient, rekey_id=None):
+        """Persists the move of a patient to a new PHN, with the id of the journaled move of its notes."""
+        if self.journal:
+            self.append_journal({"op": "rekey", "phn": key, "patient": patient, "rekey_id": rekey_id})
+        else:
+            self.schedule_save()
+
+    def persist_delete(self, key):
+        """Persists the removal of a patient."""
+        if self.journal:
+            self.append_journal({"op": "delete", "phn": key})
+        else:
+            self.schedule_save()
+
+    def schedule_save(self):
+        """Saves the patients now, or on the next write-behind flush."""
+        if self.batch_depth:
+            self.batch_changed = True
+        elif self.flusher is not None:
+            self.flusher.mark_dirty(self.filepath, self.save_patients)
+        else:
+            self.save_patients()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Groups changes so they are persisted once: as one journal append, or
+        one save of the patients file, when the outermost batch ends.
+
+        If the outermost batch raises, its journal records are dropped: the
+        caller is expected to have undone the changes in memory. Without a
+        journal the patients are saved anyway, in case a background flush
+        wrote some of the changes.
+        """
+        self.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self.batch_depth == 1:
+                self.batch_journal = []
+            raise
+        finally:
+            self.batch_depth -= 1
+            if not self.batch_depth and self.batch_changed:
+                self.batch_changed = False
+                if self.journal:
+                    with self.journal_lock:
+                        self.pending_journal.extend(self.batch_journal)
+                    self.batch_journal = []
+                    if self.flusher is not None:
+                        self.flusher.mark_dirty(self.journal_filepath, self.write_journal)
+                    else:
+                        self.write_journal()
+                else:
+                    self.schedule_save()
+
+    def flush(self):
+        """Writes the pending write-behind saves of the patients and their notes."""
+        if self.flusher is not None:
+            self.flusher.flush()
+        if self.note_store is not None:
+            self.note_store.save_index()
+        if self.global_note_index is not None:
+            self.global_note_index.save()
+
+    def sync(self):
+        """Forces the files written since the last sync to disk."""
+        self.file_sync.sync()
+
+    #done
     def search_patient(self, key):
         """Searches for a patient by a specific key (e.g., phn)."""
         #print("search ",self.patients.get(key))
@@ -46,57 +402,203 @@ class PatientDAOJSON(PatientDAO):
     #done
     def create_patient(self, patient):
         """Adds a new patient to the in-memory collection."""
-        
+
         self.patients[patient.phn] = patient
-            
+        self.attach_record(patient)
+        self.index_patient(patient.phn, patient)
+
         if self.autosave:  # Save to file if autosave is enabled
             #print("patients saved in create")
-            self.save_patients()
+            self.persist_put(patient)
 
     #done
     def retrieve_patients(self, search_string):
         """Retrieves all patients that match a given search string."""
-        # Assuming search_string might match with part of the patient's data, such as name
-        matching_patients = [
-            patient for patient in self.patients.values()
-            if search_string.lower() in patient.name.lower()
-        ]
+        # the name index finds the patients whose name contains the search string, ignoring case
+        matching_patients = [self.patients[phn] for phn in self.name_index.search(search_string)]
 
         if not matching_patients:
             return []
-        
+
         return matching_patients
 
+    def fuzzy_search_patients(self, search_string, limit=None):
+        """Retrieves the patients whose name sounds like the search string, closest spelling first."""
+        return [self.patients[phn] for phn in self.phonetic_index.search(search_string, limit)]
+
+    def retrieve_patients_by_phone(self, phone):
+        """Retrieves the patients with this phone number, ignoring separators."""
+        return [self.patients[phn] for phn in self.phone_index.lookup(phone)]
+
+    def retrieve_patients_by_email(self, email):
+        """Retrieves the patients with this email address, ignoring case."""
+        return [self.patients[phn] for phn in self.email_index.lookup(email)]
+
+    def retrieve_patients_by_birth_date(self, birth_date):
+        """Retrieves the patients born on this date."""
+        return self.retrieve_patients_by_birth_date_range(birth_date, birth_date)
+
+    def retrieve_patients_by_birth_date_range(self, start, end):
+        """Retrieves the patients born from start to end, both included, the oldest first."""
+        start, end = parse_birth_date(start), parse_birth_date(end)
+        if start is None or end is None:
+            return []
+        return [self.patients[phn] for phn in self.birth_date_index.range(start.toordinal(), end.toordinal())]
+
+    def plan_query(self, query):
+        """
+        Chooses how to run a PatientQuery: the name of the most selective index
+        applying to one of its predicates, with the candidates it yields, or
+        "scan" when no index applies.
+        """
+        plans = []
+        if query.email_domain is not None:
+            plans.append((len(self.email_domain_index.postings.get(query.email_domain, ())), "email_domain",
+                          lambda: self.email_domain_index.lookup(query.email_domain)))
+        if query.has_birth_date_range:
+            low, high = self.birth_day_range(query)
+            plans.append((self.birth_date_index.count(low, high), "birth_date", lambda: self.birth_date_index.range(low, high)))
+        if query.name is not None and self.name_index.estimate(query.name) is not None:
+            plans.append((self.name_index.estimate(query.name), "name", lambda: self.name_index.search(query.name)))
+        if query.notes is not None and self.global_note_index is not None:
+            plans.append((self.global_note_index.estimate(query.notes), "notes",
+                          lambda: list(dict.fromkeys(phn for phn, code in self.global_note_index.search(query.notes)))))
+        if not plans:
+            return "scan", lambda: list(self.patients)
+        estimate, index, candidates = min(plans, key=lambda plan: plan[0])
+        return index, candidates
+
+    @staticmethod
+    def birth_day_range(query):
+        low = query.birth_date_from.toordinal() if query.birth_date_from is not None else 1
+        high = query.birth_date_to.toordinal() if query.birth_date_to is not None else datetime.date.max.toordinal()
+        return low, high
+
+    def query_patients(self, query):
+        """
+        Retrieves the page of patients matching every predicate of a PatientQuery.
+        The candidates come from the most selective index (see plan_query) and are
+        filtered with the other predicates.
+        """
+        index, candidates = self.plan_query(query)
+        tests = []
+        if query.name is not None and index != "name":
+            folded = query.name.casefold()
+            tests.append(lambda phn: folded in self.name_index.names[phn][1])
+        if query.has_birth_date_range and index != "birth_date":
+            low, high = self.birth_day_range(query)
+            tests.append(lambda phn: phn in self.birth_date_index.values and low <= self.birth_date_index.values[phn][0] <= high)
+        if query.email_domain is not None and index != "email_domain":
+            tests.append(lambda phn: self.email_domain_index.values.get(phn) == query.email_domain)
+        if query.notes is not None and index != "notes":
+            noted = {phn for phn, code in self.search_notes(query.notes)}
+            tests.append(lambda phn: phn in noted)
+
+        if index == "name" and not tests and query.sort_by is None and not query.descending and query.limit is not None:
+            # the name index finds the matches in creation order, and stops at the end of the page
+            phns = self.name_index.search(query.name, query.offset + query.limit)
+            return query.page([self.patients[phn] for phn in phns])
+
+        phns = [phn for phn in candidates() if phn in self.patients and all(test(phn) for test in tests)]
+        return query.page([self.patients[phn] for phn in self.sort_phns(phns, query)])
+
+    def sort_phns(self, phns, query):
+        """Sorts PHNs in the query's order; equal values, and no sort key, keep creation order."""
+        phns.sort(key=lambda phn: self.name_index.names[phn][0])
+        if query.sort_by == "phn":
+            phns.sort(reverse=query.descending)
+        elif query.sort_by == "name":
+            phns.sort(key=lambda phn: self.name_index.names[phn][1], reverse=query.descending)
+        elif query.sort_by == "birth_date":
+            # patients without a valid birth date come last
+            dated = [phn for phn in phns if phn in self.birth_date_index.values]
+            undated = [phn for phn in phns if phn not in self.birth_date_index.values]
+            dated.sort(key=lambda phn: self.birth_date_index.values[phn][0], reverse=query.descending)
+            phns = dated + undated
+        elif query.descending:
+            phns.reverse()
+        return phns
+
     #done
     def update_patient(self, phn, updated_patient):
         """Updates an existing patient's information based on a key."""
         if phn in self.patients:
             self.patients[phn] = updated_patient
+            self.attach_record(updated_patient)
+            self.index_patient(phn, updated_patient)
 
         if self.autosave:  # Save to file if autosave is enabled
             #print("patients saved in update")
-            
-            self.save_patients()
+
+            self.persist_put(updated_patient)
+
 
 
-            
     #done
     def delete_patient(self, key):
         """Deletes a patient from the collection by their key."""
-        
+
         #print("trying to delete phn: ",key)
         #print("these are the patients:",self.patients)
         if key in self.patients:
             #print("entered deletion if statement")
-            del self.patients[key]
+            patient = self.patients.pop(key)
+            self.unindex_patient(key)
+            if self.note_cache is not None:
+                self.note_cache.discard(patient.record)
 
         if self.autosave:  # Save to file if autosave is enabled
             #print("patients saved in delete")
             #print("after deletion",self.patients)
-            self.save_patients()
+            self.persist_delete(key)
+
+
+    def rekey_patient(self, key, patient):
+        """
+        Moves the patient stored under key to its new PHN, patient.phn, with
+        its notes and its index entries. The patients are written once (one
+        journal record in journal mode) and the notes files are renamed, a
+        move that is journaled first (see recover_rekeys).
+        """
+        rekey_id = self.journal_rekey(key, patient.phn) if self.autosave else None
+        self.patients.pop(key, None)
+        self.unindex_patient(key)
+        self.patients[patient.phn] = patient
+        if rekey_id is not None:
+            self.applied_rekey_id = rekey_id
+        self.attach_record(patient)
+        patient.record.rekey(patient.phn)
+        self.index_patient(patient.phn, patient)
 
+        if self.autosave:
+            self.persist_rekey(key, patient, rekey_id)
 
     #done
     def list_patients(self):
         """Lists all patients currently stored."""
         return list(self.patients.values())
+
+    def search_notes(self, search_string, offset=0, limit=None):
+        """
+        Searches the notes of every patient for all the words of the search string.
+        Returns a page of (phn, note code) pairs, sorted.
+        """
+        if self.global_note_index is not None:
+            matches = [key for key in self.global_note_index.search(search_string) if key[0] in self.patients]
+        else:
+            # without an index every record is searched
+            words = GlobalNoteIndex.tokenize(search_string)
+            matches = sorted((phn, note.code) for phn, patient in self.patients.items() for note in self.read_notes(patient)
+                             if words and words <= GlobalNoteIndex.tokenize(note.text))
+        return matches[offset:offset + limit if limit is not None else None]
+
+    @staticmethod
+    def read_notes(patient):
+        """The notes of a patient, read without keeping a note DAO that was not loaded yet in memory."""
+        record = patient.record
+        if record.note_dao_loaded:
+            return record.note_dao.notes
+        if not record.autosave:
+            # notes that are not saved only exist in a loaded note DAO
+            return []
+        return record.note_dao_factory(patient.phn, True).notes
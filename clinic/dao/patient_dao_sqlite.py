@@ -0,0 +1,274 @@
+import contextlib
+import json
+import os
+import sqlite3
+from .patient_dao import PatientDAO
+from .note_dao_sqlite import NoteDAOSQLite
+from .file_sync import FileSync
+from .global_note_index import GlobalNoteIndex
+from .hash_index import normalize_phone, normalize_email
+from .sorted_index import parse_birth_date
+from .phonetic_index import PhoneticIndex, soundex, match_candidates, rank_by_distance
+
+class PatientDAOSQLite(PatientDAO):
+    """
+    Patient DAO backed by a SQLite database. Patients are read on demand
+    instead of being loaded in memory when the DAO is created.
+    """
+
+    # the phone number and email address normalized like normalize_phone and normalize_email
+    PHONE = "replace(replace(replace(replace(replace(replace(phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', '')"
+    EMAIL = "lower(trim(email))"
+    # the birth date as a julian day, NULL where parse_birth_date cannot parse it
+    BIRTH_DAY = "julianday(replace(trim(birth_date), '/', '-'))"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS patients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phn INTEGER NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            birth_date TEXT,
+            phone TEXT,
+            email TEXT,
+            address TEXT
+        );
+        CREATE TABLE IF NOT EXISTS notes (
+            phn INTEGER NOT NULL,
+            code INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            PRIMARY KEY (phn, code)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS patients_phone ON patients (""" + PHONE + """);
+        CREATE INDEX IF NOT EXISTS patients_email ON patients (""" + EMAIL + """);
+        CREATE INDEX IF NOT EXISTS patients_birth_day ON patients (""" + BIRTH_DAY + """);
+        CREATE TABLE IF NOT EXISTS patient_phonetics (
+            code TEXT NOT NULL,
+            phn INTEGER NOT NULL,
+            PRIMARY KEY (code, phn)
+        ) WITHOUT ROWID;
+    """
+
+    COLUMNS = "phn, name, birth_date, phone, email, address"
+
+    # PRAGMA synchronous for each FileSync fsync policy. In WAL mode NORMAL only
+    # syncs at checkpoints, which sync() forces at logout. NEVER is NORMAL as well:
+    # an OS crash can then lose the last commits, but OFF could corrupt the database.
+    SYNCHRONOUS = {FileSync.ALWAYS: "FULL", FileSync.ON_LOGOUT: "NORMAL", FileSync.NEVER: "NORMAL"}
+
+    def __init__(self, autosave, filepath="clinic/clinic.db", fsync_policy=FileSync.ON_LOGOUT, check_same_thread=True):
+        if fsync_policy not in self.SYNCHRONOUS:
+            raise ValueError("unknown fsync policy: %r" % fsync_policy)
+        self.autosave = autosave
+        self.fsync_policy = fsync_policy
+        # without autosave the database only lives for the lifetime of the DAO
+        self.filepath = filepath if autosave else ":memory:"
+
+        if self.filepath != ":memory:":
+            os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+        # a connection shared by several threads must be serialized by the caller, see Controller(thread_safe=True)
+        self.connection = sqlite3.connect(self.filepath, check_same_thread=check_same_thread)
+        self.batch_depth = 0
+        if self.filepath != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=" + self.SYNCHRONOUS[fsync_policy])
+        self.connection.executescript(self.SCHEMA)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Runs the changes in one transaction, committed when the outermost
+        batch ends, or rolled back if it raises.
+        """
+        self.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self.batch_depth == 1:
+                self.connection.rollback()
+            raise
+        else:
+            if self.batch_depth == 1:
+                self.connection.commit()
+        finally:
+            self.batch_depth -= 1
+
+    def _put_phonetics(self, phn, name):
+        """Replaces the phonetic keys of a patient's name; runs inside the caller's transaction."""
+        self.connection.execute("DELETE FROM patient_phonetics WHERE phn = ?", (phn,))
+        codes = {soundex(word) for word in PhoneticIndex.words(name)} - {None}
+        self.connection.executemany(
+            "INSERT INTO patient_phonetics (code, phn) VALUES (?, ?)", [(code, phn) for code in codes])
+
+    def sync(self):
+        """Checkpoints the write-ahead log so every committed change is in the database file."""
+        if self.filepath != ":memory:" and self.fsync_policy == FileSync.ON_LOGOUT:
+            self.connection.execute("PRAGMA wal_checkpoint(FULL)")
+
+    def _to_patient(self, row):
+        # Import Patient here to avoid circular import issues
+        from clinic.patient import Patient
+
+        phn, name, birth_date, phone, email, address = row
+        return Patient(phn, name, birth_date, phone, email, address,
+                       autosave=self.autosave, note_dao=NoteDAOSQLite(phn, self.connection, self.batch))
+
+    def _values(self, patient):
+        return (patient.phn, patient.name, patient.birth_date, patient.phone, patient.email, patient.address)
+
+    def search_patient(self, key):
+        """Searches for a patient by a specific key (e.g., phn)."""
+        row = self.connection.execute(
+            "SELECT " + self.COLUMNS + " FROM patients WHERE phn = ?", (key,)).fetchone()
+        return self._to_patient(row) if row else None
+
+    def create_patient(self, patient):
+        """Inserts a new patient and attaches the patient's record to the notes table."""
+        with self.batch():
+            self.connection.execute(
+                "INSERT INTO patients (" + self.COLUMNS + ") VALUES (?, ?, ?, ?, ?, ?)", self._values(patient))
+            self._put_phonetics(patient.phn, patient.name)
+        patient.record.note_dao = NoteDAOSQLite(patient.phn, self.connection, self.batch)
+
+    def retrieve_patients(self, search_string):
+        """Retrieves all patients whose name contains the search string, ignoring case."""
+        rows = self.connection.execute(
+            "SELECT " + self.COLUMNS + " FROM patients WHERE instr(lower(name), lower(?)) > 0 ORDER BY id",
+            (search_string,))
+        return [self._to_patient(row) for row in rows]
+
+    def retrieve_patients_by_phone(self, phone):
+        """Retrieves the patients with this phone number, ignoring separators."""
+        phone = normalize_phone(phone)
+        if not phone:
+            return []
+        rows = self.connection.execute(
+            "SELECT " + self.COLUMNS + " FROM patients WHERE " + self.PHONE + " = ? ORDER BY id", (phone,))
+        return [self._to_patient(row) for row in rows]
+
+    def retrieve_patients_by_email(self, email):
+        """Retrieves the patients with this email address, ignoring case."""
+        email = normalize_email(email)
+        if not email:
+            return []
+        rows = self.connection.execute(
+            "SELECT " + self.COLUMNS + " FROM patients WHERE " + self.EMAIL + " = ? ORDER BY id", (email,))
+        return [self._to_patient(row) for row in rows]
+
+    def retrieve_patients_by_birth_date(self, birth_date):
+        """Retrieves the patients born on this date."""
+        return self.retrieve_patients_by_birth_date_range(birth_date, birth_date)
+
+    def retrieve_patients_by_birth_date_range(self, start, end):
+        """Retrieves the patients born from start to end, both included, the oldest first."""
+        start, end = parse_birth_date(start), parse_birth_date(end)
+        if start is None or end is None:
+            return []
+        rows = self.connection.execute(
+            "SELECT " + self.COLUMNS + " FROM patients WHERE " + self.BIRTH_DAY + " BETWEEN julianday(?) AND julianday(?)"
+            " ORDER BY " + self.BIRTH_DAY + ", id", (start.isoformat(), end.isoformat()))
+        return [self._to_patient(row) for row in rows]
+
+    def fuzzy_search_patients(self, search_string, limit=None):
+        """Retrieves the patients whose name sounds like the search string, closest spelling first."""
+        words = PhoneticIndex.words(search_string)
+        postings = []
+        for code in {soundex(word) for word in words} - {None}:
+            rows = self.connection.execute("SELECT phn FROM patient_phonetics WHERE code = ?", (code,))
+            postings.append({phn for (phn,) in rows})
+        phns = list(match_candidates(postings))
+
+        candidates = {}
+        for start in range(0, len(phns), 500):  # stay under the SQLite bound parameter limit
+            chunk = phns[start:start + 500]
+            rows = self.connection.execute(
+                "SELECT id, " + self.COLUMNS + " FROM patients WHERE phn IN (" + ", ".join("?" * len(chunk)) + ")", chunk)
+            for row in rows:
+                candidates[row[1]] = row
+        ranked = rank_by_distance(words, ((row[0], phn, PhoneticIndex.words(row[2])) for phn, row in candidates.items()), limit)
+        return [self._to_patient(candidates[phn][1:]) for phn in ranked]
+
+    def query_patients(self, query):
+        """
+        Retrieves the page of patients matching every predicate of a PatientQuery.
+        SQLite's query planner picks the index to start from.
+        """
+        conditions, parameters = [], []
+        if query.name is not None:
+            conditions.append("instr(lower(name), lower(?)) > 0")
+            parameters.append(query.name)
+        if query.birth_date_from is not None:
+            conditions.append(self.BIRTH_DAY + " >= julianday(?)")
+            parameters.append(query.birth_date_from.isoformat())
+        if query.birth_date_to is not None:
+            conditions.append(self.BIRTH_DAY + " <= julianday(?)")
+            parameters.append(query.birth_date_to.isoformat())
+        if query.email_domain is not None:
+            conditions.append("substr(" + self.EMAIL + ", instr(" + self.EMAIL + ", '@') + 1) = ?")
+            parameters.append(query.email_domain)
+        noted = None
+        if query.notes is not None:
+            noted = {phn for phn, code in self.search_notes(query.notes)}
+            conditions.append("phn IN (SELECT value FROM json_each(?))")
+            parameters.append(json.dumps(sorted(noted)))
+
+        direction = " DESC" if query.descending else ""
+        order = {None: "id" + direction,
+                 "phn": "phn" + direction + ", id",
+                 "name": "lower(name)" + direction + ", id",
+                 "birth_date": self.BIRTH_DAY + " IS NULL, " + self.BIRTH_DAY + direction + ", id"}[query.sort_by]
+        sql = "SELECT " + self.COLUMNS + " FROM patients"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY " + order + " LIMIT ? OFFSET ?"
+        parameters += [query.limit if query.limit is not None else -1, query.offset]
+        return [self._to_patient(row) for row in self.connection.execute(sql, parameters)]
+
+    def update_patient(self, phn, updated_patient):
+        """Updates an existing patient's information based on a key."""
+        with self.batch():
+            self.connection.execute(
+                "UPDATE patients SET phn = ?, name = ?, birth_date = ?, phone = ?, email = ?, address = ? WHERE phn = ?",
+                self._values(updated_patient) + (phn,))
+            if updated_patient.phn != phn:
+                self.connection.execute("DELETE FROM patient_phonetics WHERE phn = ?", (phn,))
+            self._put_phonetics(updated_patient.phn, updated_patient.name)
+
+    def rekey_patient(self, key, patient):
+        """
+        Moves the patient stored under key to its new PHN, patient.phn, with
+        its notes, replacing any notes left under that PHN by a deleted patient.
+        """
+        with self.batch():
+            self.connection.execute("UPDATE patients SET phn = ? WHERE phn = ?", (patient.phn, key))
+            self.connection.execute("DELETE FROM notes WHERE phn = ?", (patient.phn,))
+            self.connection.execute("UPDATE notes SET phn = ? WHERE phn = ?", (patient.phn, key))
+            self.connection.execute("UPDATE patient_phonetics SET phn = ? WHERE phn = ?", (patient.phn, key))
+        patient.record.rekey(patient.phn)
+
+    def delete_patient(self, key):
+        """Deletes a patient by their key. Like the pickle records, the notes are kept."""
+        with self.batch():
+            self.connection.execute("DELETE FROM patients WHERE phn = ?", (key,))
+            self.connection.execute("DELETE FROM patient_phonetics WHERE phn = ?", (key,))
+
+    def list_patients(self):
+        """Lists all patients currently stored."""
+        rows = self.connection.execute("SELECT " + self.COLUMNS + " FROM patients ORDER BY id")
+        return [self._to_patient(row) for row in rows]
+
+    def search_notes(self, search_string, offset=0, limit=None):
+        """
+        Searches the notes of every patient for all the words of the search string.
+        Returns a page of (phn, note code) pairs, sorted.
+        """
+        words = GlobalNoteIndex.tokenize(search_string)
+        if not words:
+            return []
+        # instr narrows the notes down in SQL, the word test is done on the rest
+        rows = self.connection.execute(
+            "SELECT notes.phn, notes.code, notes.text FROM notes JOIN patients ON patients.phn = notes.phn WHERE "
+            + " AND ".join(["instr(lower(notes.text), ?) > 0"] * len(words)) + " ORDER BY notes.phn, notes.code",
+            tuple(words))
+        matches = [(phn, code) for phn, code, text in rows if words <= GlobalNoteIndex.tokenize(text)]
+        return matches[offset:offset + limit if limit is not None else None]
@@ -0,0 +1,46 @@
+from .hash_index import normalize_email_domain
+from .sorted_index import parse_birth_date
+
+
+class PatientQuery:
+    """
+    A combination of patient predicates, with the sort order and page to return.
+    Every predicate left as None matches all patients.
+
+    Attributes:
+        name (str): The name contains this text, ignoring case.
+        birth_date_from (str or date): Born on this date or later.
+        birth_date_to (str or date): Born on this date or earlier.
+        email_domain (str): The email address is at this domain, e.g. "gmail.com".
+        notes (str): A note of the patient contains all the words of this text.
+        sort_by (str): None (creation order), "phn", "name" or "birth_date".
+        descending (bool): Sort from the highest value down.
+        offset (int): The number of matching patients to skip.
+        limit (int): The maximum number of patients to return, None for all.
+    """
+
+    SORT_KEYS = (None, "phn", "name", "birth_date")
+
+    def __init__(self, name=None, birth_date_from=None, birth_date_to=None, email_domain=None, notes=None,
+                 sort_by=None, descending=False, offset=0, limit=None):
+        if sort_by not in self.SORT_KEYS:
+            raise ValueError("cannot sort patients by %r" % sort_by)
+        self.name = name
+        self.birth_date_from = parse_birth_date(birth_date_from) if birth_date_from is not None else None
+        self.birth_date_to = parse_birth_date(birth_date_to) if birth_date_to is not None else None
+        if (birth_date_from is not None and self.birth_date_from is None) or (birth_date_to is not None and self.birth_date_to is None):
+            raise ValueError("invalid birth date range: %r to %r" % (birth_date_from, birth_date_to))
+        self.email_domain = normalize_email_domain(email_domain) if email_domain is not None else None
+        self.notes = notes
+        self.sort_by = sort_by
+        self.descending = descending
+        self.offset = offset
+        self.limit = limit
+
+    @property
+    def has_birth_date_range(self):
+        return self.birth_date_from is not None or self.birth_date_to is not None
+
+    def page(self, patients):
+        """The page of the (already sorted) matching patients."""
+        return patients[self.offset:self.offset + self.limit if self.limit is not None else None]
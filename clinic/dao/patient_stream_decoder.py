@@ -0,0 +1,122 @@
+import codecs
+import json
+import os
+from .patient_decoder import PatientDecoder
+
+class PatientStreamDecoder:
+    """
+    Incremental decoder for the patients file. The top-level PHN map is read
+    in chunks and decoded one patient entry at a time, so only one raw entry
+    is held in memory next to the Patient objects built so far.
+    """
+
+    WHITESPACE = " \t\n\r"
+
+    def __init__(self, chunk_size=65536, progress=None):
+        """
+        Args:
+            chunk_size (int): Number of bytes read from the file at a time.
+            progress (callable, optional): Called as progress(bytes_read, total_bytes)
+                                           after every chunk read from the file.
+        """
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.scanner = json.JSONDecoder()
+        self.patient_decoder = PatientDecoder()
+        self.version = None
+        self.embedded_notes = {}
+
+    def decode(self, file):
+        """
+        Decodes a binary patients file into a dictionary of patients keyed by PHN.
+        Afterwards, version holds the file's format version, and embedded_notes the
+        notes that format 1 files copied inside each patient entry, keyed by PHN.
+        """
+        to_patient = self.patient_decoder.to_patient
+        patients = {}
+        self.version = 1
+        self.embedded_notes = {}
+        for key, entry in self.iter_entries(file):
+            if key == "version":
+                self.version = entry
+            elif isinstance(entry, dict):
+                patient = to_patient(entry)
+                patients[patient.phn] = patient
+                notes = (entry.get("record") or {}).get("notes")
+                if notes:
+                    self.embedded_notes[patient.phn] = notes
+        return patients
+
+    def iter_entries(self, file):
+        """Yields the (key, value) pairs of the file's top-level JSON object one by one."""
+        self._file = file
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._bytes_read = 0
+        try:
+            self._total = os.fstat(file.fileno()).st_size
+        except (AttributeError, OSError):
+            self._total = None
+
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            value = self._value()
+            yield key, value
+
+            separator = self._peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", self._buffer, self._pos - 1)
+
+    def _fill(self):
+        """Reads the next chunk, dropping the part of the buffer already decoded."""
+        chunk = self._file.read(self.chunk_size)
+        self._bytes_read += len(chunk)
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + self._text.decode(chunk, final=self._eof)
+        self._pos = 0
+        if self.progress is not None:
+            self.progress(self._bytes_read, self._total)
+
+    def _peek(self):
+        """Returns the next non-whitespace character without consuming it."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in self.WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                raise json.JSONDecodeError("Unexpected end of file", self._buffer, self._pos)
+            self._fill()
+
+    def _expect(self, character):
+        if self._peek() != character:
+            raise json.JSONDecodeError("Expecting %r" % character, self._buffer, self._pos)
+        self._pos += 1
+
+    def _value(self):
+        """Decodes the next JSON value, reading more chunks until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = self.scanner.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            # a value ending exactly at the end of the buffer may continue in the
+            # next chunk (e.g. a number cut in two)
+            if end == len(self._buffer) and not self._eof:
+                self._fill()
+                continue
+            self._pos = end
+            return value
@@ -0,0 +1,120 @@
+import re
+
+SOUNDEX_CODES = {}
+for letters, digit in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"), ("l", "4"), ("mn", "5"), ("r", "6")):
+    for letter in letters:
+        SOUNDEX_CODES[letter] = digit
+
+
+def soundex(word):
+    """The American Soundex key of a word, e.g. "Robert" -> "R163", or None if it has no letters."""
+    letters = [letter for letter in word.casefold() if "a" <= letter <= "z"]
+    if not letters:
+        return None
+
+    key = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0])
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter)
+        if digit is not None and digit != previous:
+            key += digit
+            if len(key) == 4:
+                break
+        if letter not in "hw":
+            # h and w do not separate two letters with the same code, vowels do
+            previous = digit
+    return key.ljust(4, "0")
+
+
+def levenshtein(a, b):
+    """The number of single character insertions, deletions or substitutions turning a into b."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def rank_by_distance(words, candidates, limit=None):
+    """
+    Ranks (sequence, key, name words) candidates by the sum, over the search
+    words, of the edit distance to the closest word of the name, then by
+    sequence, and returns the first limit keys.
+    """
+    ranked = []
+    for sequence, key, name_words in candidates:
+        distance = sum(min((levenshtein(word, name_word) for name_word in name_words), default=len(word)) for word in words)
+        ranked.append((distance, sequence, key))
+    ranked.sort()
+    return [key for distance, sequence, key in ranked[:limit]]
+
+
+def match_candidates(postings):
+    """Keys in every posting list, or in any of them if none is in all."""
+    if not postings:
+        return set()
+    postings = sorted(postings, key=len)
+    return postings[0].intersection(*postings[1:]) or set().union(*postings)
+
+
+class PhoneticIndex:
+    """
+    Soundex keys of every word of the patients' names, for a fuzzy name search
+    that tolerates misspellings.
+
+    Only the patients with a word sounding like each word of the search text
+    are candidates, so edit distances are only computed for those, and they
+    are ranked with rank_by_distance, ties in insertion order.
+    """
+
+    WORD = re.compile(r"\w+")
+
+    def __init__(self):
+        self.names = {}  # key -> (sequence number, case-folded words of the name)
+        self.postings = {}  # soundex key -> set of keys
+        self.sequence = 0
+
+    @classmethod
+    def words(cls, name):
+        return cls.WORD.findall(name.casefold())
+
+    def add(self, key, name):
+        """Indexes a new key, or the new name of a key, which keeps its position."""
+        previous = self.names.get(key)
+        if previous is not None:
+            self._unpost(key, previous[1])
+            sequence = previous[0]
+        else:
+            self.sequence += 1
+            sequence = self.sequence
+
+        words = self.words(name)
+        self.names[key] = (sequence, words)
+        for word in words:
+            code = soundex(word)
+            if code is not None:
+                self.postings.setdefault(code, set()).add(key)
+
+    def remove(self, key):
+        previous = self.names.pop(key, None)
+        if previous is not None:
+            self._unpost(key, previous[1])
+
+    def _unpost(self, key, words):
+        for code in {soundex(word) for word in words}:
+            keys = self.postings.get(code)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[code]
+
+    def search(self, search_string, limit=None):
+        """Returns the keys whose name sounds like search_string, closest first."""
+        words = self.words(search_string)
+        codes = {soundex(word) for word in words} - {None}
+        keys = match_candidates([self.postings.get(code, set()) for code in codes])
+        return rank_by_distance(words, ((self.names[key][0], key, self.names[key][1]) for key in keys), limit)
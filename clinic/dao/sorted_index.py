@@ -0,0 +1,85 @@
+import bisect
+import datetime
+import re
+
+BIRTH_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def parse_birth_date(birth_date):
+    """
+    The date of a birth date string such as "2000-10-10" or "2000/10/10",
+    or None if it cannot be parsed.
+    """
+    if isinstance(birth_date, datetime.date):
+        return birth_date
+    text = (birth_date or "").strip().replace("/", "-")
+    if not BIRTH_DATE.fullmatch(text):
+        return None
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+class SortedIndex:
+    """
+    Index keeping the values of a patient field sorted, so the patients with
+    a value, or with a value in a range, are found by bisection. Patients with
+    the same value keep the order in which they were added.
+    """
+
+    def __init__(self):
+        self.values = {}  # key -> (value, sequence number)
+        self.entries = []  # sorted (value, sequence number, key)
+        self.sequence = 0
+
+    def add(self, key, value):
+        """Indexes a new key, or the new value of a key, which keeps its position among equal values."""
+        previous = self.values.get(key)
+        if previous is not None:
+            if previous[0] == value:
+                return
+            self.remove(key)
+            sequence = previous[1]
+        else:
+            self.sequence += 1
+            sequence = self.sequence
+        if value is None:
+            return
+        self.values[key] = (value, sequence)
+        bisect.insort(self.entries, (value, sequence, key))
+
+    def add_many(self, items):
+        """Indexes new (key, value) pairs, sorting the entries once instead of inserting them one by one."""
+        for key, value in items:
+            self.sequence += 1
+            if value is not None:
+                self.values[key] = (value, self.sequence)
+                self.entries.append((value, self.sequence, key))
+        self.entries.sort()
+
+    def remove(self, key):
+        previous = self.values.pop(key, None)
+        if previous is None:
+            return
+        entry = previous + (key,)
+        position = bisect.bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def range(self, low, high):
+        """Returns the keys with low <= value <= high, in value order."""
+        keys = []
+        position = bisect.bisect_left(self.entries, (low,))
+        while position < len(self.entries) and self.entries[position][0] <= high:
+            keys.append(self.entries[position][2])
+            position += 1
+        return keys
+
+    def count(self, low, high):
+        """Returns how many keys have low <= value <= high, without listing them."""
+        return bisect.bisect_right(self.entries, (high, float("inf"))) - bisect.bisect_left(self.entries, (low,))
+
+    def lookup(self, value):
+        """Returns the keys with this value."""
+        return self.range(value, value)
@@ -0,0 +1,88 @@
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+
+class WriteBehindFlusher:
+    """
+    Write-behind autosave. Instead of writing to disk on every mutation, DAOs
+    mark a target (usually a file path) dirty together with the function that
+    saves it. A background thread runs the pending saves every interval_ms
+    milliseconds, or sooner once max_ops mutations are waiting, so a burst of
+    edits to the same file is coalesced into one write.
+
+    A save that fails stays pending and is retried on the next flush; the
+    background thread logs the error and keeps running.
+    """
+
+    def __init__(self, interval_ms=500, max_ops=50):
+        self.interval = interval_ms / 1000
+        self.max_ops = max_ops
+        self.pending = OrderedDict()  # target -> save function
+        self.ops = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.io_lock = threading.Lock()  # one flush at a time, in the thread or not
+
+        self.thread = threading.Thread(target=self._run, name="write-behind-flusher", daemon=True)
+        self.thread.start()
+        # guaranteed flush when the application quits
+        atexit.register(self.close)
+
+    def mark_dirty(self, target, save):
+        """Schedules save() to run on the next flush; later marks of the same target replace it."""
+        with self.condition:
+            self.pending[target] = save
+            self.pending.move_to_end(target)
+            self.ops += 1
+            if self.ops >= self.max_ops:
+                self.condition.notify()
+
+    def flush(self, target=None):
+        """
+        Runs the pending saves now, only the one for target if given. Raises
+        the first error once the other saves ran; the failed saves stay pending.
+        """
+        with self.io_lock:
+            with self.condition:
+                if target is None:
+                    saves = list(self.pending.items())
+                    self.pending.clear()
+                    self.ops = 0
+                else:
+                    save = self.pending.pop(target, None)
+                    saves = [(target, save)] if save else []
+            error = None
+            for target, save in saves:
+                try:
+                    save()
+                except Exception as exception:
+                    with self.condition:
+                        # a mark made during the save is newer and replaces it
+                        self.pending.setdefault(target, save)
+                    if error is None:
+                        error = exception
+            if error is not None:
+                raise error
+
+    def close(self):
+        """Stops the background thread after a last flush."""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or self.ops >= self.max_ops, timeout=self.interval)
+                if self.closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                logging.getLogger(__name__).exception("write-behind flush failed, retrying on the next flush")
@@ -11,6 +11,7 @@ from PyQt6.QtWidgets import (
     QPushButton,
     QSpacerItem,
     QSizePolicy,
+    QProgressDialog,
 )
 from PyQt6.QtGui import QFont
 
@@ -21,7 +22,7 @@ from clinic.exception import InvalidLoginException
 
 
 class ClinicGUI(QMainWindow):
-    def __init__(self):
+    def __init__(self, controller=None):
         super().__init__()
 
         # Set title
@@ -34,11 +35,28 @@ class ClinicGUI(QMainWindow):
         # Load stylesheet
         self.setStyleSheet(open("clinic/gui/style.qss", "r").read())
 
-        # Calling controller class for future use
-        self.controller = Controller(autosave=True)
+        # Calling controller class for future use, showing the loading status of large patient files,
+        # unless the GUI is a client of a clinic server (ClinicClient)
+        self.controller = controller or self.load_controller()
 
         self.login_screen()  # Call login screen
 
+    def load_controller(self):
+        """Creates the Controller, reporting the progress of loading the patients file."""
+        progress_dialog = QProgressDialog("Loading patients...", None, 0, 100, self)
+        progress_dialog.setWindowTitle("MEDICAL CLINIC SYSTEM")
+        progress_dialog.setWindowModality(Qt.WindowModality.ApplicationModal)
+        progress_dialog.setMinimumDuration(500)  # Only shown for files that take a while to load
+
+        def report_progress(bytes_read, total_bytes):
+            if total_bytes:
+                progress_dialog.setValue(min(100, int(bytes_read * 100 / total_bytes)))
+                QApplication.processEvents()
+
+        controller = Controller(autosave=True, progress=report_progress)
+        progress_dialog.close()
+        return controller
+
     def get_center(self, window_width, window_height):
         """Calculate the center position of the screen for the window."""
         screen = QApplication.primaryScreen().availableGeometry()
@@ -192,12 +210,14 @@ class ClinicGUI(QMainWindow):
 
     def quit(self):
         """Quits the application."""
+        self.controller.flush()
         self.setCentralWidget(QuitGUI(self))
 
 
-def main():
+def main(controller=None):
     app = QApplication(sys.argv)
-    window = ClinicGUI()
+    window = ClinicGUI(controller)
+    app.aboutToQuit.connect(window.controller.flush)  # Write pending changes before exiting
     window.show()
     sys.exit(app.exec())
 
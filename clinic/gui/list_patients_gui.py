@@ -75,7 +75,7 @@ class ListPatientsGUI(QWidget):
 
         # Load patients and set up the model
         try:
-            patients = self.controller.patient_dao.list_patients()
+            patients = self.controller.list_patients()
             if patients:
                 self.model = PatientTableModel(patients)
                 self.table_view.setModel(self.model)
@@ -120,9 +120,9 @@ class MainMenuGUI(QWidget):
 
     def logout_with_confirmation(self):
         """Shows confirmation dialog before logging out."""
-        #changes = self.controller.get_session_changes()
-        changes = ""
+        changes = self.controller.get_session_changes()
         dialog = QuitConfirmationDialog(changes, self)
         if dialog.exec():  # If user confirms
+            self.controller.logout()  # Also writes any pending changes
             if self.parent():  # Check if the parent exists
                 self.parent().login_screen()  # Set to login screen
@@ -3,8 +3,8 @@ from clinic.patient_record import PatientRecord
 class Patient():
 	''' class that represents a patient '''
 
-	def __init__(self, phn, name, birth_date, phone, email, address,autosave = False):
-		''' constructs a patient '''
+	def __init__(self, phn, name, birth_date, phone, email, address,autosave = False, note_dao = None):
+		''' constructs a patient, optionally backed by an existing note DAO '''
 		self.phn = phn
 		self.name = name
 		self.birth_date = birth_date
@@ -12,7 +12,7 @@ class Patient():
 		self.email = email or ""
 		self.address = address or ""
 		self.autosave = autosave
-		self.record = PatientRecord(self.phn,self.autosave)
+		self.record = PatientRecord(self.phn,self.autosave,note_dao)
 
 	
 	def get_patient_record(self):
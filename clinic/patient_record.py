@@ -5,13 +5,51 @@ from clinic.dao.note_dao_pickle import NoteDAOPickle
 class PatientRecord():
 	''' class that represents a patient's medical record '''
 
-	def __init__(self,phn,autosave):
-		''' construct a patient record '''
+	def __init__(self,phn,autosave,note_dao = None):
+		''' construct a patient record, by default backed by a pickle note DAO '''
 		self.phn = phn
 		self.autosave = autosave
 
-		self.note_dao = NoteDAOPickle(self.phn,self.autosave)
-		
+		# the default note DAO is only created the first time the notes are used,
+		# and can be released again by a note_cache (see NoteDAOCache)
+		self.note_dao_factory = NoteDAOPickle if note_dao is None else None
+		self.note_cache = None
+		self._note_dao = note_dao
+
+	@property
+	def note_dao(self):
+		''' the note DAO of the record, loaded on first access '''
+		# a concurrent touch may release the DAO again, the caller still gets it
+		note_dao = self._note_dao
+		if note_dao is None:
+			note_dao = self._note_dao = self.note_dao_factory(self.phn,self.autosave)
+		if self.note_cache is not None and self.note_dao_factory is not None:
+			self.note_cache.touch(self)
+		return note_dao
+
+	@note_dao.setter
+	def note_dao(self, note_dao):
+		''' replace the note DAO, which then is never released '''
+		self.note_dao_factory = None
+		self._note_dao = note_dao
+
+	@property
+	def note_dao_loaded(self):
+		''' whether the note DAO is currently in memory '''
+		return self._note_dao is not None
+
+	def release_note_dao(self):
+		''' drop a persisted note DAO from memory, it is loaded again on next use '''
+		if self.autosave and self.note_dao_factory is not None and self._note_dao is not None:
+			self._note_dao.flush()
+			self._note_dao = None
+
+	def rekey(self, phn):
+		''' move the record and its notes to a new PHN '''
+		# the notes are loaded from the old PHN before it changes
+		note_dao = self.note_dao
+		self.phn = phn
+		note_dao.rekey(phn)
 
 	def search_note(self, code):
 		''' search a note in the patient's record '''
@@ -40,6 +78,10 @@ class PatientRecord():
 		
 		return self.note_dao.delete_note(code)
 
+	def restore_note(self, note):
+		''' put a note back in the patient's record with its code '''
+		return self.note_dao.restore_note(note)
+
 	def list_notes(self):
 		''' list all notes from the patient's record from the 
 			more recently added to the least recently added'''
@@ -0,0 +1,74 @@
+import datetime
+import clinic.exception
+from .note import Note
+from .patient import Patient
+
+# Controller operations a clinic server exposes, called with the same arguments;
+# flush is left out: it writes for every session, and the server writes the
+# pending changes itself on logout and when it stops
+METHODS = frozenset((
+    "login", "logout", "set_current_patient", "get_current_patient", "unset_current_patient", "get_session_changes",
+    "search_patient", "list_patients", "retrieve_patients", "fuzzy_retrieve_patients", "retrieve_patients_by_phone",
+    "retrieve_patients_by_email", "retrieve_patients_by_birth_date", "retrieve_patients_by_birth_date_range",
+    "retrieve_patients_by_age", "query_patients", "create_patient", "update_patient", "delete_patient",
+    "create_patients", "update_patients", "delete_patients", "search_note", "retrieve_notes", "list_notes",
+    "search_notes", "create_note", "update_note", "delete_note", "undo", "redo",
+))
+
+# JSON-RPC 2.0 error codes; APPLICATION_ERROR carries the name of the exception the operation raised
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+APPLICATION_ERROR = 1
+
+PATIENT_FIELDS = ("phn", "name", "birth_date", "phone", "email", "address")
+
+
+class RPCError(Exception):
+    """An error response of a clinic server that is not one of the clinic exceptions."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def encode(value):
+    """A result as JSON values: patients and notes become objects of their fields."""
+    if isinstance(value, Patient):
+        return {field: getattr(value, field) for field in PATIENT_FIELDS}
+    if isinstance(value, Note):
+        return {"code": value.code, "text": value.text, "timestamp": value.timestamp.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    return value
+
+
+def decode(value):
+    """The patients and notes of an encoded result, as Patient and Note objects."""
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if isinstance(value, dict):
+        if set(value) == set(PATIENT_FIELDS):
+            return Patient(*(value[field] for field in PATIENT_FIELDS))
+        if set(value) == {"code", "text", "timestamp"}:
+            return Note(value["code"], value["text"], datetime.datetime.fromisoformat(value["timestamp"]))
+    return value
+
+
+def error(request_id, code, message, exception=None):
+    response = {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+    if exception is not None:
+        response["error"]["data"] = {"exception": type(exception).__name__}
+    return response
+
+
+def to_exception(error):
+    """The exception to raise for an error response: the clinic exception the server raised, if any."""
+    name = (error.get("data") or {}).get("exception")
+    exception_class = getattr(clinic.exception, name, None) if name else None
+    if exception_class is None and name in ("ValueError", "TypeError", "KeyError"):
+        exception_class = {"ValueError": ValueError, "TypeError": TypeError, "KeyError": KeyError}[name]
+    if exception_class is None:
+        return RPCError(error.get("code"), error.get("message"))
+    return exception_class(error.get("message")) if error.get("message") else exception_class()
@@ -0,0 +1,69 @@
+import contextlib
+import threading
+
+
+class RWLock:
+    """
+    Reader/writer lock: any number of threads may read at the same time,
+    while a writer has the lock to itself. Waiting writers go first, so a
+    steady stream of readers cannot starve them.
+
+    Both sides are reentrant, and the writing thread may also read, so
+    locked methods can call each other. A reading thread cannot start
+    writing: it would wait for itself to stop reading.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = {}  # thread id -> nested reads
+        self.writer = None  # thread id of the writer
+        self.writes = 0  # nested writes of the writer
+        self.waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer == me:
+                # reading inside a write needs nothing more
+                reading = False
+            else:
+                if me not in self.readers:
+                    while self.writer is not None or self.waiting_writers:
+                        self.condition.wait()
+                self.readers[me] = self.readers.get(me, 0) + 1
+                reading = True
+        try:
+            yield self
+        finally:
+            if reading:
+                with self.condition:
+                    self.readers[me] -= 1
+                    if not self.readers[me]:
+                        del self.readers[me]
+                        if not self.readers:
+                            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer != me:
+                if me in self.readers:
+                    raise RuntimeError("cannot write while reading")
+                self.waiting_writers += 1
+                try:
+                    while self.writer is not None or self.readers:
+                        self.condition.wait()
+                finally:
+                    self.waiting_writers -= 1
+                self.writer = me
+            self.writes += 1
+        try:
+            yield self
+        finally:
+            with self.condition:
+                self.writes -= 1
+                if not self.writes:
+                    self.writer = None
+                    self.condition.notify_all()
@@ -0,0 +1,113 @@
+import asyncio
+import inspect
+import json
+from .async_controller import AsyncController
+from .rpc import METHODS, PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, APPLICATION_ERROR, encode, error
+
+
+class ClinicServer:
+    """
+    Serves the Controller operations of one loaded dataset to several
+    clients, as JSON-RPC 2.0 over a localhost TCP or Unix socket: one request
+    or response object per line.
+
+    Every connection is a session of its own (see Controller.new_session),
+    logged in with the login method. A client may send requests without
+    waiting for the responses (pipelining): the server keeps reading while
+    it runs a connection's requests one after the other, in order, and
+    answers each of them in that order. Requests without an id are
+    notifications and get no response.
+    """
+
+    def __init__(self, controller:AsyncController):
+        self.controller = controller
+        self.connections = set()  # the tasks serving the open connections
+
+    async def start(self, host:str = "127.0.0.1", port:int = 8765, path:str = None) -> asyncio.AbstractServer:
+        """Starts listening on host and port, or on the Unix socket at path."""
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        """Serves one connection."""
+        self.connections.add(asyncio.current_task())
+        session = await self.controller.open_session()
+        requests = asyncio.Queue()
+        worker = asyncio.create_task(self._work(session, requests, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break  # a reset connection, or a line over the stream limit
+                if not line:
+                    break
+                if line.strip():
+                    requests.put_nowait(line)
+        finally:
+            requests.put_nowait(None)
+            await worker
+            if session.controller.logged_in:
+                await session.logout()
+            writer.close()
+            self.connections.discard(asyncio.current_task())
+
+    async def _work(self, session, requests, writer):
+        while True:
+            line = await requests.get()
+            if line is None:
+                return
+            response = await self.dispatch(session, line)
+            if response is None or writer.is_closing():
+                continue
+            writer.write(json.dumps(response).encode() + b"\n")
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, session, line):
+        """Runs one request line, and returns the response object or None for a notification."""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return error(None, PARSE_ERROR, "parse error")
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            return error(request.get("id") if isinstance(request, dict) else None, INVALID_REQUEST, "invalid request")
+
+        request_id = request.get("id")
+        method = request["method"]
+        params = request.get("params", [])
+        if method not in METHODS:
+            return error(request_id, METHOD_NOT_FOUND, "method not found: %s" % method)
+        if isinstance(params, list):
+            args, kwargs = params, {}
+        elif isinstance(params, dict):
+            args, kwargs = [], params
+        else:
+            return error(request_id, INVALID_PARAMS, "params must be an array or an object")
+
+        operation = getattr(session, method)
+        try:
+            inspect.signature(operation).bind(*args, **kwargs)
+        except TypeError as exception:
+            return error(request_id, INVALID_PARAMS, str(exception))
+
+        try:
+            result = await operation(*args, **kwargs)
+        except Exception as exception:
+            response = error(request_id, APPLICATION_ERROR, str(exception) or type(exception).__name__, exception)
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": encode(result)}
+        return response if "id" in request else None
+
+
+async def serve(controller:AsyncController, host:str = "127.0.0.1", port:int = 8765, path:str = None):
+    """Serves the controller until the task is cancelled, then writes the pending changes."""
+    server = await ClinicServer(controller).start(host, port, path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await controller.close()
@@ -0,0 +1,21 @@
+from .change_log import ChangeLog
+
+
+class Session:
+    """
+    The state of one user of the clinic: the login, the current patient and
+    the changes made, with the transaction in progress. Sessions share the
+    controller's DAOs, so one loaded dataset serves any number of them, each
+    costing only these attributes.
+    """
+
+    def __init__(self, change_log_size=1000):
+        self.logged_in = False
+        self.username = None
+        self.current_patient = None
+        self.change_log = ChangeLog(change_log_size)
+
+        self.transaction_depth = 0
+        self.undo_log = []  # how to undo each change of the current transaction
+        self.pending_changes = []  # changes of the current transaction, one step of the change log once committed
+        self.replaying = False  # undo and redo are not changes of their own
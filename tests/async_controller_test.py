@@ -0,0 +1,98 @@
+# async_controller_test.py
+
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from clinic.async_controller import AsyncController
+from clinic.controller import Controller
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.write_behind_flusher import WriteBehindFlusher
+from clinic.exception.illegal_access_exception import IllegalAccessException
+
+
+class TestAsyncController(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.controller = AsyncController(Controller(autosave=False, thread_safe=True))
+        await self.controller.login("user", "123456")
+
+    async def asyncTearDown(self):
+        await self.controller.close()
+        shutil.rmtree(self.directory)
+
+    async def use_dao(self, dao):
+        await self.controller.close()
+        self.controller = AsyncController(Controller(autosave=dao.autosave, thread_safe=True, patient_dao=dao))
+        await self.controller.login("user", "123456")
+
+    async def test_requires_thread_safe_controller(self):
+        with self.assertRaises(ValueError):
+            AsyncController(Controller(autosave=False))
+
+    async def test_patients_and_notes(self):
+        await self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        await self.controller.update_patient(9790012000, name="John Smith")
+        self.assertEqual((await self.controller.search_patient(9790012000)).name, "John Smith")
+        self.assertEqual([patient.phn for patient in await self.controller.query_patients(name="smith")], [9790012000])
+
+        await self.controller.set_current_patient(9790012000)
+        note = await self.controller.create_note("Prescribed ibuprofen for the headache.")
+        self.assertEqual(await self.controller.retrieve_notes("ibuprofen"), [note])
+        self.assertEqual(await self.controller.search_notes("ibuprofen"), [(9790012000, note.code)])
+        await self.controller.unset_current_patient()
+
+        self.assertTrue(await self.controller.undo())
+        self.assertEqual(await self.controller.transaction(lambda controller: controller.delete_patient(9790012000)), True)
+        self.assertIsNone(await self.controller.search_patient(9790012000))
+
+    async def test_sessions(self):
+        other = self.controller.new_session()
+        with self.assertRaises(IllegalAccessException):
+            await other.list_patients()
+        await other.login("ali", "@G00dPassw0rd")
+        await other.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+        self.assertEqual((await self.controller.search_patient(9790014444)).name, "Mary Doe")
+
+    async def test_reads_run_in_parallel(self):
+        barrier = threading.Barrier(3, timeout=5)
+        list_patients = self.controller.controller.patient_dao.list_patients
+
+        def wait_for_each_other():
+            barrier.wait()  # only passes if three reads run at the same time
+            return list_patients()
+
+        with patch.object(self.controller.controller.patient_dao, "list_patients", wait_for_each_other):
+            await asyncio.gather(*(self.controller.list_patients() for _ in range(3)))
+
+    async def test_reads_do_not_wait_for_the_disk(self):
+        flusher = WriteBehindFlusher(1, 1)
+        dao = PatientDAOJSON(autosave=True, filepath=os.path.join(self.directory, "patients.json"), flusher=flusher)
+        await self.use_dao(dao)
+        writing, release = threading.Event(), threading.Event()
+        save_patients = dao.save_patients
+
+        def slow_save():
+            writing.set()
+            release.wait(5)
+            save_patients()
+
+        with patch.object(dao, "save_patients", slow_save):
+            await self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+            await asyncio.get_running_loop().run_in_executor(None, writing.wait, 5)
+            # the patients file is still being written, yet reads and changes go on
+            self.assertEqual(len(await self.controller.retrieve_patients("john")), 1)
+            await self.controller.update_patient(9790012000, name="John Smith")
+            self.assertEqual((await self.controller.search_patient(9790012000)).name, "John Smith")
+            release.set()
+            await self.controller.flush()
+        flusher.close()
+        self.assertEqual(PatientDAOJSON(autosave=True, filepath=dao.filepath).search_patient(9790012000).name, "John Smith")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# bulk_operations_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from clinic.controller import Controller
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+from clinic.exception.illegal_access_exception import IllegalAccessException
+
+
+def entry(phn, name="Patient"):
+    return {"phn": phn, "name": name, "birth_date": "2000-10-10", "phone": "250 203 1010",
+            "email": "patient@gmail.com", "address": "300 Moss St, Victoria"}
+
+
+class TestBulkOperations(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.controller = Controller(autosave=False)
+        self.controller.login("user", "123456")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def use_dao(self, dao):
+        self.controller = Controller(autosave=dao.autosave, patient_dao=dao)
+        self.controller.login("user", "123456")
+
+    def test_not_logged_in(self):
+        controller = Controller(autosave=False)
+        with self.assertRaises(IllegalAccessException):
+            controller.create_patients([entry(9790012000)])
+
+    def test_create_patients_saves_once(self):
+        for journal in (False, True):
+            dao = PatientDAOJSON(autosave=True, journal=journal, filepath=os.path.join(self.directory, "patients%d.json" % journal))
+            self.use_dao(dao)
+            self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+
+            entries = [entry(9790020000 + i) for i in range(100)]
+            entries += [entry(9790012000), entry(9790020000), {"phn": 9790030000}, dict(entry(9790030001), age=30)]
+            with patch.object(dao, "save_patients", wraps=dao.save_patients) as save, \
+                    patch.object(dao.file_sync, "append", wraps=dao.file_sync.append) as append:
+                rejected = self.controller.create_patients(entries)
+            self.assertEqual(save.call_count + append.call_count, 1, "one write for the whole batch")
+            self.assertEqual([position for position, reason in rejected], [100, 101, 102, 103])
+            self.assertEqual(rejected[0][1], "patient already exists")
+
+            reloaded = PatientDAOJSON(autosave=True, journal=journal, filepath=dao.filepath)
+            self.assertEqual(len(reloaded.list_patients()), 101)
+
+    def test_update_patients(self):
+        self.controller.create_patients([entry(9790012000, "John Doe"), entry(9790014444, "Mary Doe"), entry(9792225555, "Joe Hancock")])
+        self.controller.set_current_patient(9792225555)
+
+        rejected = self.controller.update_patients([
+            {"phn": 9790012000, "new_phn": 9790014444, "name": "John Smith"},  # swaps PHNs with the next entry
+            {"phn": 9790014444, "new_phn": 9790012000},
+            {"phn": 9792225555, "name": "Joe Smith"},
+            {"phn": 9791234567, "name": "Nobody"},
+            {"phn": 9790012000, "name": "Twice"},
+        ])
+        self.assertEqual(rejected, [(2, "patient is the current patient"), (3, "patient not found"), (4, "patient updated twice in the batch")])
+        self.assertEqual(self.controller.search_patient(9790014444).name, "John Smith")
+        self.assertEqual(self.controller.search_patient(9790012000).name, "Mary Doe")
+        self.assertEqual([patient.phn for patient in self.controller.retrieve_patients("smith")], [9790014444])
+
+    def test_delete_patients(self):
+        self.use_dao(PatientDAOSQLite(autosave=True, filepath=os.path.join(self.directory, "clinic.db")))
+        self.controller.create_patients([entry(9790012000), entry(9790014444), entry(9792225555)])
+        self.controller.set_current_patient(9792225555)
+
+        rejected = self.controller.delete_patients([9790012000, 9790012000, 9792225555, 9791234567, 9790014444])
+        self.assertEqual([position for position, reason in rejected], [1, 2, 3])
+        self.assertEqual([patient.phn for patient in self.controller.list_patients()], [9792225555])
+        self.controller.patient_dao.connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
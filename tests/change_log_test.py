@@ -0,0 +1,148 @@
+# change_log_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from clinic.change_log import Change, ChangeLog
+from clinic.controller import Controller
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+from clinic.exception.illegal_access_exception import IllegalAccessException
+from clinic.exception.illegal_operation_exception import IllegalOperationException
+
+
+def entry(phn, name):
+    return {"phn": phn, "name": name, "birth_date": "2000-10-10", "phone": "250 203 1010",
+            "email": "patient@gmail.com", "address": "300 Moss St, Victoria"}
+
+
+class TestChangeLog(unittest.TestCase):
+
+    def test_bounded(self):
+        log = ChangeLog(3)
+        for phn in range(10):
+            log.record((Change("patient", phn, None, (phn,)),))
+        self.assertEqual(len(log.done), 3)
+        self.assertEqual(log.descriptions(), ["Created patient 7", "Created patient 8", "Created patient 9"])
+
+        log.undo()
+        log.undo()
+        self.assertEqual(log.to_redo()[0].key, 8)
+        log.record((Change("patient", 10, None, (10,)),))
+        self.assertIsNone(log.to_redo(), "a new change drops the undone steps")
+
+    def test_inverse(self):
+        change = Change("patient", 1, (1, "John Doe"), (2, "John Smith"))
+        self.assertEqual(change.inverse(), Change("patient", 2, (2, "John Smith"), (1, "John Doe")))
+        self.assertEqual(change.inverse().inverse(), change)
+        self.assertEqual(change.describe(), "Updated patient 1, new PHN 2")
+
+
+class TestControllerUndo(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def use_dao(self, dao):
+        self.controller = Controller(autosave=dao.autosave, patient_dao=dao)
+        self.controller.login("user", "123456")
+
+    def daos(self):
+        yield PatientDAOJSON(autosave=True, records_dir=self.directory, filepath=os.path.join(self.directory, "patients.json"))
+        yield PatientDAOSQLite(autosave=True, filepath=os.path.join(self.directory, "clinic.db"))
+
+    def phns(self):
+        return sorted(patient.phn for patient in self.controller.list_patients())
+
+    def test_not_logged_in(self):
+        controller = Controller(autosave=False)
+        with self.assertRaises(IllegalAccessException):
+            controller.undo()
+        with self.assertRaises(IllegalAccessException):
+            controller.redo()
+
+    def test_undo_redo_patients(self):
+        for dao in self.daos():
+            self.use_dao(dao)
+            self.controller.create_patients([entry(9790012000, "John Doe"), entry(9790014444, "Mary Doe")])
+            self.controller.update_patient(9790012000, 9790019999, "John Smith", email="john.smith@gmail.com")
+            self.controller.delete_patient(9790014444)
+            self.assertEqual(self.controller.get_session_changes(), [
+                "Created patient 9790012000", "Created patient 9790014444",
+                "Updated patient 9790012000, new PHN 9790019999", "Updated patient 9790019999",
+                "Deleted patient 9790014444"])
+
+            self.assertTrue(self.controller.undo())
+            self.assertEqual(self.phns(), [9790014444, 9790019999])
+            self.assertTrue(self.controller.undo())
+            self.assertEqual(self.phns(), [9790012000, 9790014444])
+            self.assertEqual(self.controller.search_patient(9790012000).email, "patient@gmail.com")
+            self.assertEqual(self.controller.retrieve_patients_by_email("john.smith@gmail.com"), [])
+            self.assertTrue(self.controller.undo())
+            self.assertEqual(self.phns(), [])
+            self.assertFalse(self.controller.undo())
+
+            self.assertTrue(self.controller.redo())
+            self.assertTrue(self.controller.redo())
+            self.assertEqual(self.controller.search_patient(9790019999).name, "John Smith")
+            self.assertEqual(len(self.controller.get_session_changes()), 4)
+            self.controller.logout()
+            self.controller.login("user", "123456")
+            self.assertEqual(self.controller.get_session_changes(), [])
+            self.assertFalse(self.controller.undo())
+
+    def test_undo_redo_notes(self):
+        for dao in self.daos():
+            self.use_dao(dao)
+            self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+            self.controller.set_current_patient(9790012000)
+            created = self.controller.create_note("Prescribed ibuprofen for the headache.").timestamp
+            self.controller.create_note("Blood pressure is high.")
+            self.controller.update_note(1, "Prescribed acetaminophen for the headache.")
+            self.controller.delete_note(2)
+
+            self.controller.undo()
+            self.controller.undo()
+            self.assertEqual([note.text for note in self.controller.list_notes()], ["Blood pressure is high.", "Prescribed ibuprofen for the headache."])
+            self.assertEqual(self.controller.search_note(1).timestamp, created)
+            self.controller.undo()
+            self.controller.undo()
+            self.assertEqual(self.controller.list_notes(), [])
+            self.controller.redo()
+            self.controller.redo()
+            self.assertEqual([note.code for note in self.controller.list_notes()], [2, 1])
+            self.assertEqual(self.controller.create_note("Follow up in two weeks.").code, 3)
+
+            with self.assertRaises(IllegalOperationException):
+                for _ in range(4):
+                    self.controller.undo()  # the creation of the current patient cannot be undone
+            self.controller.unset_current_patient()
+            self.assertTrue(self.controller.undo())
+            self.assertEqual(self.phns(), [])
+
+    def test_rolled_back_transaction_is_not_logged(self):
+        self.use_dao(PatientDAOJSON(autosave=True, records_dir=self.directory, filepath=os.path.join(self.directory, "patients.json")))
+        with self.assertRaises(RuntimeError):
+            with self.controller.transaction():
+                self.controller.create_patients([entry(9790012000, "John Doe")])
+                raise RuntimeError
+        self.assertEqual(self.controller.get_session_changes(), [])
+
+    def test_undo_does_not_reload(self):
+        dao = PatientDAOJSON(autosave=True, records_dir=self.directory, filepath=os.path.join(self.directory, "patients.json"))
+        self.use_dao(dao)
+        self.controller.create_patients([entry(9790012000 + phn, "Patient") for phn in range(3)])
+        with patch.object(dao, "load_patients") as load, patch.object(dao, "save_patients", wraps=dao.save_patients) as save:
+            self.controller.undo()
+        load.assert_not_called()
+        self.assertEqual(save.call_count, 1, "the bulk creation is undone in one write")
+        self.assertEqual(PatientDAOJSON(autosave=True, records_dir=self.directory, filepath=dao.filepath).list_patients(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
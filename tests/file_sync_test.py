@@ -0,0 +1,68 @@
+# file_sync_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from clinic.dao.file_sync import FileSync
+
+
+class TestFileSync(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "patients.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.filepath) as file:
+            return file.read()
+
+    def test_write_replaces_file(self):
+        file_sync = FileSync()
+        file_sync.write(self.filepath, lambda file: file.write("old"))
+        file_sync.write(self.filepath, lambda file: file.write("new"))
+        self.assertEqual(self.read(), "new")
+        self.assertEqual(os.listdir(self.directory), ["patients.json"], "no temporary file is left behind")
+
+    def test_failed_write_keeps_previous_file(self):
+        file_sync = FileSync()
+        file_sync.write(self.filepath, lambda file: file.write("old"))
+
+        def crash(file):
+            file.write("half written")
+            raise RuntimeError("crash")
+
+        with self.assertRaises(RuntimeError):
+            file_sync.write(self.filepath, crash)
+        self.assertEqual(self.read(), "old")
+        self.assertEqual(os.listdir(self.directory), ["patients.json"])
+
+    def test_fsync_policies(self):
+        with patch("clinic.dao.file_sync.os.fsync") as fsync:
+            FileSync(FileSync.NEVER).write(self.filepath, lambda file: file.write("data"))
+            self.assertEqual(fsync.call_count, 0)
+
+            FileSync(FileSync.ALWAYS).write(self.filepath, lambda file: file.write("data"))
+            self.assertEqual(fsync.call_count, 2, "the file and its directory")
+
+            fsync.reset_mock()
+            file_sync = FileSync(FileSync.ON_LOGOUT)
+            file_sync.write(self.filepath, lambda file: file.write("data"))
+            file_sync.append(self.filepath, "more")
+            self.assertEqual(fsync.call_count, 0)
+            self.assertEqual(file_sync.unsynced, {self.filepath})
+
+            file_sync.sync()
+            self.assertEqual(fsync.call_count, 2, "the file and its directory")
+            self.assertEqual(file_sync.unsynced, set())
+
+        with self.assertRaises(ValueError):
+            FileSync("sometimes")
+
+
+if __name__ == "__main__":
+    unittest.main()
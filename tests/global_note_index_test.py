@@ -0,0 +1,145 @@
+# global_note_index_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from clinic.controller import Controller
+from clinic.dao.global_note_index import GlobalNoteIndex
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.exception.illegal_access_exception import IllegalAccessException
+from clinic.patient import Patient
+
+
+class TestGlobalNoteIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "patients.json")
+        self.index_filepath = os.path.join(self.directory, "notes.index")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open_dao(self):
+        return PatientDAOJSON(autosave=True, records_dir=self.directory, filepath=self.filepath, global_note_index=GlobalNoteIndex(self.index_filepath))
+
+    def create_patients(self, dao):
+        john = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria", autosave=True)
+        mary = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria", autosave=True)
+        dao.create_patient(john)
+        dao.create_patient(mary)
+        john.create_note("Prescribed ibuprofen for the headache.")
+        john.create_note("Blood pressure is high.")
+        mary.create_note("Patient is allergic to Ibuprofen.")
+        return john, mary
+
+    def test_search_follows_note_changes(self):
+        dao = self.open_dao()
+        john, mary = self.create_patients(dao)
+        self.assertEqual(dao.search_notes("ibuprofen"), [(john.phn, 1), (mary.phn, 1)])
+        self.assertEqual(dao.search_notes("ibuprofen headache"), [(john.phn, 1)])
+        self.assertEqual(dao.search_notes("ibuprofen", offset=1, limit=1), [(mary.phn, 1)])
+        self.assertEqual(dao.search_notes("ibu"), [], "whole words only")
+
+        john.update_note(1, "Prescribed paracetamol for the headache.")
+        mary.delete_note(1)
+        self.assertEqual(dao.search_notes("ibuprofen"), [])
+        self.assertEqual(dao.search_notes("paracetamol"), [(john.phn, 1)])
+
+        dao.delete_patient(john.phn)
+        self.assertEqual(dao.search_notes("paracetamol"), [])
+
+    def test_search_does_not_load_records(self):
+        dao = self.open_dao()
+        john, mary = self.create_patients(dao)
+        dao.flush()
+
+        reopened = self.open_dao()
+        self.assertEqual(reopened.search_notes("blood"), [(john.phn, 2)])
+        for patient in reopened.list_patients():
+            self.assertFalse(patient.record.note_dao_loaded)
+
+    def test_search_without_index_does_not_keep_records(self):
+        dao = self.open_dao()
+        john, mary = self.create_patients(dao)
+        dao.flush()
+
+        plain = PatientDAOJSON(autosave=True, records_dir=self.directory, filepath=self.filepath)
+        plain.search_patient(mary.phn).update_note(1, "Patient is allergic to aspirin.")
+        self.assertEqual(plain.search_notes("blood"), [(john.phn, 2)])
+        self.assertEqual(plain.search_notes("aspirin"), [(mary.phn, 1)], "loaded records are searched as they are")
+        self.assertFalse(plain.search_patient(john.phn).record.note_dao_loaded, "the notes were read, not kept")
+
+    def test_index_is_built_and_healed(self):
+        dao = self.open_dao()
+        john, mary = self.create_patients(dao)
+        dao.flush()
+        os.remove(self.index_filepath)
+        self.assertEqual(self.open_dao().search_notes("ibuprofen"), [(john.phn, 1), (mary.phn, 1)], "a missing index is rebuilt")
+
+        # notes saved without the index are reindexed when their record is loaded
+        NoteDAOPickle(john.phn, True, records_dir=self.directory).create_note("Ibuprofen stopped.")
+        reopened = self.open_dao()
+        self.assertEqual(reopened.search_notes("stopped"), [])
+        reopened.search_patient(john.phn).list_notes()
+        self.assertEqual(reopened.search_notes("stopped"), [(john.phn, 3)])
+
+    def test_saved_notes_survive_a_crash(self):
+        dao = self.open_dao()
+        john, mary = self.create_patients(dao)
+        dao.flush()
+
+        # no flush: the index snapshot is older than these notes
+        john.create_note("Started warfarin.")
+        mary.update_note(1, "Patient is allergic to aspirin.")
+        reopened = self.open_dao()
+        self.assertEqual(reopened.search_notes("warfarin"), [(john.phn, 3)])
+        self.assertEqual(reopened.search_notes("ibuprofen"), [(john.phn, 1)])
+        self.assertEqual(reopened.search_notes("aspirin"), [(mary.phn, 1)])
+        for patient in reopened.list_patients():
+            self.assertFalse(patient.record.note_dao_loaded)
+
+        reopened.flush()
+        self.assertEqual(os.path.getsize(reopened.global_note_index.journal_filepath), 0, "a snapshot truncates the journal")
+        self.assertEqual(self.open_dao().search_notes("warfarin"), [(john.phn, 3)])
+
+    def test_appends_after_torn_journal_tail(self):
+        dao = self.open_dao()
+        john, mary = self.create_patients(dao)
+        dao.flush()
+        john.create_note("Started warfarin.")
+        with open(dao.global_note_index.journal_filepath, "a") as file:
+            file.write('{"phn": 9790014444, "revision": 9, "no')
+
+        reopened = self.open_dao()
+        reopened.search_patient(mary.phn).create_note("Patient feels dizzy.")
+        reopened = self.open_dao()
+        self.assertEqual(reopened.search_notes("warfarin"), [(john.phn, 3)])
+        self.assertEqual(reopened.search_notes("dizzy"), [(mary.phn, 2)], "a later append is not glued onto the torn record")
+
+
+class TestControllerSearchNotes(unittest.TestCase):
+
+    def test_search_notes(self):
+        controller = Controller(autosave=False)
+        with self.assertRaises(IllegalAccessException):
+            controller.search_notes("headache")
+        controller.login("user", "123456")
+        for phn in (9790012000, 9790014444, 9792225555):
+            controller.create_patient(phn, "Patient %d" % phn, "2000-10-10", "250 203 1010", "patient@gmail.com", "300 Moss St, Victoria")
+            controller.set_current_patient(phn)
+            controller.create_note("Patient comes with headache.")
+
+        self.assertEqual(controller.search_notes("headache", page=0, page_size=2), [(9790012000, 1), (9790014444, 1)])
+        self.assertEqual(controller.search_notes("headache", page=1, page_size=2), [(9792225555, 1)])
+        self.assertIsNone(controller.search_notes(""))
+
+    def test_index_is_opt_in(self):
+        self.assertIsNone(Controller(autosave=False).patient_dao.global_note_index)
+        self.assertIsNotNone(Controller(autosave=False, note_search_index=True).patient_dao.global_note_index)
+
+
+if __name__ == "__main__":
+    unittest.main()
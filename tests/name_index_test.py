@@ -0,0 +1,81 @@
+# name_index_test.py
+
+import unittest
+from clinic.dao.name_index import NameIndex
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.patient import Patient
+
+
+class TestNameIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = NameIndex()
+        self.index.add(1, "John Doe")
+        self.index.add(2, "Mary Doe")
+        self.index.add(3, "Joe Hancock")
+
+    def test_search_ignores_case(self):
+        self.assertEqual(self.index.search("doe"), [1, 2])
+        self.assertEqual(self.index.search("N D"), [1])
+        self.assertEqual(self.index.search("jo"), [1, 3])
+        self.assertEqual(self.index.search("K"), [3])
+        self.assertEqual(self.index.search(""), [1, 2, 3])
+        self.assertEqual(self.index.search("Smith"), [])
+
+    def test_updates_keep_insertion_order(self):
+        self.index.add(1, "John Smith")
+        self.assertEqual(self.index.search("doe"), [2])
+        self.assertEqual(self.index.search("o"), [1, 2, 3])
+
+        self.index.remove(1)
+        self.index.add(1, "John Doe")
+        self.assertEqual(self.index.search("doe"), [2, 1], "a removed key added again goes last")
+        self.assertEqual(self.index.postings.get("smi"), None)
+        self.assertEqual(self.index.bigram_postings.get("sm"), None)
+        self.index.add(2, "Mary Jones")
+        self.assertEqual(self.index.search("jo"), [2, 3, 1], "a renamed key keeps its position")
+
+    def test_short_searches_use_postings(self):
+        index = NameIndex()
+        for key in range(100):
+            index.add(key, "Patient %d" % key)
+        index.add(100, "Zoe Smith")
+        self.assertEqual(index.estimate("zo"), 1)
+        self.assertEqual(index.search("zo"), [100])
+        self.assertEqual(index.search(" 9"), [9] + list(range(90, 100)))
+        self.assertEqual(index.search("9"), [key for key in range(100) if "9" in str(key)], "single characters scan")
+        self.assertIsNone(index.estimate("9"))
+
+    def test_search_stops_at_the_limit(self):
+        self.index.add(4, "John Doell")
+        self.assertEqual(self.index.search("doe", limit=2), [1, 2])
+        self.assertEqual(self.index.search("y doe", limit=1), [2])
+        self.assertEqual(self.index.search("jo", limit=1), [1])
+        self.assertEqual(self.index.search("o", limit=3), [1, 2, 3])
+        self.index.add(1, "Jon Doe")
+        self.assertEqual(self.index.search("n doe"), [1, 4], "a renamed key keeps its position")
+        self.assertEqual(self.index.search("n doe", limit=1), [1])
+
+
+class TestPatientDAOJSONNameIndex(unittest.TestCase):
+
+    def test_retrieve_patients_follows_changes(self):
+        dao = PatientDAOJSON(autosave=False)
+        john = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        mary = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+        dao.create_patient(john)
+        dao.create_patient(mary)
+        self.assertEqual(dao.retrieve_patients("doe"), [john, mary])
+
+        # the controller changes the patient in place before updating it
+        john.name = "John Smith"
+        dao.update_patient(john.phn, john)
+        self.assertEqual(dao.retrieve_patients("doe"), [mary])
+        self.assertEqual(dao.retrieve_patients("smith"), [john])
+
+        dao.delete_patient(mary.phn)
+        self.assertEqual(dao.retrieve_patients("doe"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# note_dao_cache_test.py
+
+import unittest
+from unittest.mock import MagicMock, patch
+from clinic.dao.note_dao_cache import NoteDAOCache
+from clinic.patient_record import PatientRecord
+
+
+class TestLazyPatientRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = MagicMock(side_effect=lambda phn, autosave: MagicMock(name="note_dao_%s" % phn))
+        with patch('clinic.patient_record.NoteDAOPickle', self.factory):
+            self.records = [PatientRecord(phn, True) for phn in (1, 2, 3)]
+
+    def test_note_dao_created_on_first_use(self):
+        self.factory.assert_not_called()
+        self.assertFalse(self.records[0].note_dao_loaded)
+
+        self.records[0].list_notes()
+        self.records[0].list_notes()
+        self.factory.assert_called_once_with(1, True)
+        self.assertTrue(self.records[0].note_dao_loaded)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = NoteDAOCache(2)
+        for record in self.records:
+            record.note_cache = cache
+
+        self.records[0].list_notes()
+        self.records[1].list_notes()
+        self.records[0].list_notes()
+        self.records[2].list_notes()
+
+        self.assertTrue(self.records[0].note_dao_loaded)
+        self.assertFalse(self.records[1].note_dao_loaded, "record 2 was the least recently used")
+        self.assertTrue(self.records[2].note_dao_loaded)
+
+        self.records[1].list_notes()
+        self.assertEqual(self.factory.call_count, 4, "an evicted record is loaded again on next use")
+
+    def test_note_dao_returned_when_evicted_meanwhile(self):
+        # a concurrent reader's touch can release the record before it returns its DAO
+        cache = MagicMock()
+        cache.touch.side_effect = lambda record: record.release_note_dao()
+        self.records[0].note_cache = cache
+
+        note_dao = self.records[0].note_dao
+        self.assertIsNotNone(note_dao)
+        note_dao.flush.assert_called_once_with()
+        self.assertFalse(self.records[0].note_dao_loaded)
+
+    def test_unsaved_records_are_not_released(self):
+        with patch('clinic.patient_record.NoteDAOPickle', self.factory):
+            record = PatientRecord(4, False)
+        record.note_dao.create_note("not persisted")
+        record.release_note_dao()
+        self.assertTrue(record.note_dao_loaded)
+
+    def test_injected_note_dao_is_kept(self):
+        note_dao = MagicMock()
+        record = PatientRecord(5, True, note_dao)
+        record.note_cache = NoteDAOCache(1)
+        record.list_notes()
+        record.release_note_dao()
+        self.assertIs(record.note_dao, note_dao)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# note_dao_pickle_test.py
+
+import shutil
+import tempfile
+import unittest
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+
+
+class TestNoteDAOPickle(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def codes(self, notes):
+        return [note.code for note in notes]
+
+    def test_list_order_after_delete_and_restore(self):
+        dao = NoteDAOPickle(9792225555, True, records_dir=self.directory)
+        for i in range(1, 6):
+            dao.create_note("Visit %d" % i)
+        deleted = dao.search_note(3)
+        self.assertTrue(dao.delete_note(3))
+        self.assertEqual(self.codes(dao.list_notes()), [5, 4, 2, 1])
+
+        dao.restore_note(deleted)
+        self.assertEqual(self.codes(dao.list_notes()), [5, 4, 3, 2, 1], "a restored note goes back to its place")
+        self.assertEqual(self.codes(dao.retrieve_notes("Visit 3")), [3])
+        self.assertEqual(dao.create_note("Visit 6").code, 6)
+
+        reloaded = NoteDAOPickle(9792225555, True, records_dir=self.directory)
+        self.assertEqual(self.codes(reloaded.list_notes()), [6, 5, 4, 3, 2, 1])
+
+    def test_lookup_update_delete_by_code(self):
+        dao = NoteDAOPickle(9792225555, False)
+        for i in range(1, 20001):
+            dao.create_note("Visit %d" % i)
+
+        self.assertEqual(dao.search_note(12345).text, "Visit 12345")
+        self.assertIsNone(dao.search_note(20001))
+        self.assertTrue(dao.update_note(12345, "Follow-up visit"))
+        self.assertEqual(dao.search_note(12345).text, "Follow-up visit")
+        self.assertFalse(dao.update_note(20001, "Missing"))
+
+        self.assertTrue(dao.delete_note(10000))
+        self.assertFalse(dao.delete_note(10000))
+        self.assertIsNone(dao.search_note(10000))
+        notes = dao.list_notes()
+        self.assertEqual(len(notes), 19999)
+        self.assertEqual(self.codes(notes[:3]), [20000, 19999, 19998])
+        self.assertEqual(self.codes(notes[-3:]), [3, 2, 1])
+        self.assertEqual(self.codes(dao.retrieve_notes("Follow-up")), [12345])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# note_index_test.py
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.dao.note_index import NoteIndex
+from clinic.note import Note
+
+
+class TestNoteIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def texts(self, notes):
+        return [note.text for note in notes]
+
+    def test_search_keeps_substring_semantics(self):
+        notes = [Note(1, "Patient comes with headache."), Note(2, "Prescribed ibuprofen."), Note(3, "No more headaches.")]
+        index = NoteIndex(notes)
+        notes_by_code = {note.code: note for note in notes}
+
+        self.assertEqual(self.texts(index.search("headache", notes_by_code)), ["Patient comes with headache.", "No more headaches."])
+        self.assertEqual(self.texts(index.search("ache.", notes_by_code)), ["Patient comes with headache."])
+        self.assertEqual(self.texts(index.search("Head", notes_by_code)), [], "search is case sensitive")
+        self.assertEqual(self.texts(index.search("ib", notes_by_code)), ["Prescribed ibuprofen."], "short searches scan")
+        self.assertEqual(index.search("lungs", notes_by_code), [])
+
+    def test_index_follows_note_changes(self):
+        dao = NoteDAOPickle(9792225555, True, records_dir=self.directory)
+        dao.create_note("Patient comes with headache.")
+        dao.create_note("Patient complains of a strong headache.")
+        dao.create_note("Blood pressure is high.")
+        dao.update_note(2, "Patient complains of neck pain.")
+        dao.delete_note(1)
+
+        self.assertEqual(dao.retrieve_notes("headache"), [])
+        self.assertEqual(self.texts(dao.retrieve_notes("neck")), ["Patient complains of neck pain."])
+        self.assertEqual(self.texts(dao.retrieve_notes("Patient")), ["Patient complains of neck pain."])
+
+    def test_index_is_saved_in_the_records_file(self):
+        dao = NoteDAOPickle(9792225555, True, records_dir=self.directory)
+        dao.create_note("Patient comes with headache.")
+        dao.create_note("Patient takes medicines to control blood pressure.")
+        self.assertEqual(os.listdir(self.directory), ["9792225555.dat"], "no separate index file")
+
+        reloaded = NoteDAOPickle(9792225555, True, records_dir=self.directory)
+        self.assertEqual(reloaded.index.postings, dao.index.postings)
+        self.assertEqual(self.texts(reloaded.retrieve_notes("blood")), ["Patient takes medicines to control blood pressure."])
+
+        # an index that was not saved along with the notes is rebuilt
+        records_file = os.path.join(self.directory, "9792225555.dat")
+        with open(records_file, "rb") as file:
+            data = pickle.load(file)
+        data["index"] = {"revision": dao.revision - 1, "postings": {}}
+        with open(records_file, "wb") as file:
+            pickle.dump(data, file)
+        rebuilt = NoteDAOPickle(9792225555, True, records_dir=self.directory)
+        self.assertEqual(rebuilt.index.postings, dao.index.postings)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# note_store_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from clinic.dao.note_store import NoteStore
+from clinic.dao.note_dao_store import NoteDAOStore
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.patient import Patient
+
+
+class TestNoteStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "notes.store")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_latest_write(self):
+        store = NoteStore(self.filepath)
+        self.assertIsNone(store.read(9790012000))
+        store.write(9790012000, {"notes": ["first"]})
+        store.write(9792225555, {"notes": ["other"]})
+        store.write(9790012000, {"notes": ["first", "second"]})
+
+        self.assertEqual(store.read(9790012000), {"notes": ["first", "second"]})
+        self.assertEqual(store.read(9792225555), {"notes": ["other"]})
+        self.assertIn(9790012000, store)
+
+        store.delete(9792225555)
+        self.assertNotIn(9792225555, store)
+        self.assertIsNone(store.read(9792225555))
+
+    def test_reopen_with_and_without_saved_index(self):
+        store = NoteStore(self.filepath)
+        store.write(9790012000, {"notes": ["first"]})
+        store.save_index()
+        store.write(9792225555, {"notes": ["after the index was saved"]})
+
+        reopened = NoteStore(self.filepath)
+        self.assertEqual(reopened.read(9790012000), {"notes": ["first"]})
+        self.assertEqual(reopened.read(9792225555), {"notes": ["after the index was saved"]})
+
+        os.remove(store.index_filepath)
+        rescanned = NoteStore(self.filepath)
+        self.assertEqual(rescanned.index, reopened.index)
+
+    def test_torn_last_record_is_cut_off(self):
+        store = NoteStore(self.filepath)
+        store.write(9790012000, {"notes": ["kept"]})
+        size = os.path.getsize(self.filepath)
+        store.write(9790012000, {"notes": ["torn"]})
+        os.truncate(self.filepath, os.path.getsize(self.filepath) - 3)
+
+        reopened = NoteStore(self.filepath)
+        self.assertEqual(reopened.read(9790012000), {"notes": ["kept"]})
+        self.assertEqual(os.path.getsize(self.filepath), size)
+
+    def test_compaction(self):
+        store = NoteStore(self.filepath, min_compaction_bytes=0)
+        for i in range(50):
+            store.write(9790012000, {"notes": ["version %d" % i]})
+        self.assertLess(os.path.getsize(self.filepath), 200, "superseded records are dropped")
+
+        reopened = NoteStore(self.filepath)
+        self.assertEqual(reopened.read(9790012000), {"notes": ["version 49"]})
+
+
+class TestPatientDAOJSONNoteStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "patients.json")
+        self.store = NoteStore(os.path.join(self.directory, "records", "notes.store"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_records_keep_notes_in_the_store(self):
+        dao = PatientDAOJSON(autosave=True, filepath=self.filepath, note_store=self.store)
+        patient = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria", autosave=True)
+        dao.create_patient(patient)
+        patient.record.create_note("Patient comes with headache.")
+        self.assertIsInstance(patient.record.note_dao, NoteDAOStore)
+        dao.flush()
+
+        reloaded = PatientDAOJSON(autosave=True, filepath=self.filepath, note_store=NoteStore(self.store.filepath))
+        notes = reloaded.search_patient(9790012000).record.list_notes()
+        self.assertEqual([note.text for note in notes], ["Patient comes with headache."])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory, "records"))), ["notes.store", "notes.store.idx"])
+
+    def test_records_files_move_into_the_store(self):
+        records_dir = os.path.join(self.directory, "records")
+        legacy = PatientDAOJSON(autosave=True, filepath=self.filepath, records_dir=records_dir)
+        patient = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria", autosave=True)
+        legacy.create_patient(patient)
+        patient.record.create_note("Patient comes with headache.")
+        patient.record.create_note("Patient is taking medicines.")
+        self.assertTrue(os.path.exists(os.path.join(records_dir, "9790012000.dat")))
+
+        dao = PatientDAOJSON(autosave=True, filepath=self.filepath, note_store=self.store, records_dir=records_dir)
+        record = dao.search_patient(9790012000).record
+        self.assertEqual([note.text for note in record.list_notes()], ["Patient is taking medicines.", "Patient comes with headache."])
+        self.assertFalse(os.path.exists(os.path.join(records_dir, "9790012000.dat")), "the records file moved into the store")
+        self.assertTrue(record.delete_note(1))
+        dao.flush()
+
+        reloaded = PatientDAOJSON(autosave=True, filepath=self.filepath, note_store=NoteStore(self.store.filepath), records_dir=records_dir)
+        notes = reloaded.search_patient(9790012000).record.list_notes()
+        self.assertEqual([note.text for note in notes], ["Patient is taking medicines."], "a deleted note does not come back")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# patient_dao_json_test.py
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.note import Note
+from clinic.patient import Patient
+
+
+class TestPatientDAOJSONJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "patients.json")
+        self.dao = self.new_dao()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def new_dao(self, snapshot_interval=1000):
+        return PatientDAOJSON(autosave=True, journal=True, snapshot_interval=snapshot_interval, filepath=self.filepath)
+
+    def journal_lines(self):
+        with open(self.dao.journal_filepath) as file:
+            return file.readlines()
+
+    def test_mutations_append_to_journal(self):
+        self.dao.create_patient(Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria"))
+        self.dao.create_patient(Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria"))
+        self.dao.delete_patient(9790012000)
+
+        self.assertFalse(os.path.exists(self.filepath), "no snapshot is written before the interval is reached")
+        self.assertEqual(len(self.journal_lines()), 3)
+
+    def test_replay_snapshot_and_journal(self):
+        john = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        mary = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+        self.dao.create_patient(john)
+        self.dao.create_patient(mary)
+        self.dao.save_patients()
+        self.assertEqual(self.journal_lines(), [], "a snapshot truncates the journal")
+
+        mary.phone = "250 999 0000"
+        self.dao.update_patient(mary.phn, mary)
+        self.dao.delete_patient(john.phn)
+
+        reloaded = self.new_dao()
+        self.assertIsNone(reloaded.search_patient(john.phn))
+        self.assertEqual(reloaded.search_patient(mary.phn), mary)
+        self.assertEqual(reloaded.journal_length, 2)
+
+    def test_snapshot_interval_compacts_journal(self):
+        self.dao = self.new_dao(snapshot_interval=3)
+        for i in range(4):
+            self.dao.create_patient(Patient(1000 + i, "Patient %d" % i, "2000-01-01", "", "", ""))
+
+        self.assertTrue(os.path.exists(self.filepath))
+        self.assertEqual(len(self.journal_lines()), 1)
+        self.assertEqual(len(self.new_dao().list_patients()), 4)
+
+    def test_torn_journal_tail_is_ignored(self):
+        self.dao.create_patient(Patient(1000, "Patient", "2000-01-01", "", "", ""))
+        with open(self.dao.journal_filepath, "a") as file:
+            file.write('{"op": "put", "patient": {"phn": 10')
+
+        self.assertEqual(len(self.new_dao().list_patients()), 1)
+
+    def test_appends_after_torn_journal_tail(self):
+        self.dao.create_patient(Patient(1000, "Patient A", "2000-01-01", "", "", ""))
+        with open(self.dao.journal_filepath, "a") as file:
+            file.write('{"op": "put", "patient": {"phn": 10')
+
+        self.dao = self.new_dao()
+        self.dao.create_patient(Patient(1001, "Patient B", "2000-01-01", "", "", ""))
+        self.dao.create_patient(Patient(1002, "Patient C", "2000-01-01", "", "", ""))
+
+        self.assertEqual([patient.phn for patient in self.new_dao().list_patients()], [1000, 1001, 1002])
+        self.assertEqual(len(self.journal_lines()), 3, "the torn record was cut off")
+
+    def test_journal_replayed_without_journal_mode(self):
+        john = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        self.dao.create_patient(john)
+
+        plain = PatientDAOJSON(autosave=True, filepath=self.filepath)
+        self.assertEqual(plain.list_patients(), [john])
+        plain.delete_patient(john.phn)
+        self.assertEqual(self.journal_lines(), [], "the snapshot save truncates the journal")
+        self.assertEqual(self.new_dao().list_patients(), [], "no stale journal is replayed on the newer snapshot")
+
+
+class TestPatientDAOJSONFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "patients.json")
+        self.phn = 1234509876
+        self.records_file = "clinic/records/%d.dat" % self.phn
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        if os.path.exists(self.records_file):
+            os.remove(self.records_file)
+
+    def test_patients_saved_without_notes(self):
+        dao = PatientDAOJSON(autosave=True, filepath=self.filepath)
+        patient = Patient(self.phn, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        dao.create_patient(patient)
+        patient.create_note("Patient comes with headache and high blood pressure.")
+        dao.update_patient(self.phn, patient)
+
+        with open(self.filepath) as file:
+            data = json.load(file)
+        self.assertEqual(data["version"], PatientDAOJSON.FORMAT_VERSION)
+        self.assertNotIn("record", data[str(self.phn)])
+
+    def test_format_1_is_migrated(self):
+        with open(self.filepath, "w") as file:
+            json.dump({str(self.phn): {"phn": self.phn, "name": "John Doe", "birth_date": "2000-10-10", "phone_number": "250 203 1010",
+                                        "email": "john.doe@gmail.com", "address": "300 Moss St, Victoria",
+                                        "record": {"notes": [{"code": 1, "text": "Patient comes with headache.", "timestamp": "2024-10-27T10:30:00"},
+                                                             {"code": 3, "text": "Patient feels better.", "timestamp": None}]}}}, file)
+
+        dao = PatientDAOJSON(autosave=True, filepath=self.filepath)
+        with open(self.filepath) as file:
+            data = json.load(file)
+        self.assertEqual(data["version"], PatientDAOJSON.FORMAT_VERSION)
+        self.assertNotIn("record", data[str(self.phn)])
+
+        patient = PatientDAOJSON(autosave=True, filepath=self.filepath).search_patient(self.phn)
+        self.assertEqual(patient.list_notes(), [Note(3, "Patient feels better."), Note(1, "Patient comes with headache.")])
+        self.assertEqual(patient.create_note("Follow up.").code, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# patient_dao_sqlite_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from clinic.controller import Controller
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+from clinic.note import Note
+from clinic.patient import Patient
+
+
+class TestPatientDAOSQLite(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "clinic.db")
+        self.dao = PatientDAOSQLite(autosave=True, filepath=self.filepath)
+        self.john = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        self.mary = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+
+    def tearDown(self):
+        self.dao.connection.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self):
+        self.dao.connection.close()
+        self.dao = PatientDAOSQLite(autosave=True, filepath=self.filepath)
+
+    def test_patients_persist(self):
+        self.dao.create_patient(self.john)
+        self.dao.create_patient(self.mary)
+        self.mary.phone = "250 999 0000"
+        self.dao.update_patient(self.mary.phn, self.mary)
+        self.reopen()
+
+        self.assertEqual(self.dao.search_patient(self.john.phn), self.john)
+        self.assertEqual(self.dao.search_patient(self.mary.phn), self.mary)
+        self.assertEqual(self.dao.retrieve_patients("doe"), [self.john, self.mary])
+
+        self.dao.delete_patient(self.john.phn)
+        self.reopen()
+        self.assertIsNone(self.dao.search_patient(self.john.phn))
+        self.assertEqual(self.dao.list_patients(), [self.mary])
+
+    def test_notes_persist(self):
+        self.dao.create_patient(self.john)
+        self.john.create_note("Patient comes with headache and high blood pressure.")
+        self.john.create_note("Patient complains of a strong headache on the back of neck.")
+        self.john.create_note("Patient is taking medicines to control blood pressure.")
+        self.assertTrue(self.john.update_note(3, "Patient stopped the medicines."))
+        self.assertTrue(self.john.delete_note(1))
+        self.assertFalse(self.john.delete_note(1))
+        self.reopen()
+
+        patient = self.dao.search_patient(self.john.phn)
+        self.assertEqual(patient.list_notes(), [Note(3, "Patient stopped the medicines."),
+                                                Note(2, "Patient complains of a strong headache on the back of neck.")])
+        self.assertEqual(patient.retrieve_notes("neck"), [Note(2, "Patient complains of a strong headache on the back of neck.")])
+        self.assertIsNone(patient.search_note(1))
+        self.assertEqual(patient.create_note("Follow up in two weeks.").code, 4)
+
+    def test_note_daos_of_one_patient_assign_distinct_codes(self):
+        self.dao.create_patient(self.john)
+        first = self.dao.search_patient(self.john.phn)
+        second = self.dao.search_patient(self.john.phn)
+        self.assertEqual(first.create_note("First visit.").code, 1)
+        self.assertEqual(second.create_note("Second visit.").code, 2)
+        self.assertEqual(first.create_note("Third visit.").code, 3)
+        self.assertEqual([note.code for note in self.john.list_notes()], [3, 2, 1])
+
+    def test_fsync_never_keeps_synchronous_writes(self):
+        dao = PatientDAOSQLite(autosave=True, filepath=os.path.join(self.directory, "never.db"), fsync_policy="never")
+        (synchronous,) = dao.connection.execute("PRAGMA synchronous").fetchone()
+        dao.connection.close()
+        self.assertEqual(synchronous, 1, "NORMAL, OFF could corrupt the database on an OS crash")
+
+    def test_search_notes_of_every_patient(self):
+        self.dao.create_patient(self.john)
+        self.dao.create_patient(self.mary)
+        self.john.create_note("Prescribed ibuprofen for the headache.")
+        self.mary.create_note("Patient is allergic to Ibuprofen.")
+        self.mary.create_note("Prescribed ibuprofens.")
+
+        self.assertEqual(self.dao.search_notes("ibuprofen"), [(self.john.phn, 1), (self.mary.phn, 1)])
+        self.assertEqual(self.dao.search_notes("prescribed IBUPROFEN"), [(self.john.phn, 1)])
+        self.assertEqual(self.dao.search_notes("ibuprofen", offset=1, limit=1), [(self.mary.phn, 1)])
+
+    def test_fuzzy_search_patients(self):
+        self.dao.create_patient(self.john)
+        self.dao.create_patient(self.mary)
+        self.assertEqual(self.dao.fuzzy_search_patients("Jon Dow"), [self.john])
+        self.assertEqual(self.dao.fuzzy_search_patients("doe"), [self.john, self.mary])
+
+        self.john.name = "John Smith"
+        self.dao.update_patient(self.john.phn, self.john)
+        self.dao.delete_patient(self.mary.phn)
+        self.reopen()
+        self.assertEqual(self.dao.fuzzy_search_patients("doe"), [])
+        self.assertEqual(self.dao.fuzzy_search_patients("smyth"), [self.john])
+
+    def test_retrieve_patients_by_field(self):
+        self.dao.create_patient(self.john)
+        self.dao.create_patient(self.mary)
+        self.assertEqual(self.dao.retrieve_patients_by_phone("(250) 203-1010"), [self.john])
+        self.assertEqual(self.dao.retrieve_patients_by_email("Mary.Doe@gmail.com"), [self.mary])
+        self.assertEqual(self.dao.retrieve_patients_by_birth_date("2000-10-10"), [self.john])
+        self.assertEqual(self.dao.retrieve_patients_by_phone(""), [])
+        self.assertEqual(self.dao.retrieve_patients_by_birth_date_range("1990-01-01", "2000-12-31"), [self.mary, self.john])
+        self.assertEqual(self.dao.retrieve_patients_by_birth_date_range("1996-01-01", "1999-12-31"), [])
+
+    def test_controller_with_sqlite_storage(self):
+        controller = Controller(autosave=False, storage="sqlite")
+        controller.login("user", "123456")
+        controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        controller.set_current_patient(9790012000)
+        controller.create_note("Patient comes with headache and high blood pressure.")
+
+        self.assertEqual(controller.list_patients(), [self.john])
+        self.assertEqual(len(controller.list_notes()), 1)
+        with self.assertRaises(ValueError):
+            Controller(autosave=False, storage="csv")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+# patient_decoder_test.py
+
+import json
+import unittest
+from clinic.dao.patient_decoder import PatientDecoder
+from clinic.patient import Patient
+
+
+class TestPatientDecoder(unittest.TestCase):
+
+    def test_decode_top_level_phn_map(self):
+        text = json.dumps({
+            "9790012000": {"phn": 9790012000, "name": "John Doe", "birth_date": "2000-10-10", "phone_number": "250 203 1010",
+                           "email": "john.doe@gmail.com", "address": "300 Moss St, Victoria",
+                           "record": {"notes": [{"code": 1, "text": "headache", "timestamp": None}]}},
+            "9790014444": {"phn": 9790014444, "name": "Mary Doe"},
+        })
+        patients = json.loads(text, cls=PatientDecoder)
+
+        self.assertEqual(list(patients), [9790012000, 9790014444], "patients are keyed by their numeric PHN, in file order")
+        self.assertEqual(patients[9790012000], Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria"))
+        self.assertEqual(patients[9790014444], Patient(9790014444, "Mary Doe", None, None, None, None))
+        self.assertFalse(patients[9790012000].record.note_dao_loaded, "decoding does not open the patient's notes")
+
+    def test_non_patient_entries_are_skipped(self):
+        self.assertEqual(json.loads('{"version": 2}', cls=PatientDecoder), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
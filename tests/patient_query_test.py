@@ -0,0 +1,104 @@
+# patient_query_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from clinic.controller import Controller
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+from clinic.dao.global_note_index import GlobalNoteIndex
+from clinic.dao.patient_query import PatientQuery
+from clinic.exception.illegal_access_exception import IllegalAccessException
+from clinic.patient import Patient
+
+PATIENTS = [
+    (9790012000, "John Doe", "1955-10-10", "john.doe@gmail.com", ["Prescribed ibuprofen."]),
+    (9790014444, "Mary Doe", "1962-07-01", "mary.doe@uvic.ca", []),
+    (9792225555, "Joe Hancock", "1958-01-15", "joe@gmail.com", ["Blood pressure is high.", "Stopped ibuprofen."]),
+    (9791234567, "Ana Doe", "unknown", "ana@GMAIL.com", []),
+]
+
+
+class PatientQueryTests:
+    """Queries every DAO has to answer the same way."""
+
+    def phns(self, **criteria):
+        return [patient.phn for patient in self.dao.query_patients(PatientQuery(**criteria))]
+
+    def test_combined_predicates(self):
+        self.assertEqual(self.phns(name="doe"), [9790012000, 9790014444, 9791234567])
+        self.assertEqual(self.phns(name="doe", email_domain="gmail.com"), [9790012000, 9791234567])
+        self.assertEqual(self.phns(email_domain="@Gmail.com", birth_date_from="1950-01-01", birth_date_to="1959-12-31"),
+                         [9790012000, 9792225555])
+        self.assertEqual(self.phns(notes="ibuprofen"), [9790012000, 9792225555])
+        self.assertEqual(self.phns(notes="ibuprofen", name="jo", birth_date_to="1956-01-01"), [9790012000])
+        self.assertEqual(self.phns(name="smith"), [])
+
+    def test_sorting_and_paging(self):
+        self.assertEqual(self.phns(sort_by="name"), [9791234567, 9792225555, 9790012000, 9790014444])
+        self.assertEqual(self.phns(sort_by="birth_date"), [9790012000, 9792225555, 9790014444, 9791234567])
+        self.assertEqual(self.phns(sort_by="birth_date", descending=True), [9790014444, 9792225555, 9790012000, 9791234567])
+        self.assertEqual(self.phns(sort_by="phn", descending=True, offset=1, limit=2), [9791234567, 9790014444])
+        self.assertEqual(self.phns(offset=3), [9791234567])
+        self.assertEqual(self.phns(name="doe", offset=1, limit=1), [9790014444])
+        self.assertEqual(self.phns(name="doe", offset=2, limit=5), [9791234567])
+
+    def test_invalid_queries(self):
+        with self.assertRaises(ValueError):
+            PatientQuery(sort_by="address")
+        with self.assertRaises(ValueError):
+            PatientQuery(birth_date_from="last year")
+
+
+class TestPatientDAOJSONQuery(PatientQueryTests, unittest.TestCase):
+
+    def setUp(self):
+        self.dao = PatientDAOJSON(autosave=False, global_note_index=GlobalNoteIndex())
+        for phn, name, birth_date, email, notes in PATIENTS:
+            patient = Patient(phn, name, birth_date, "250 203 1010", email, "300 Moss St, Victoria")
+            self.dao.create_patient(patient)
+            for note in notes:
+                patient.create_note(note)
+
+    def test_planner_starts_from_the_most_selective_index(self):
+        self.assertEqual(self.dao.plan_query(PatientQuery(name="doe", email_domain="uvic.ca"))[0], "email_domain")
+        self.assertEqual(self.dao.plan_query(PatientQuery(name="doe", birth_date_to="1956-01-01"))[0], "birth_date")
+        self.assertEqual(self.dao.plan_query(PatientQuery(name="hancock", email_domain="gmail.com"))[0], "name")
+        self.assertEqual(self.dao.plan_query(PatientQuery(name="jo", notes="blood pressure"))[0], "notes")
+        self.assertEqual(self.dao.plan_query(PatientQuery(name="jo"))[0], "name")
+        self.assertEqual(self.dao.plan_query(PatientQuery(sort_by="name"))[0], "scan")
+
+
+class TestPatientDAOSQLiteQuery(PatientQueryTests, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dao = PatientDAOSQLite(autosave=True, filepath=os.path.join(self.directory, "clinic.db"))
+        for phn, name, birth_date, email, notes in PATIENTS:
+            patient = Patient(phn, name, birth_date, "250 203 1010", email, "300 Moss St, Victoria")
+            self.dao.create_patient(patient)
+            for note in notes:
+                patient.create_note(note)
+
+    def tearDown(self):
+        self.dao.connection.close()
+        shutil.rmtree(self.directory)
+
+
+class TestControllerQueryPatients(unittest.TestCase):
+
+    def test_query_patients(self):
+        controller = Controller(autosave=False)
+        with self.assertRaises(IllegalAccessException):
+            controller.query_patients(name="doe")
+        controller.login("user", "123456")
+        for phn, name, birth_date, email, notes in PATIENTS:
+            controller.create_patient(phn, name, birth_date, "250 203 1010", email, "300 Moss St, Victoria")
+
+        patients = controller.query_patients(name="doe", sort_by="name", page=1, page_size=2)
+        self.assertEqual([patient.phn for patient in patients], [9790014444])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+# patient_stream_decoder_test.py
+
+import io
+import json
+import unittest
+from clinic.dao.patient_decoder import PatientDecoder
+from clinic.dao.patient_encoder import PatientEncoder
+from clinic.dao.patient_stream_decoder import PatientStreamDecoder
+from clinic.patient import Patient
+
+
+class TestPatientStreamDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.patients = {
+            9790012000: Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria"),
+            9790014444: Patient(9790014444, "Mary Doé", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria"),
+            9792225555: Patient(9792225555, "Joe Hancock", "1990-01-15", "278 456 7890", "john.hancock@outlook.com", "5000 Douglas St, Saanich"),
+        }
+        self.data = json.dumps(self.patients, cls=PatientEncoder, indent=2, ensure_ascii=False).encode("utf-8")
+
+    def test_decode_matches_json_load(self):
+        for chunk_size in (1, 7, 64, 65536):
+            decoded = PatientStreamDecoder(chunk_size=chunk_size).decode(io.BytesIO(self.data))
+            self.assertEqual(decoded, json.loads(self.data, cls=PatientDecoder))
+            self.assertEqual(decoded, self.patients)
+
+    def test_entries_are_yielded_one_at_a_time(self):
+        entries = PatientStreamDecoder(chunk_size=16).iter_entries(io.BytesIO(self.data))
+        key, entry = next(entries)
+        self.assertEqual(key, "9790012000")
+        self.assertEqual(entry["name"], "John Doe")
+
+    def test_numbers_split_across_chunks(self):
+        data = b'{"a": 12345, "b": 678}'
+        entries = dict(PatientStreamDecoder(chunk_size=3).iter_entries(io.BytesIO(data)))
+        self.assertEqual(entries, {"a": 12345, "b": 678})
+
+    def test_empty_and_truncated_files(self):
+        self.assertEqual(PatientStreamDecoder().decode(io.BytesIO(b" { } ")), {})
+        with self.assertRaises(json.JSONDecodeError):
+            PatientStreamDecoder(chunk_size=8).decode(io.BytesIO(self.data[:-10]))
+
+    def test_progress_is_reported(self):
+        reports = []
+        PatientStreamDecoder(chunk_size=100, progress=lambda done, total: reports.append(done)).decode(io.BytesIO(self.data))
+        self.assertEqual(reports, sorted(reports))
+        self.assertEqual(reports[-1], len(self.data))
+
+
+if __name__ == "__main__":
+    unittest.main()
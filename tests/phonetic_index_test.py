@@ -0,0 +1,55 @@
+# phonetic_index_test.py
+
+import unittest
+from clinic.controller import Controller
+from clinic.dao.phonetic_index import PhoneticIndex, levenshtein, soundex
+from clinic.exception.illegal_access_exception import IllegalAccessException
+
+
+class TestPhoneticIndex(unittest.TestCase):
+
+    def test_soundex(self):
+        for word, key in (("Robert", "R163"), ("Rupert", "R163"), ("Ashcraft", "A261"), ("Pfister", "P236"), ("Lee", "L000")):
+            self.assertEqual(soundex(word), key)
+        self.assertIsNone(soundex("123"))
+
+    def test_levenshtein(self):
+        self.assertEqual(levenshtein("kitten", "sitting"), 3)
+        self.assertEqual(levenshtein("", "doe"), 3)
+        self.assertEqual(levenshtein("doe", "doe"), 0)
+
+    def test_search_ranks_by_distance(self):
+        index = PhoneticIndex()
+        index.add(1, "John Doe")
+        index.add(2, "Jon Dow")
+        index.add(3, "Mary Doe")
+        index.add(4, "Joe Hancock")
+
+        self.assertEqual(index.search("Jon Doe"), [1, 2])
+        self.assertEqual(index.search("doe"), [1, 3, 2])
+        self.assertEqual(index.search("Hankok"), [4])
+        self.assertEqual(index.search("doe", limit=1), [1])
+        self.assertEqual(index.search("Smith"), [])
+
+        index.add(1, "John Smith")
+        index.remove(3)
+        self.assertEqual(index.search("doe"), [2])
+        self.assertEqual(index.search("smyth"), [1])
+
+
+class TestControllerFuzzyRetrievePatients(unittest.TestCase):
+
+    def test_fuzzy_retrieve_patients(self):
+        controller = Controller(autosave=False)
+        with self.assertRaises(IllegalAccessException):
+            controller.fuzzy_retrieve_patients("Jon")
+        controller.login("user", "123456")
+        controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        controller.create_patient(9792225555, "Joe Hancock", "1990-01-15", "278 456 7890", "john.hancock@outlook.com", "5000 Douglas St, Saanich")
+
+        self.assertEqual([patient.phn for patient in controller.fuzzy_retrieve_patients("Jon Dough")], [9790012000])
+        self.assertEqual([patient.phn for patient in controller.fuzzy_retrieve_patients("Hancok")], [9792225555])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+# rekey_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from clinic.controller import Controller
+from clinic.dao.global_note_index import GlobalNoteIndex
+from clinic.dao.note_store import NoteStore
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+from clinic.dao.write_behind_flusher import WriteBehindFlusher
+
+
+class TestRekey(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def json_dao(self, journal=False, note_store=None, flusher=None):
+        return PatientDAOJSON(autosave=True, records_dir=self.directory, journal=journal, filepath=os.path.join(self.directory, "patients.json"),
+                              note_store=note_store, global_note_index=GlobalNoteIndex(os.path.join(self.directory, "notes.index")),
+                              flusher=flusher)
+
+    def use_dao(self, dao):
+        self.controller = Controller(autosave=dao.autosave, patient_dao=dao)
+        self.controller.login("user", "123456")
+
+    def create_patients(self):
+        self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        self.controller.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+        self.controller.patient_dao.search_patient(9790012000).create_note("Prescribed ibuprofen for the headache.")
+        self.controller.patient_dao.search_patient(9790014444).create_note("Patient is allergic to penicillin.")
+
+    def assert_rekeyed(self, dao):
+        self.assertIsNone(dao.search_patient(9790012000))
+        patient = dao.search_patient(9790019999)
+        self.assertEqual(patient.name, "John Smith")
+        self.assertEqual([note.text for note in patient.list_notes()], ["Prescribed ibuprofen for the headache."])
+        self.assertEqual([patient.phn for patient in dao.retrieve_patients("john")], [9790019999])
+        self.assertEqual([patient.phn for patient in dao.retrieve_patients_by_phone("2502031010")], [9790019999])
+        self.assertEqual([patient.phn for patient in dao.fuzzy_search_patients("Jon Smith")], [9790019999])
+        self.assertEqual(dao.search_notes("ibuprofen"), [(9790019999, 1)])
+
+    def test_json(self):
+        for journal in (False, True):
+            dao = self.json_dao(journal)
+            self.use_dao(dao)
+            self.create_patients()
+
+            with patch.object(dao, "save_patients", wraps=dao.save_patients) as save, \
+                    patch.object(dao.file_sync, "append", wraps=dao.file_sync.append) as append, \
+                    patch.object(dao.file_sync, "write", wraps=dao.file_sync.write) as write:
+                self.controller.update_patient(9790012000, 9790019999, "John Smith")
+            journaled = [call for call in append.call_args_list if call.args[0] == dao.journal_filepath]
+            self.assertEqual(save.call_count + len(journaled), 1, "the patients are written once")
+            self.assertEqual(append.call_args_list[0].args[0], dao.rekeys_filepath, "the move of the notes is journaled first")
+            if not journal:
+                self.assertFalse(os.path.exists(dao.rekeys_filepath), "and cleared once the patients are saved")
+            self.assertEqual(write.call_count, 1 - journal, "the notes are moved, not rewritten")
+            self.assertFalse(os.path.exists(os.path.join(self.directory, "9790012000.dat")), "no orphaned notes file")
+            self.assert_rekeyed(dao)
+            dao.flush()
+
+            reloaded = self.json_dao(journal)
+            self.assert_rekeyed(reloaded)
+            self.assertEqual(reloaded.search_patient(9790019999).create_note("Follow up in two weeks.").code, 2)
+            shutil.rmtree(self.directory)
+            os.mkdir(self.directory)
+
+    def test_crash_before_the_patients_are_written(self):
+        for journal in (False, True):
+            flusher = WriteBehindFlusher(interval_ms=60000, max_ops=1000)
+            self.use_dao(self.json_dao(journal, flusher=flusher))
+            self.create_patients()
+            self.controller.patient_dao.flush()
+
+            self.controller.update_patient(9790012000, 9790019999, "John Smith")
+            self.controller.update_patients([{"phn": 9790014444, "new_phn": 9790019999}, {"phn": 9790019999, "new_phn": 9790014444}])
+            self.assertTrue(os.path.exists(os.path.join(self.directory, "9790014444.dat")), "the notes are moved right away")
+            # the process dies before the write-behind flush
+            flusher.pending.clear()
+            flusher.close()
+
+            reloaded = self.json_dao(journal)
+            self.assertEqual(sorted(patient.phn for patient in reloaded.list_patients()), [9790012000, 9790014444])
+            self.assertEqual([note.text for note in reloaded.search_patient(9790012000).list_notes()], ["Prescribed ibuprofen for the headache."])
+            self.assertEqual([note.text for note in reloaded.search_patient(9790014444).list_notes()], ["Patient is allergic to penicillin."])
+            self.assertEqual(reloaded.search_notes("ibuprofen"), [(9790012000, 1)])
+            self.assertFalse(os.path.exists(reloaded.rekeys_filepath))
+            shutil.rmtree(self.directory)
+            os.mkdir(self.directory)
+
+    def test_notes_not_loaded(self):
+        for consolidated in (False, True):
+            store_path = os.path.join(self.directory, "notes.store")
+            self.use_dao(self.json_dao(note_store=NoteStore(store_path) if consolidated else None))
+            self.create_patients()
+            self.controller.patient_dao.flush()
+
+            # a reopened DAO has not loaded the notes of its records yet
+            dao = self.json_dao(note_store=NoteStore(store_path) if consolidated else None)
+            self.assertFalse(dao.search_patient(9790012000).record.note_dao_loaded)
+            self.use_dao(dao)
+            self.controller.update_patient(9790012000, 9790019999, "John Smith")
+            self.assert_rekeyed(dao)
+            if not consolidated:
+                self.assertFalse(os.path.exists(os.path.join(self.directory, "9790012000.dat")), "no orphaned notes file")
+                self.assertTrue(os.path.exists(os.path.join(self.directory, "9790019999.dat")))
+            dao.flush()
+            self.assert_rekeyed(self.json_dao(note_store=NoteStore(store_path) if consolidated else None))
+            shutil.rmtree(self.directory)
+            os.mkdir(self.directory)
+
+    def test_note_store(self):
+        store = NoteStore(os.path.join(self.directory, "notes.store"))
+        self.use_dao(self.json_dao(note_store=store))
+        self.create_patients()
+        with patch.object(store.file_sync, "append", wraps=store.file_sync.append) as append:
+            self.controller.update_patient(9790012000, 9790019999, "John Smith")
+        self.assertEqual(append.call_count, 1, "the notes are moved with one append")
+        self.assertNotIn(9790012000, store)
+        self.assert_rekeyed(self.controller.patient_dao)
+        self.controller.patient_dao.flush()
+        self.assert_rekeyed(self.json_dao(note_store=NoteStore(store.filepath)))
+
+    def test_sqlite(self):
+        dao = PatientDAOSQLite(autosave=True, filepath=os.path.join(self.directory, "clinic.db"))
+        self.use_dao(dao)
+        self.create_patients()
+        self.controller.update_patient(9790012000, 9790019999, "John Smith")
+        self.assert_rekeyed(dao)
+        (count,) = dao.connection.execute("SELECT COUNT(*) FROM notes WHERE phn = 9790012000").fetchone()
+        self.assertEqual(count, 0)
+        dao.connection.close()
+
+    def test_swap_keeps_notes(self):
+        for dao in (self.json_dao(), PatientDAOSQLite(autosave=True, filepath=os.path.join(self.directory, "clinic.db"))):
+            self.use_dao(dao)
+            self.create_patients()
+            rejected = self.controller.update_patients([{"phn": 9790012000, "new_phn": 9790014444}, {"phn": 9790014444, "new_phn": 9790012000}])
+            self.assertEqual(rejected, [])
+            self.assertEqual(dao.search_patient(9790014444).name, "John Doe")
+            self.assertEqual(dao.search_patient(9790014444).list_notes()[0].text, "Prescribed ibuprofen for the headache.")
+            self.assertEqual(dao.search_patient(9790012000).list_notes()[0].text, "Patient is allergic to penicillin.")
+            self.assertEqual(sorted(patient.phn for patient in dao.list_patients()), [9790012000, 9790014444])
+            self.assertEqual(dao.search_notes("penicillin"), [(9790012000, 1)])
+
+    def test_rollback_moves_notes_back(self):
+        dao = self.json_dao()
+        self.use_dao(dao)
+        self.create_patients()
+        with self.assertRaises(RuntimeError):
+            with self.controller.transaction():
+                self.controller.update_patient(9790012000, 9790019999, "John Smith")
+                raise RuntimeError
+        patient = dao.search_patient(9790012000)
+        self.assertEqual(patient.record.phn, 9790012000)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "9790012000.dat")))
+        self.assertEqual(dao.search_notes("ibuprofen"), [(9790012000, 1)])
+        self.assertEqual(self.json_dao().search_patient(9790012000).list_notes()[0].text, "Prescribed ibuprofen for the headache.")
+
+
+if __name__ == "__main__":
+    unittest.main()
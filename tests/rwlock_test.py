@@ -0,0 +1,146 @@
+# rwlock_test.py
+
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from clinic.controller import Controller
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+from clinic.dao.write_behind_flusher import WriteBehindFlusher
+from clinic.rwlock import RWLock
+
+
+class TestRWLock(unittest.TestCase):
+
+    def test_readers_share_the_lock(self):
+        lock = RWLock()
+        barrier = threading.Barrier(3, timeout=5)
+
+        def read():
+            with lock.read():
+                barrier.wait()  # only passes if all three read at the same time
+
+        threads = [threading.Thread(target=read) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(barrier.broken)
+
+    def test_writer_is_exclusive_and_goes_first(self):
+        lock = RWLock()
+        events = []
+        reading = threading.Event()
+        release = threading.Event()
+
+        def read(name):
+            with lock.read():
+                events.append(name)
+                reading.set()
+                release.wait(5)
+
+        def write():
+            with lock.write():
+                events.append("write")
+
+        first = threading.Thread(target=read, args=("first read",))
+        first.start()
+        reading.wait(5)
+        writer = threading.Thread(target=write)
+        writer.start()
+        while not lock.waiting_writers:
+            pass
+        second = threading.Thread(target=read, args=("second read",))
+        second.start()
+        release.set()
+        for thread in (first, writer, second):
+            thread.join()
+        self.assertEqual(events, ["first read", "write", "second read"], "a waiting writer goes before new readers")
+
+    def test_reentrant(self):
+        lock = RWLock()
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+            self.assertEqual(lock.writer, threading.get_ident())
+        self.assertIsNone(lock.writer)
+        with lock.read():
+            with lock.read():
+                pass
+            with self.assertRaises(RuntimeError):
+                with lock.write():
+                    pass
+        self.assertEqual(lock.readers, {})
+
+
+class TestThreadSafeController(unittest.TestCase):
+
+    WORKERS = 8
+    PATIENTS = 20
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def work(self, worker):
+        """One clinician creating, changing and searching their own patients while the others do the same."""
+        session = self.controller.new_session()
+        session.login("user", "123456")
+        generator = random.Random(worker)
+        base = 9000000000 + worker * 1000
+        for i in range(self.PATIENTS):
+            session.create_patient(base + i, "Patient %d %d" % (worker, i), "2000-10-10", "250 203 1010",
+                                   "worker%d@uvic.ca" % worker, "300 Moss St, Victoria")
+            session.retrieve_patients("Patient %d" % generator.randrange(self.WORKERS))
+            session.list_patients()
+        session.update_patients([{"phn": base + i, "name": "Renamed %d %d" % (worker, i)} for i in range(0, self.PATIENTS, 2)])
+        session.delete_patients([base + i for i in range(1, self.PATIENTS, 4)])
+        session.update_patient(base, base + 500)
+        session.set_current_patient(base + 500)
+        for i in range(10):
+            session.create_note("Visit %d of worker%d" % (i, worker))
+            session.search_notes("worker%d" % generator.randrange(self.WORKERS))
+            session.query_patients(email_domain="uvic.ca", sort_by="name")
+        session.delete_note(1)
+        session.unset_current_patient()
+        session.logout()
+
+    def hammer(self, dao):
+        self.controller = Controller(autosave=dao.autosave, thread_safe=True, patient_dao=dao)
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            for future in [pool.submit(self.work, worker) for worker in range(self.WORKERS)]:
+                future.result()
+
+        self.controller.login("user", "123456")
+        for worker in range(self.WORKERS):
+            base = 9000000000 + worker * 1000
+            expected = sorted({base + i for i in range(1, self.PATIENTS)} - {base + i for i in range(1, self.PATIENTS, 4)} | {base + 500})
+            patients = self.controller.query_patients(email_domain="uvic.ca", name="%d " % worker)
+            self.assertEqual(sorted(patient.phn for patient in patients if patient.email == "worker%d@uvic.ca" % worker), expected)
+            self.assertEqual(len(self.controller.retrieve_patients("Renamed %d " % worker)), self.PATIENTS // 2)
+            self.assertEqual(len(self.controller.search_notes("worker%d" % worker)), 9)
+
+    def test_json(self):
+        flusher = WriteBehindFlusher(5, 10)
+        dao = PatientDAOJSON(autosave=True, records_dir=self.directory, journal=True, filepath=os.path.join(self.directory, "patients.json"), flusher=flusher)
+        self.hammer(dao)
+        dao.flush()
+        flusher.close()
+        reloaded = PatientDAOJSON(autosave=True, records_dir=self.directory, journal=True, filepath=dao.filepath)
+        self.assertEqual(sorted(patient.phn for patient in reloaded.list_patients()), sorted(patient.phn for patient in dao.list_patients()))
+
+    def test_sqlite(self):
+        dao = PatientDAOSQLite(autosave=True, filepath=os.path.join(self.directory, "clinic.db"), check_same_thread=False)
+        self.hammer(dao)
+        dao.connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
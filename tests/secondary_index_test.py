@@ -0,0 +1,106 @@
+# secondary_index_test.py
+
+import datetime
+import unittest
+from clinic.controller import Controller
+from clinic.dao.hash_index import HashIndex, normalize_email, normalize_phone
+from clinic.dao.sorted_index import SortedIndex, parse_birth_date
+from clinic.exception.illegal_access_exception import IllegalAccessException
+
+
+class TestSecondaryIndexes(unittest.TestCase):
+
+    def test_hash_index(self):
+        index = HashIndex(normalize_phone)
+        index.add(1, "250 203-1010")
+        index.add(2, "(250) 2031010")
+        index.add(3, "")
+        self.assertEqual(index.lookup("2502031010"), [1, 2])
+        self.assertEqual(index.lookup(""), [])
+
+        index.add(1, "250 203 2020")
+        self.assertEqual(index.lookup("250.203.1010"), [2])
+        index.remove(2)
+        self.assertEqual(index.lookup("250.203.1010"), [])
+        self.assertEqual(index.postings, {"2502032020": {1: None}})
+
+        emails = HashIndex(normalize_email)
+        emails.add(1, " John.Doe@Gmail.com")
+        self.assertEqual(emails.lookup("john.doe@gmail.com "), [1])
+
+    def test_sorted_index(self):
+        index = SortedIndex()
+        index.add(3, "2000-10-10")
+        index.add(1, "1995-07-01")
+        index.add(2, "2000-10-10")
+        self.assertEqual(index.lookup("2000-10-10"), [3, 2], "equal values keep insertion order")
+        self.assertEqual(index.range("1990-01-01", "2000-01-01"), [1])
+
+        index.add(3, "1990-01-15")
+        index.remove(1)
+        self.assertEqual(index.range("0000", "9999"), [3, 2])
+
+    def test_sorted_index_bulk_build(self):
+        items = [(key, None if key % 7 == 0 else key % 13) for key in range(1000)]
+        added = SortedIndex()
+        for key, value in items:
+            added.add(key, value)
+        built = SortedIndex()
+        built.add_many(items)
+        self.assertEqual(built.entries, added.entries)
+        self.assertEqual(built.values, added.values)
+
+        built.add(1000, 5)
+        self.assertEqual(built.lookup(5)[-1], 1000, "a later key goes after the bulk-built ones")
+
+    def test_parse_birth_date(self):
+        self.assertEqual(parse_birth_date(" 2000-10-10"), datetime.date(2000, 10, 10))
+        self.assertEqual(parse_birth_date("2000/10/10"), datetime.date(2000, 10, 10))
+        for birth_date in ("", None, "10/10/2000", "2000-02-30", "tomorrow"):
+            self.assertIsNone(parse_birth_date(birth_date))
+
+
+class TestControllerSecondaryIndexes(unittest.TestCase):
+
+    def test_retrieve_patients_by_field(self):
+        controller = Controller(autosave=False)
+        with self.assertRaises(IllegalAccessException):
+            controller.retrieve_patients_by_phone("250 203 1010")
+        controller.login("user", "123456")
+        controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        controller.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+
+        self.assertEqual([patient.phn for patient in controller.retrieve_patients_by_phone("(250) 203-2020")], [9790014444])
+        self.assertEqual([patient.phn for patient in controller.retrieve_patients_by_email("John.Doe@gmail.com")], [9790012000])
+        self.assertEqual([patient.phn for patient in controller.retrieve_patients_by_birth_date("1995-07-01")], [9790014444])
+
+        controller.update_patient(9790012000, phone="250 555 0000", email="jd@uvic.ca")
+        self.assertEqual(controller.retrieve_patients_by_phone("250 203 1010"), [])
+        self.assertEqual([patient.phn for patient in controller.retrieve_patients_by_email("jd@uvic.ca")], [9790012000])
+
+        controller.delete_patient(9790014444)
+        self.assertEqual(controller.retrieve_patients_by_birth_date("1995-07-01"), [])
+
+    def test_retrieve_patients_by_birth_date_range(self):
+        controller = Controller(autosave=False)
+        controller.login("user", "123456")
+        for phn, birth_date in ((9790012000, "1960-03-31"), (9790014444, "1950-01-01"), (9792225555, "1959/04/01"),
+                                (9791234567, "unknown"), (9797654321, "1961-02-28")):
+            controller.create_patient(phn, "Patient %d" % phn, birth_date, "250 203 1010", "patient@gmail.com", "300 Moss St, Victoria")
+
+        def phns(patients):
+            return [patient.phn for patient in patients]
+
+        self.assertEqual(phns(controller.retrieve_patients_by_birth_date_range("1950-01-01", "1960-12-31")),
+                         [9790014444, 9792225555, 9790012000])
+        self.assertEqual(phns(controller.retrieve_patients_by_birth_date("1959-04-01")), [9792225555])
+        self.assertEqual(phns(controller.retrieve_patients_by_age(65, on=datetime.date(2025, 3, 31))), [9792225555, 9790012000])
+        self.assertEqual(phns(controller.retrieve_patients_by_age(64, 65, on=datetime.date(2025, 3, 30))),
+                         [9792225555, 9790012000, 9797654321])
+        self.assertEqual(phns(controller.retrieve_patients_turning(65, 2025, 3)), [9790012000])
+        self.assertEqual(phns(controller.retrieve_patients_turning(75, 2025, 1)), [9790014444])
+        self.assertEqual(controller.retrieve_patients_by_birth_date_range("1950", "1960"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
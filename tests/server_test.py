@@ -0,0 +1,175 @@
+# server_test.py
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from clinic.async_controller import AsyncController
+from clinic.client import ClinicClient, parse_address
+from clinic.controller import Controller
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.exception.illegal_access_exception import IllegalAccessException
+from clinic.exception.illegal_operation_exception import IllegalOperationException
+from clinic.patient import Patient
+from clinic.rpc import METHOD_NOT_FOUND, INVALID_PARAMS, PARSE_ERROR, RPCError
+from clinic.server import ClinicServer
+
+
+class TestClinicServer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        dao = PatientDAOJSON(autosave=False, filepath=os.path.join(self.directory, "patients.json"))
+        self.controller = AsyncController(Controller(autosave=False, thread_safe=True, patient_dao=dao))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.clinic_server = ClinicServer(self.controller)
+        self.server = self.await_(self.clinic_server.start("127.0.0.1", 0))
+        self.clients = []
+        self.address = self.server.sockets[0].getsockname()[:2]
+
+    def tearDown(self):
+        try:
+            for client in self.clients:
+                client.close()
+            self.await_(self.disconnected())
+            self.server.close()
+            self.await_(self.server.wait_closed())
+            self.await_(self.controller.close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            shutil.rmtree(self.directory)
+
+    async def disconnected(self):
+        while self.clinic_server.connections:
+            await asyncio.sleep(0.01)
+
+    def await_(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(5)
+
+    def client(self, address=None):
+        client = ClinicClient(address or self.address, timeout=5)
+        self.clients.append(client)
+        return client
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("localhost:8765"), ("localhost", 8765))
+        self.assertEqual(parse_address(":8765"), ("127.0.0.1", 8765))
+        self.assertEqual(parse_address("/tmp/clinic.sock"), "/tmp/clinic.sock")
+
+    def test_operations(self):
+        client = self.client()
+        with self.assertRaises(IllegalAccessException):
+            client.list_patients()
+        self.assertTrue(client.login("user", "123456"))
+        self.assertTrue(client.logged_in)
+
+        john = client.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        self.assertEqual(john, Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria"))
+        with self.assertRaises(IllegalOperationException):
+            client.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        self.assertEqual(client.query_patients(name="john", sort_by="name"), [john])
+        self.assertEqual(client.create_patients([{"phn": 9790012000, "name": "John Doe", "birth_date": "2000-10-10", "phone": "250 203 1010",
+                                                  "email": "john.doe@gmail.com", "address": "300 Moss St, Victoria"}]),
+                         [[0, "patient already exists"]])
+
+        client.set_current_patient(9790012000)
+        self.assertEqual(client.current_patient, john)
+        note = client.create_note("Prescribed ibuprofen for the headache.")
+        self.assertEqual(client.search_note(note.code).timestamp, note.timestamp)
+        self.assertEqual(client.search_notes("ibuprofen"), [[9790012000, note.code]])
+        self.assertEqual(client.get_session_changes(), ["Created patient 9790012000", "Created note 1 of patient 9790012000"])
+        self.assertTrue(client.logout())
+
+    def test_sessions_per_connection(self):
+        first, second = self.client(), self.client()
+        first.login("user", "123456")
+        with self.assertRaises(IllegalAccessException):
+            second.list_patients()
+        second.login("ali", "@G00dPassw0rd")
+        first.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        first.set_current_patient(9790012000)
+        self.assertEqual(second.search_patient(9790012000).name, "John Doe")
+        self.assertIsNone(second.current_patient)
+        with self.assertRaises(IllegalOperationException):
+            second.delete_patient(9790012000)  # the current patient of the other session
+
+    def test_pipelining(self):
+        client = self.client()
+        calls = [("login", ("user", "123456"), {}),
+                 ("create_patient", (9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria"), {}),
+                 ("set_current_patient", (9790012000,), {})]
+        calls += [("create_note", ("Visit %d" % i,), {}) for i in range(50)]
+        calls += [("list_notes", (), {})]
+        results = client.call_many(calls)
+        self.assertEqual([note.code for note in results[3:-1]], list(range(1, 51)), "run in order")
+        self.assertEqual(len(results[-1]), 50)
+
+        with self.assertRaises(IllegalOperationException):
+            client.call_many([("set_current_patient", (1,), {}), ("list_patients", (), {})])
+        self.assertEqual(len(client.list_patients()), 1, "the stream stays in sync after an error")
+
+    def test_protocol_errors(self):
+        with socket.create_connection(self.address, 5) as connection, connection.makefile("rwb") as stream:
+            stream.write(b'not json\n'
+                         b'{"jsonrpc": "2.0", "id": 1, "method": "drop_tables"}\n'
+                         b'{"jsonrpc": "2.0", "method": "login", "params": ["user", "123456"]}\n'
+                         b'{"jsonrpc": "2.0", "id": 2, "method": "search_patient", "params": {"code": 1}}\n'
+                         b'{"jsonrpc": "2.0", "id": 3, "method": "list_patients"}\n')
+            stream.flush()
+            responses = [json.loads(stream.readline()) for _ in range(4)]
+        self.assertEqual([response.get("error", {}).get("code") for response in responses], [PARSE_ERROR, METHOD_NOT_FOUND, INVALID_PARAMS, None])
+        self.assertEqual(responses[3], {"jsonrpc": "2.0", "id": 3, "result": []}, "the notification logged the session in")
+
+        with self.assertRaises(RPCError):
+            self.client().call("drop_tables")
+
+    def test_flush_is_not_served(self):
+        client = self.client()
+        with self.assertRaises(RPCError) as context:
+            client.call("flush")
+        self.assertEqual(context.exception.code, METHOD_NOT_FOUND, "a session that is not logged in cannot write for the others")
+        client.flush()  # the CLI and GUI flush on quit, the server writes on its own
+
+    def test_connecting_does_not_block_the_loop(self):
+        writing, release = threading.Event(), threading.Event()
+
+        def write():
+            with self.controller.controller.lock.write():
+                writing.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            writing.wait(5)
+            client = self.client()
+            # the new connection's session waits for the write lock off the event loop
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), self.loop).result(1)
+        finally:
+            release.set()
+            thread.join()
+        client.login("user", "123456")
+        self.assertEqual(client.list_patients(), [])
+
+    def test_unix_socket(self):
+        path = os.path.join(self.directory, "clinic.sock")
+        server = self.await_(ClinicServer(self.controller).start(path=path))
+        try:
+            client = self.client(path)
+            client.login("user", "123456")
+            self.assertEqual(client.list_patients(), [])
+        finally:
+            server.close()
+            self.await_(server.wait_closed())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# session_test.py
+
+import tracemalloc
+import unittest
+from clinic.controller import Controller
+from clinic.exception.illegal_access_exception import IllegalAccessException
+from clinic.exception.illegal_operation_exception import IllegalOperationException
+
+
+class TestSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = Controller(autosave=False)
+        self.controller.login("user", "123456")
+        self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+        self.controller.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+
+    def test_sessions_share_the_data(self):
+        other = self.controller.new_session()
+        self.assertIs(other.patient_dao, self.controller.patient_dao)
+        self.assertFalse(other.logged_in)
+        with self.assertRaises(IllegalAccessException):
+            other.list_patients()
+
+        other.login("ali", "@G00dPassw0rd")
+        self.assertEqual(other.username, "ali")
+        self.assertEqual(self.controller.username, "user")
+        other.create_patient(9792225555, "Joe Hancock", "1990-01-15", "250 203 3030", "joe@hotmail.com", "5000 Douglas St, Saanich")
+        self.assertEqual(self.controller.search_patient(9792225555).name, "Joe Hancock")
+
+        other.logout()
+        self.assertFalse(other.logged_in)
+        self.assertTrue(self.controller.logged_in)
+
+    def test_current_patient_per_session(self):
+        other = self.controller.new_session()
+        other.login("ali", "@G00dPassw0rd")
+        self.controller.set_current_patient(9790012000)
+        other.set_current_patient(9790014444)
+        self.assertEqual(self.controller.get_current_patient().phn, 9790012000)
+        self.assertEqual(other.get_current_patient().phn, 9790014444)
+
+        self.controller.create_note("Prescribed ibuprofen for the headache.")
+        self.assertEqual(other.list_notes(), [])
+
+        # the current patient of another session cannot be deleted or given another PHN
+        with self.assertRaises(IllegalOperationException):
+            self.controller.delete_patient(9790014444)
+        with self.assertRaises(IllegalOperationException):
+            other.update_patient(9790012000, 9790019999)
+        self.assertEqual(other.delete_patients([9790012000]), [(0, "patient is the current patient")])
+
+    def test_sessions_add_notes_to_one_patient(self):
+        for storage in ("json", "sqlite"):
+            controller = Controller(autosave=False, storage=storage)
+            controller.login("user", "123456")
+            controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+            other = controller.new_session()
+            other.login("ali", "@G00dPassw0rd")
+            controller.set_current_patient(9790012000)
+            other.set_current_patient(9790012000)
+
+            codes = [session.create_note("Visit %d" % i).code for i in range(4) for session in (controller, other)]
+            self.assertEqual(codes, list(range(1, 9)), storage)
+            self.assertEqual([note.code for note in other.list_notes()], list(range(8, 0, -1)), storage)
+
+    def test_logged_out_session_releases_its_patient(self):
+        other = self.controller.new_session()
+        other.login("ali", "@G00dPassw0rd")
+        other.set_current_patient(9790014444)
+        other.logout()
+        self.assertIsNone(other.current_patient)
+        self.assertTrue(self.controller.delete_patient(9790014444))
+
+        # a session left logged out with a current patient does not block the others either
+        other.login("ali", "@G00dPassw0rd")
+        other.set_current_patient(9790012000)
+        other.logged_in = False
+        self.assertTrue(self.controller.delete_patient(9790012000))
+
+    def test_change_log_per_session(self):
+        other = self.controller.new_session()
+        other.login("ali", "@G00dPassw0rd")
+        other.update_patient(9790014444, name="Mary Smith")
+        self.assertEqual(other.get_session_changes(), ["Updated patient 9790014444"])
+        self.assertEqual(len(self.controller.get_session_changes()), 2)
+
+        other.undo()
+        self.assertEqual(self.controller.search_patient(9790014444).name, "Mary Doe")
+        self.assertFalse(other.undo())
+        self.controller.undo()
+        self.assertIsNone(self.controller.search_patient(9790014444))
+
+    def test_session_memory(self):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        sessions = [self.controller.new_session() for _ in range(1000)]
+        for session in sessions:
+            session.login("user", "123456")
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        self.assertLess(used / len(sessions), 4096, "a session costs kilobytes, not a copy of the data")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+# transaction_test.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from clinic.controller import Controller
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+
+
+class TestTransaction(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def use_dao(self, dao):
+        self.controller = Controller(autosave=dao.autosave, patient_dao=dao)
+        self.controller.login("user", "123456")
+
+    def daos(self):
+        for journal in (False, True):
+            yield PatientDAOJSON(autosave=True, journal=journal, filepath=os.path.join(self.directory, "patients%d.json" % journal),
+                                 records_dir=os.path.join(self.directory, "records%d" % journal))
+        yield PatientDAOSQLite(autosave=True, filepath=os.path.join(self.directory, "clinic.db"))
+
+    def reload(self, dao):
+        if isinstance(dao, PatientDAOSQLite):
+            dao.connection.close()
+            return PatientDAOSQLite(autosave=True, filepath=dao.filepath)
+        return PatientDAOJSON(autosave=True, journal=dao.journal, filepath=dao.filepath, records_dir=os.path.join(self.directory, "records%d" % dao.journal))
+
+    def test_phn_change_saves_once(self):
+        dao = PatientDAOJSON(autosave=True, filepath=os.path.join(self.directory, "patients.json"), records_dir=self.directory)
+        self.use_dao(dao)
+        self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+
+        with patch.object(dao, "save_patients", wraps=dao.save_patients) as save:
+            self.controller.update_patient(9790012000, 9790014444, "John Smith")
+        self.assertEqual(save.call_count, 1, "delete, create and update are saved once")
+        self.assertEqual([patient.phn for patient in self.reload(dao).list_patients()], [9790014444])
+
+    def test_commit(self):
+        for dao in self.daos():
+            self.use_dao(dao)
+            with self.controller.transaction():
+                self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+                self.controller.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+                self.controller.update_patient(9790012000, 9790019999, "John Smith")
+            reloaded = self.reload(dao)
+            self.assertEqual(sorted(patient.phn for patient in reloaded.list_patients()), [9790014444, 9790019999])
+            self.assertEqual(reloaded.search_patient(9790019999).name, "John Smith")
+
+    def test_rollback(self):
+        for dao in self.daos():
+            self.use_dao(dao)
+            self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+            self.controller.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+
+            with self.assertRaises(RuntimeError):
+                with self.controller.transaction():
+                    self.controller.create_patient(9792225555, "Joe Hancock", "1990-01-15", "250 203 3030", "joe@hotmail.com", "5000 Douglas St, Saanich")
+                    self.controller.update_patient(9790012000, 9790019999, "John Smith", email="john.smith@gmail.com")
+                    self.controller.delete_patient(9790014444)
+                    raise RuntimeError
+
+            for patients in (dao, None):
+                patients = patients or self.reload(dao)
+                self.assertEqual(sorted(patient.phn for patient in patients.list_patients()), [9790012000, 9790014444])
+                self.assertEqual(patients.search_patient(9790012000).name, "John Doe")
+                self.assertEqual([patient.phn for patient in patients.retrieve_patients("john")], [9790012000])
+                self.assertEqual([patient.phn for patient in patients.retrieve_patients_by_email("john.smith@gmail.com")], [])
+                self.assertIsNone(patients.search_patient(9792225555))
+            if isinstance(patients, PatientDAOSQLite):
+                patients.connection.close()
+
+    def test_rollback_with_notes(self):
+        for dao in self.daos():
+            self.use_dao(dao)
+            self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+
+            with self.assertRaises(RuntimeError):
+                with self.controller.transaction():
+                    self.controller.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+                    self.controller.set_current_patient(9790012000)
+                    self.controller.create_note("Prescribed ibuprofen for the headache.")
+                    raise RuntimeError
+            self.controller.unset_current_patient()
+
+            for patients in (dao, None):
+                patients = patients or self.reload(dao)
+                self.assertEqual([patient.phn for patient in patients.list_patients()], [9790012000], "a note does not commit the transaction")
+                self.assertEqual(patients.search_patient(9790012000).list_notes(), [])
+            if isinstance(patients, PatientDAOSQLite):
+                patients.connection.close()
+
+    def test_nested(self):
+        dao = PatientDAOJSON(autosave=True, journal=True, filepath=os.path.join(self.directory, "patients.json"), records_dir=self.directory)
+        self.use_dao(dao)
+        with patch.object(dao.file_sync, "append", wraps=dao.file_sync.append) as append:
+            with self.assertRaises(RuntimeError):
+                with self.controller.transaction():
+                    self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+                    with self.controller.transaction():
+                        self.controller.create_patients([{"phn": 9790014444, "name": "Mary Doe", "birth_date": "1995-07-01",
+                                                          "phone": "250 203 2020", "email": "mary.doe@gmail.com", "address": "300 Moss St, Victoria"}])
+                    self.assertEqual(len(dao.list_patients()), 2)
+                    raise RuntimeError
+        self.assertEqual(append.call_count, 0, "nothing is written when the outermost transaction rolls back")
+        self.assertEqual(dao.list_patients(), [])
+        self.assertEqual(self.reload(dao).list_patients(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
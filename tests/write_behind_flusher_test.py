@@ -0,0 +1,119 @@
+# write_behind_flusher_test.py
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.write_behind_flusher import WriteBehindFlusher
+from clinic.patient import Patient
+
+
+class TestWriteBehindFlusher(unittest.TestCase):
+
+    def setUp(self):
+        self.saves = []
+        self.saved = threading.Event()
+
+    def save(self, name):
+        def save():
+            self.saves.append(name)
+            self.saved.set()
+        return save
+
+    def test_marks_are_coalesced_until_flush(self):
+        flusher = WriteBehindFlusher(interval_ms=60000, max_ops=1000)
+        for _ in range(10):
+            flusher.mark_dirty("patients", self.save("patients"))
+        flusher.mark_dirty("notes", self.save("notes"))
+        self.assertEqual(self.saves, [])
+
+        flusher.flush()
+        self.assertEqual(self.saves, ["patients", "notes"])
+        flusher.flush()
+        self.assertEqual(self.saves, ["patients", "notes"], "nothing left to write")
+        flusher.close()
+
+    def test_flush_single_target(self):
+        flusher = WriteBehindFlusher(interval_ms=60000, max_ops=1000)
+        flusher.mark_dirty("patients", self.save("patients"))
+        flusher.mark_dirty("notes", self.save("notes"))
+        flusher.flush("notes")
+        self.assertEqual(self.saves, ["notes"])
+        flusher.close()
+        self.assertEqual(self.saves, ["notes", "patients"], "closing flushes the rest")
+
+    def test_background_flush_after_max_ops(self):
+        flusher = WriteBehindFlusher(interval_ms=60000, max_ops=3)
+        for _ in range(3):
+            flusher.mark_dirty("patients", self.save("patients"))
+        self.assertTrue(self.saved.wait(5))
+        self.assertEqual(self.saves, ["patients"])
+        flusher.close()
+
+    def test_background_flush_after_interval(self):
+        flusher = WriteBehindFlusher(interval_ms=10, max_ops=1000)
+        flusher.mark_dirty("patients", self.save("patients"))
+        self.assertTrue(self.saved.wait(5))
+        flusher.close()
+
+    def test_failed_save_stays_pending(self):
+        flusher = WriteBehindFlusher(interval_ms=10, max_ops=1000)
+        failures = []
+        def failing_save():
+            if not failures:
+                failures.append("patients")
+                raise OSError("disk full")
+            self.save("patients")()
+        with self.assertLogs("clinic.dao.write_behind_flusher", "ERROR"):
+            flusher.mark_dirty("patients", failing_save)
+            self.assertTrue(self.saved.wait(5), "the failed save is retried")
+        self.assertTrue(flusher.thread.is_alive())
+
+        self.saved.clear()
+        flusher.mark_dirty("notes", self.save("notes"))
+        self.assertTrue(self.saved.wait(5), "later marks are still flushed in the background")
+        self.assertEqual(self.saves, ["patients", "notes"])
+        flusher.close()
+
+    def test_flush_raises_after_other_saves(self):
+        flusher = WriteBehindFlusher(interval_ms=60000, max_ops=1000)
+        def failing_save():
+            raise OSError("disk full")
+        flusher.mark_dirty("patients", failing_save)
+        flusher.mark_dirty("notes", self.save("notes"))
+        with self.assertRaises(OSError):
+            flusher.flush()
+        self.assertEqual(self.saves, ["notes"])
+        self.assertEqual(list(flusher.pending), ["patients"])
+        flusher.pending.clear()
+        flusher.close()
+
+
+class TestPatientDAOJSONWriteBehind(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "patients.json")
+        self.flusher = WriteBehindFlusher(interval_ms=60000, max_ops=1000)
+
+    def tearDown(self):
+        self.flusher.close()
+        shutil.rmtree(self.directory)
+
+    def test_burst_of_edits_is_one_write(self):
+        for journal in (False, True):
+            dao = PatientDAOJSON(autosave=True, journal=journal, filepath=self.filepath, flusher=self.flusher)
+            for i in range(20):
+                dao.create_patient(Patient(1000 + i, "Patient %d" % i, "2000-01-01", "", "", ""))
+            self.assertEqual(len(self.flusher.pending), 1, "twenty edits wait as one pending write")
+
+            dao.flush()
+            reloaded = PatientDAOJSON(autosave=True, journal=journal, filepath=self.filepath)
+            self.assertEqual(len(reloaded.list_patients()), 20)
+            os.remove(dao.journal_filepath if journal else self.filepath)
+
+
+if __name__ == "__main__":
+    unittest.main()